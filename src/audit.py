@@ -0,0 +1,204 @@
+# audit.py
+
+# ============================================================
+# AUDIT QUALITÀ DATI (CONFIG + GANTT)
+# ============================================================
+#
+# Il job scarta in silenzio le righe che non riesce a usare:
+#   - righe config senza Nome/ChatId/Gantt o con ChatId non numerico
+#   - righe Gantt con durata o scadenza mancante / non interpretabile
+# Un promemoria mancante resta quindi invisibile finché qualcuno
+# non se ne accorge.
+#
+# L'audit (comando /audit) valida tutte le righe config e tutti i Gantt
+# in un unico passaggio:
+#   - stesso percorso di lettura del job (sorgente del tenant +
+#     parse_gantt_rows), nessun invio di promemoria
+#   - Gantt letti in parallelo con un limite di concorrenza
+#     (AUDIT_CONCURRENCY, default 4), ognuno con il proprio client
+#   - progetti con lo stesso Gantt e gli stessi tab (Project.read_key)
+#     condividono una sola lettura
+#   - la config è compilata su una copia della cache del tenant: l'audit
+#     non cambia i progetti usati dal job
+#   - tutte le chiamate passano dalla quota del tenant
+#
+# Per ogni progetto riporta le righe scartate con motivo e cella
+# (es. GANTT!E15: scadenza non valida: 'boh').
+#
+# ============================================================
+
+import asyncio
+import os
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from gantt_reader import parse_gantt_rows
+from project_config import Project, compile_entry, skip_reason
+from quota import run_io
+from sources import as_source
+
+
+AUDIT_CONCURRENCY = max(int(os.getenv("AUDIT_CONCURRENCY", "4")), 1)
+
+# Limite Telegram per un singolo messaggio
+TELEGRAM_MAX_CHARS = 4096
+
+# Celle elencate per ogni progetto (le altre vengono solo contate)
+MAX_CELLS_LISTED = 10
+
+
+@dataclass
+class ProjectAudit:
+    project: Project
+    services: int = 0
+    # (cella, motivo) delle righe scartate
+    dropped: List[Tuple[str, str]] = field(default_factory=list)
+    # errore di lettura dell'intero Gantt
+    error: Optional[Exception] = None
+
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+def audit_config(data: List[Dict[str, str]]) -> List[Tuple[int, str]]:
+    """
+    Righe config che il job ignora o non riesce a compilare:
+    lista (riga, motivo).
+    """
+    issues: List[Tuple[int, str]] = []
+
+    for idx, entry in enumerate(data):
+        row = int(entry.get("_row") or idx + 2)
+        reason = skip_reason(entry)
+        if reason is None:
+            try:
+                compile_entry(entry, row)
+            except Exception as e:
+                reason = f"{type(e).__name__}: {e}"
+        if reason is not None:
+            issues.append((row, reason))
+
+    return issues
+
+
+# ============================================================
+# GANTT (IN PARALLELO)
+# ============================================================
+
+async def audit_projects(
+    projects: List[Project],
+    source,
+    quota=None,
+    concurrency: int = AUDIT_CONCURRENCY,
+    today: Optional[date] = None,
+) -> List[ProjectAudit]:
+    """
+    Legge e valida i Gantt dei progetti, al massimo `concurrency` alla volta.
+    Ogni Gantt (read_key) viene letto una volta sola anche se condiviso
+    da più progetti.
+    source: sorgente dei Gantt (sources.Source) o factory di client Sheets.
+    Ritorna un ProjectAudit per progetto, nell'ordine ricevuto.
+    """
+    source = as_source(source)
+    today = today or date.today()
+    results = [ProjectAudit(p) for p in projects]
+    groups: Dict[str, List[ProjectAudit]] = {}
+    for item in results:
+        groups.setdefault(item.project.read_key, []).append(item)
+    queue: asyncio.Queue = asyncio.Queue()
+    for group in groups.values():
+        queue.put_nowait(group)
+
+    async def worker():
+        # i client googleapiclient non sono thread-safe: uno per worker
+        client = None
+        while True:
+            try:
+                item, *sharing = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                if client is None:
+                    client = await run_io(quota, source.client)
+                values = await run_io(quota, source.fetch_gantt, client, item.project.gantt_url, quota, item.project.worksheets)
+                layout = source.layout(item.project.gantt_url)
+                item.services = len(parse_gantt_rows(
+                    values,
+                    today,
+                    issues=item.dropped,
+                    start_row=layout.header_row,
+                    worksheet_title=layout.worksheet,
+                    columns=layout.columns,
+                ))
+            except Exception as e:
+                item.error = e
+            for other in sharing:
+                other.services, other.dropped, other.error = item.services, list(item.dropped), item.error
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(groups)))))
+    return results
+
+
+# ============================================================
+# REPORT
+# ============================================================
+
+def render_report(
+    label: str,
+    config_issues: List[Tuple[int, str]],
+    audits: List[ProjectAudit],
+    calls: int = 0,
+    elapsed: float = 0.0,
+) -> List[str]:
+    """
+    Testo del report, diviso in messaggi entro il limite Telegram.
+    Elenca solo i progetti con problemi.
+    """
+    dropped = sum(len(a.dropped) for a in audits)
+    failed = sum(1 for a in audits if a.error is not None)
+
+    header = (
+        f"🔎 Audit{f' ({label})' if label else ''}: "
+        f"{len(audits)} Gantt, {sum(a.services for a in audits)} servizi letti, "
+        f"{dropped} righe scartate, {failed} Gantt illeggibili, "
+        f"{len(config_issues)} righe config ignorate\n"
+        f"({calls} chiamate API, {elapsed:.1f}s)"
+    )
+    blocks: List[str] = []
+
+    if config_issues:
+        lines = ["📋 Foglio config:"]
+        lines += [f" • riga {row}: {reason}" for row, reason in config_issues]
+        blocks.append("\n".join(lines))
+
+    for a in audits:
+        if a.error is None and not a.dropped:
+            continue
+        lines = [f"📌 {a.project.name} (riga {a.project.row})"]
+        if a.error is not None:
+            lines.append(f" ❌ Gantt illeggibile: {type(a.error).__name__}: {str(a.error)[:300]}")
+        else:
+            lines.append(f" {a.services} servizi letti, {len(a.dropped)} righe scartate")
+            for cell, reason in a.dropped[:MAX_CELLS_LISTED]:
+                lines.append(f" • {cell}: {reason}")
+            others = len(a.dropped) - MAX_CELLS_LISTED
+            if others > 0:
+                lines.append(f" (+{others} altre)")
+        blocks.append("\n".join(lines))
+
+    if not blocks:
+        blocks.append("✅ Nessun problema trovato")
+
+    messages: List[str] = []
+    current = header
+    for block in blocks:
+        block = block[: TELEGRAM_MAX_CHARS - 10]
+        if len(current) + 2 + len(block) > TELEGRAM_MAX_CHARS:
+            messages.append(current)
+            current = block
+        else:
+            current += "\n\n" + block
+    messages.append(current)
+    return messages
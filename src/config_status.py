@@ -0,0 +1,118 @@
+# config_status.py
+
+# ============================================================
+# STATO PER PROGETTO NEL FOGLIO CONFIG
+# ============================================================
+#
+# Se processato, saltato o in errore, prima si vedeva solo nei log del
+# container e su ERROR_CHAT_ID. A fine job giornaliero il bot scrive,
+# riga per riga del foglio config:
+#
+#   Ultima_esecuzione    data e ora del job
+#   Esito                OK / OK (invii saltati: ...) / ERRORE: ... / SALTATO: ...
+#   Servizi_letti        servizi interpretati dal Gantt
+#   Promemoria_inviati   messaggi inviati (o sezioni digest)
+#   Prossimo_promemoria  primo giorno dopo oggi con un avviso in programma
+#
+# Le colonne sono opzionali: vengono scritte solo quelle presenti
+# nell'intestazione del foglio (nessuna = nessuna scrittura).
+# Tutto in UNA chiamata values.batchUpdate a fine esecuzione, qualunque
+# sia il numero di progetti (sources.Source.write_config_status).
+# Lo scope "spreadsheets" in googleSheetRead.SCOPES consente la scrittura.
+#
+# ============================================================
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from project_config import Project
+from reminders import next_reminder_date
+
+
+# Lunghezza massima del messaggio di errore nella colonna Esito
+MAX_OUTCOME_CHARS = 200
+
+
+@dataclass
+class ProjectStatus:
+    error: str = ""
+    skip: str = ""
+    services: Optional[int] = None
+    sent: int = 0
+    skipped: int = 0
+    next_reminder: Optional[date] = None
+
+    @property
+    def outcome(self) -> str:
+        if self.error:
+            return self.error
+        if self.skip:
+            return f"SALTATO: {self.skip}"
+        if self.skipped:
+            return f"OK (invii saltati: {self.skipped}, destinazione non raggiungibile)"
+        return "OK"
+
+
+class RunStatus:
+    """
+    Stato dei progetti raccolto durante un'esecuzione, per riga config
+    (anche con nomi progetto ripetuti su più righe).
+    skipped: righe ignorate (ProjectConfigCache.skipped), con il motivo.
+    """
+
+    def __init__(
+        self,
+        started: datetime,
+        projects: Iterable[Project],
+        today: date,
+        skipped: Iterable[Tuple[int, str]] = (),
+    ):
+        self.started = started
+        self.today = today
+        self._rows: Dict[int, ProjectStatus] = {}
+        for p in projects:
+            self._rows[p.row] = ProjectStatus()
+        for row, reason in skipped:
+            self._rows[row] = ProjectStatus(skip=reason)
+
+    def _row(self, row: int) -> ProjectStatus:
+        return self._rows.setdefault(row, ProjectStatus())
+
+    def services(self, project: Project, services: list) -> None:
+        status = self._row(project.row)
+        status.services = len(services)
+        status.next_reminder = next_reminder_date(services, project.custom_days, self.today)
+
+    def error(self, row: int, e: Exception) -> None:
+        status = self._row(row)
+        if not status.error:
+            status.error = f"ERRORE: {type(e).__name__}: {e}"[:MAX_OUTCOME_CHARS]
+
+    def delivered(self, row: Optional[int], ok: bool) -> None:
+        """
+        Esito di un invio (Delivery.row): ok=False → saltato.
+        """
+        if row is None:
+            return
+        status = self._row(row)
+        if ok:
+            status.sent += 1
+        else:
+            status.skipped += 1
+
+    def rows(self) -> Dict[int, Dict[str, str]]:
+        """
+        riga config → {colonna di stato: valore da scrivere}
+        """
+        stamp = self.started.strftime("%d/%m/%Y %H:%M")
+        return {
+            row: {
+                "Ultima_esecuzione": stamp,
+                "Esito": s.outcome,
+                "Servizi_letti": "" if s.services is None else str(s.services),
+                "Promemoria_inviati": str(s.sent),
+                "Prossimo_promemoria": s.next_reminder.strftime("%d/%m/%Y") if s.next_reminder else "",
+            }
+            for row, s in sorted(self._rows.items())
+        }
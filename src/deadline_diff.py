@@ -0,0 +1,240 @@
+# deadline_diff.py
+
+# ============================================================
+# DIFFERENZE TRA ESECUZIONI (SCADENZE SPOSTATE, SERVIZI NUOVI/RIMOSSI)
+# ============================================================
+#
+# Ogni esecuzione legge i Gantt da zero e non sa cosa è cambiato
+# rispetto alla volta precedente. Qui si tiene, per ogni progetto,
+# l'ultima lista di servizi letta (snapshot) e la si confronta con
+# quella nuova, servizio per servizio, con chiave (area, nome):
+#
+#   - Gantt identico (stessa impronta) → nessun confronto riga per riga
+#   - altrimenti: servizi con scadenza/durata cambiata (servizi nuovi o
+#     rimossi non generano notifiche)
+#
+# Le scadenze spostate diventano una notifica "🔄 SCADENZA MODIFICATA"
+# (DEADLINE_CHANGE_NOTIFY, default attivo) nella stessa destinazione
+# dei promemoria del progetto.
+# Al primo confronto di un progetto (nessuno snapshot) si salva
+# soltanto lo snapshot.
+#
+# Snapshot in storage/deadline_snapshots.json, salvato a fine esecuzione:
+#
+# {
+#   "<tenant>|<progetto>|<chat_id>|<gantt_key>": {
+#       "fp": "<impronta servizi>",
+#       "services": {"<area>\u001f<servizio>": ["2026-10-21", 3]}
+#   }
+# }
+#
+# Il chat_id fa parte della chiave: due righe config con lo stesso nome e
+# lo stesso Gantt ma chat diverse hanno snapshot separati (e ognuna riceve
+# la propria notifica).
+#
+# ============================================================
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from gantt_reader import service_label
+from project_config import Project
+from reminders import Delivery
+from storage import load_json, save_json
+
+
+DEADLINE_CHANGE_NOTIFY = os.getenv("DEADLINE_CHANGE_NOTIFY", "1").strip().lower() in {"1", "true", "yes", "si"}
+
+SNAPSHOTS_FILE = "deadline_snapshots.json"
+
+# separatore area / servizio nelle chiavi dello snapshot
+_SEP = "\x1f"
+
+Service = Tuple[str, str, int, date]
+
+
+@dataclass(frozen=True)
+class DeadlineChange:
+    area: str
+    name: str
+    old_deadline: date
+    new_deadline: date
+    old_duration: int
+    new_duration: int
+
+
+@dataclass
+class ServiceDiff:
+    """
+    Differenze tra lo snapshot precedente e i servizi appena letti.
+    first: nessuno snapshot precedente (niente da confrontare).
+    """
+    first: bool = False
+    changed: List[DeadlineChange] = field(default_factory=list)
+
+    @property
+    def moved(self) -> List[DeadlineChange]:
+        """
+        Servizi con la scadenza spostata.
+        """
+        return [c for c in self.changed if c.old_deadline != c.new_deadline]
+
+
+def _fingerprint(services: List[Service]) -> str:
+    h = hashlib.sha1()
+    for s in services:
+        area, _, duration, deadline = s
+        h.update(f"{area}{_SEP}{service_label(s)}{_SEP}{duration}{_SEP}{deadline.isoformat()}\x1e".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _keyed(services: List[Service]) -> Dict[str, list]:
+    """
+    (area, nome) → [scadenza ISO, durata]; un nome ripetuto nella stessa
+    area riceve il numero di occorrenza (2, 3...) in ordine di riga.
+    Gantt a più tab: nome "Nome (Tab)" (service_label).
+    """
+    out: Dict[str, list] = {}
+    for s in services:
+        area, _, duration, deadline = s
+        name = service_label(s)
+        key = f"{area}{_SEP}{name}"
+        n = 1
+        while key in out:
+            n += 1
+            key = f"{area}{_SEP}{name}{_SEP}{n}"
+        out[key] = [deadline.isoformat(), duration]
+    return out
+
+
+def _area_name(key: str) -> Tuple[str, str]:
+    area, name = key.split(_SEP)[:2]
+    return area, name
+
+
+def diff_services(old: Dict[str, list], new: Dict[str, list]) -> ServiceDiff:
+    """
+    Confronto tra due snapshot (formato _keyed): servizi presenti in
+    entrambi con scadenza o durata diversa.
+    """
+    diff = ServiceDiff()
+    for key, value in new.items():
+        before = old.get(key)
+        if before is not None and before != value:
+            area, name = _area_name(key)
+            diff.changed.append(DeadlineChange(
+                area, name,
+                date.fromisoformat(before[0]), date.fromisoformat(value[0]),
+                before[1], value[1],
+            ))
+    return diff
+
+
+# ============================================================
+# SNAPSHOT PER PROGETTO
+# ============================================================
+
+class SnapshotStore:
+    """
+    Ultimo elenco servizi letto per progetto.
+
+    update() confronta e aggiorna in memoria; flush() salva su file
+    (una scrittura a fine esecuzione, solo se qualcosa è cambiato).
+    """
+
+    def __init__(self, filename: str = SNAPSHOTS_FILE):
+        self._filename = filename
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, dict]] = None
+        self._dirty = False
+
+    @staticmethod
+    def key(tenant_name: str, project: Project) -> str:
+        return f"{tenant_name}|{project.name}|{project.chat_id}|{project.gantt_key}"
+
+    def _current(self) -> Dict[str, dict]:
+        if self._data is None:
+            self._data = load_json(self._filename, {})
+        return self._data
+
+    def update(self, key: str, services: List[Service]) -> ServiceDiff:
+        fp = _fingerprint(services)
+        with self._lock:
+            previous = self._current().get(key)
+            if previous is not None and previous.get("fp") == fp:
+                return ServiceDiff()
+
+            new = _keyed(services)
+            diff = ServiceDiff(first=True) if previous is None else diff_services(previous.get("services", {}), new)
+            self._data[key] = {"fp": fp, "services": new}
+            self._dirty = True
+            return diff
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            save_json(self._filename, self._data)
+            self._dirty = False
+
+
+# ============================================================
+# NOTIFICA SCADENZE SPOSTATE
+# ============================================================
+
+def _change_line(c: DeadlineChange, prefix: str = "") -> str:
+    delta = (c.new_deadline - c.old_deadline).days
+    return (
+        f" 🏷️ {prefix}{c.name}: {c.old_deadline.strftime('%d/%m/%Y')} → "
+        f"{c.new_deadline.strftime('%d/%m/%Y')} ({delta:+d} giorni)"
+    )
+
+
+def _message(project_name: str, label: str, lines: List[str]) -> str:
+    return "\n".join(["🔄 SCADENZA MODIFICATA", f"📌 Progetto: {project_name}", f"🗂️ {label}", *lines])
+
+
+def render_changes(project: Project, diff: ServiceDiff, today: date) -> List[Delivery]:
+    """
+    Messaggi per le scadenze spostate (ignorate quelle già passate sia
+    prima che dopo), con la stessa destinazione dei promemoria:
+    un messaggio per area, oppure uno solo se Topic_Destinazione è compilato.
+    """
+    moved = [c for c in diff.moved if c.old_deadline >= today or c.new_deadline >= today]
+    if not moved:
+        return []
+
+    def days_left(items: List[DeadlineChange]) -> int:
+        return min((c.new_deadline - today).days for c in items)
+
+    if not project.topic_dest_raw:
+        by_area: Dict[str, List[DeadlineChange]] = {}
+        for c in moved:
+            by_area.setdefault(c.area, []).append(c)
+        return [
+            Delivery(
+                project.name,
+                project.chat_id,
+                area,
+                _message(project.name, area, [_change_line(c) for c in items]),
+                days_left=days_left(items),
+                row=project.row,
+            )
+            for area, items in by_area.items()
+        ]
+
+    label = project.topic_dest_name if project.topic_dest_name else (project.topic_dest_raw or "Generale")
+    return [Delivery(
+        project.name,
+        project.chat_id,
+        label,
+        _message(project.name, label, [_change_line(c, f"[{c.area}] ") for c in moved]),
+        forced_thread_id=project.forced_thread_id,
+        general=project.topic_dest_raw.strip().lower() == "generale",
+        days_left=days_left(moved),
+        row=project.row,
+    )]
@@ -0,0 +1,92 @@
+# drive_watcher.py
+
+# ============================================================
+# WATCHER MODIFICHE DRIVE (RIVALUTAZIONE IN GIORNATA)
+# ============================================================
+#
+# Il job giornaliero calcola i promemoria una volta al giorno: se un PM
+# anticipa una scadenza a "domani" alle 16:00, senza watcher nessuno
+# lo saprebbe fino al giorno dopo.
+#
+# Il watcher interroga periodicamente il feed modifiche di Drive
+# (changes.list) a partire da un page token salvato:
+#   - UNA chiamata (più eventuali pagine) per tutti i file del tenant,
+#     non una verifica per ogni Gantt
+#   - solo i Gantt effettivamente modificati vengono riletti
+#   - vengono inviati solo i promemoria nuovi rispetto a quelli già
+#     valutati oggi (SentLedger del tenant)
+#
+# Page token salvato per tenant in storage/drive_changes.json.
+#
+# ============================================================
+
+from typing import Dict, List, Set, Tuple
+
+from project_config import Project
+from storage import load_json, save_json
+
+
+TOKENS_FILE = "drive_changes.json"
+
+# Campi minimi richiesti al feed (riduce la risposta)
+CHANGES_FIELDS = "nextPageToken,newStartPageToken,changes(fileId,removed,time)"
+
+
+def load_page_token(tenant_name: str) -> str | None:
+    return load_json(TOKENS_FILE, {}).get(tenant_name)
+
+
+def save_page_token(tenant_name: str, token: str) -> None:
+    tokens = load_json(TOKENS_FILE, {})
+    tokens[tenant_name] = token
+    save_json(TOKENS_FILE, tokens)
+
+
+def poll_changes(drive, page_token: str | None, quota=None) -> Tuple[Dict[str, str], str]:
+    """
+    Legge il feed modifiche Drive a partire da page_token.
+
+    Ritorna:
+      - {fileId: orario modifica} dei file cambiati
+      - nuovo page token da salvare
+
+    Senza token (prima esecuzione) ritorna solo il token di partenza:
+    le modifiche precedenti sono già coperte dal job giornaliero.
+    """
+    if not page_token:
+        if quota is not None:
+            quota.acquire()
+        res = drive.changes().getStartPageToken(supportsAllDrives=True).execute()
+        return {}, res["startPageToken"]
+
+    changed: Dict[str, str] = {}
+    token = page_token
+
+    while True:
+        if quota is not None:
+            quota.acquire()
+        res = drive.changes().list(
+            pageToken=token,
+            fields=CHANGES_FIELDS,
+            pageSize=1000,
+            spaces="drive",
+            includeItemsFromAllDrives=True,
+            supportsAllDrives=True,
+        ).execute()
+
+        for change in res.get("changes", []):
+            file_id = change.get("fileId")
+            if file_id and not change.get("removed"):
+                changed[file_id] = change.get("time", "")
+
+        if "newStartPageToken" in res:
+            return changed, res["newStartPageToken"]
+
+        token = res["nextPageToken"]
+
+
+def changed_projects(projects: List[Project], changed_ids: Set[str]) -> List[Project]:
+    """
+    Progetti il cui Gantt compare tra i file modificati.
+    """
+    return [p for p in projects if p.gantt_key in changed_ids]
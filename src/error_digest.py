@@ -0,0 +1,170 @@
+# error_digest.py
+
+# ============================================================
+# RIEPILOGO ERRORI PER ERROR_CHAT_ID
+# ============================================================
+#
+# Invece di un messaggio Telegram per ogni riga config in errore,
+# gli errori di un'esecuzione vengono raccolti e inviati come un
+# unico riepilogo (diviso in più messaggi solo se troppo lungo).
+#
+# - Errori con stesso tipo e stessa causa vengono raggruppati
+#   (es. 200 righe con lo stesso HttpError 403 → una sola voce)
+# - Tra due riepiloghi passa almeno ERROR_DIGEST_MIN_MINUTES minuti:
+#   se il riepilogo arriva prima, gli errori restano in attesa e
+#   confluiscono nel successivo
+# - Il dettaglio completo (con traceback) va sempre nel file
+#   storage/errors.log, a rotazione come logging.RotatingFileHandler:
+#   oltre ERRORS_LOG_MAX_KB (default 1024) diventa errors.log.1 e così
+#   via, tenendo ERRORS_LOG_BACKUPS file (default 3)
+#
+# ============================================================
+
+import os
+import re
+import time
+import traceback
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from storage import storage_path
+
+
+# Intervallo minimo tra due riepiloghi (minuti)
+ERROR_DIGEST_MIN_MINUTES = float(os.getenv("ERROR_DIGEST_MIN_MINUTES", "60"))
+
+# Limite Telegram per un singolo messaggio
+TELEGRAM_MAX_CHARS = 4096
+
+# Righe elencate per ogni gruppo di errori (le altre vengono solo contate)
+MAX_ROWS_LISTED = 15
+
+# Dimensione massima di errors.log e numero di file ruotati tenuti
+ERRORS_LOG_MAX_KB = max(int(os.getenv("ERRORS_LOG_MAX_KB", "1024")), 1)
+ERRORS_LOG_BACKUPS = max(int(os.getenv("ERRORS_LOG_BACKUPS", "3")), 0)
+
+
+def _cause(e: Exception) -> str:
+    """
+    Causa "normalizzata" per il raggruppamento: id, numeri e url
+    vengono sostituiti, così lo stesso errore su fogli diversi
+    finisce nello stesso gruppo.
+    """
+    msg = str(e).strip().splitlines()[0] if str(e).strip() else ""
+    msg = re.sub(r"https?://\S+", "<url>", msg)
+    msg = re.sub(r"[A-Za-z0-9_-]{20,}", "<id>", msg)
+    msg = re.sub(r"\d+", "<n>", msg)
+    return msg[:200]
+
+
+def _rotate(p: str, incoming: int) -> None:
+    """
+    Come RotatingFileHandler: se aggiungere `incoming` byte porterebbe il
+    file oltre ERRORS_LOG_MAX_KB, errors.log → errors.log.1 → ... e il
+    più vecchio oltre ERRORS_LOG_BACKUPS viene eliminato.
+    """
+    try:
+        size = os.path.getsize(p)
+    except OSError:
+        return
+    if size == 0 or size + incoming <= ERRORS_LOG_MAX_KB * 1024:
+        return
+
+    if ERRORS_LOG_BACKUPS == 0:
+        os.remove(p)
+        return
+    for i in range(ERRORS_LOG_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{p}.{i}"):
+            os.replace(f"{p}.{i}", f"{p}.{i + 1}")
+    os.replace(p, f"{p}.1")
+
+
+class ErrorDigest:
+    """
+    Errori raccolti per una chat errori, in attesa di essere inviati.
+    """
+
+    def __init__(self, label: str = "", min_interval_minutes: float = ERROR_DIGEST_MIN_MINUTES):
+        self.label = label
+        self.min_interval = min_interval_minutes * 60
+        self.last_sent: Optional[float] = None
+        # (tipo, causa) -> {"example": str, "rows": [...], "count": int}
+        self._groups: Dict[Tuple[str, str], dict] = {}
+
+    def __len__(self) -> int:
+        return sum(g["count"] for g in self._groups.values())
+
+    def add(self, where: str, e: Exception) -> None:
+        """
+        Registra un errore.
+        where: contesto leggibile (es. "riga 12 (TEDx2030)").
+        """
+        key = (type(e).__name__, _cause(e))
+        group = self._groups.setdefault(key, {"example": str(e), "rows": [], "count": 0})
+        group["count"] += 1
+        if len(group["rows"]) < MAX_ROWS_LISTED:
+            group["rows"].append(where)
+
+        self._log(where, e)
+
+    def _log(self, where: str, e: Exception) -> None:
+        p = storage_path("errors.log")
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        details = "".join(traceback.format_exception(type(e), e, e.__traceback__)).rstrip()
+        entry = f"[{datetime.now().isoformat(timespec='seconds')}] [{self.label}] {where}\n{details}\n\n"
+        _rotate(p, len(entry.encode("utf-8")))
+        with open(p, "a", encoding="utf-8") as f:
+            f.write(entry)
+
+    def due(self, now: Optional[float] = None) -> bool:
+        """
+        True se ci sono errori e l'intervallo minimo è trascorso.
+        """
+        if not self._groups:
+            return False
+        now = time.monotonic() if now is None else now
+        return self.last_sent is None or now - self.last_sent >= self.min_interval
+
+    def render(self) -> List[str]:
+        """
+        Testo del riepilogo, diviso in messaggi entro il limite Telegram.
+        """
+        total = len(self)
+        header = f"⚠️ Riepilogo errori{f' ({self.label})' if self.label else ''}: {total} errori"
+        blocks: List[str] = []
+
+        groups = sorted(self._groups.items(), key=lambda kv: -kv[1]["count"])
+        for (etype, _), g in groups:
+            lines = [f"• {etype} ×{g['count']}: {g['example'][:300]}"]
+            rows = ", ".join(g["rows"])
+            others = g["count"] - len(g["rows"])
+            if others > 0:
+                rows += f" (+{others} altre)"
+            lines.append(f"  {rows}")
+            blocks.append("\n".join(lines))
+
+        blocks.append("Dettagli completi in storage/errors.log")
+
+        messages: List[str] = []
+        current = header
+        for block in blocks:
+            block = block[: TELEGRAM_MAX_CHARS - 10]
+            if len(current) + 2 + len(block) > TELEGRAM_MAX_CHARS:
+                messages.append(current)
+                current = block
+            else:
+                current += "\n\n" + block
+        messages.append(current)
+        return messages
+
+    def take(self, now: Optional[float] = None) -> List[str]:
+        """
+        Se il riepilogo è dovuto: ritorna i messaggi e svuota gli errori.
+        Altrimenti ritorna lista vuota (gli errori restano in attesa).
+        """
+        if not self.due(now):
+            return []
+        messages = self.render()
+        self._groups = {}
+        self.last_sent = time.monotonic() if now is None else now
+        return messages
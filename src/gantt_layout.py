@@ -0,0 +1,438 @@
+# gantt_layout.py
+
+# ============================================================
+# RILEVAMENTO LAYOUT GANTT (UNA VOLTA PER FOGLIO)
+# ============================================================
+#
+# Il template standard ha:
+#   tab "GANTT", intestazione "Nome area" in B9, durata in D,
+#   scadenza in E, data inizio in F9 (cella dopo "Scadenza")
+#
+# Un Gantt con un template diverso (tab rinominato, righe inserite
+# sopra, colonne spostate) prima veniva letto come vuoto o dava errore.
+#
+# Il layout di ogni foglio viene rilevato UNA volta:
+#   1) spreadsheets.get con fields ridotto ai soli titoli dei tab
+#   2) spreadsheets.get delle prime SCAN_ROWS righe dei tab candidati
+#      ("GANTT", poi i tab con "gantt" nel nome, poi gli altri),
+#      con fields ridotto al solo testo delle celle
+#   3) la riga con "Nome area" è l'intestazione; nella stessa riga si
+#      cercano "Durata" e "Scadenza" (altrimenti: 2 e 3 colonne dopo)
+#
+# Il layout viene salvato per spreadsheet in storage/gantt_layouts.json:
+# le esecuzioni successive leggono direttamente il range esatto.
+# Il file viene riscritto una volta a fine esecuzione (LayoutCache.flush),
+# non ad ogni layout rilevato.
+# Un layout senza intestazione (has_header=False, layout standard di
+# ripiego) non è verificabile alla lettura: resta solo in memoria per
+# HEADERLESS_RETRY_HOURS ore (default 24), poi viene rilevato di nuovo,
+# così un'intestazione aggiunta in seguito viene trovata.
+# Le Sheets API non espongono una revisione del foglio: la verifica è
+# gratuita perché il range letto parte dall'intestazione; se la prima
+# riga non è più "Nome area" (o il tab non esiste più) il layout viene
+# rilevato di nuovo. Errori di rete o di quota (429, 5xx, timeout) non
+# fanno rilevare nulla: vengono propagati subito (is_transport_error).
+#
+# ============================================================
+
+import fnmatch
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+from storage import load_json, save_json
+
+
+# Righe / tab esaminati per trovare l'intestazione
+SCAN_ROWS = 40
+SCAN_LAST_COL = "Z"
+MAX_TABS = 5
+
+HEADER_NAME = "nome area"
+
+LAYOUTS_FILE = "gantt_layouts.json"
+
+# Ore prima di rilevare di nuovo un Gantt senza intestazione
+HEADERLESS_RETRY_HOURS = float(os.getenv("HEADERLESS_RETRY_HOURS", "24"))
+
+
+def col_letter(index: int) -> str:
+    """
+    0 → "A", 25 → "Z", 26 → "AA"
+    """
+    s = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        s = chr(ord("A") + rem) + s
+    return s
+
+
+def sheet_ref(title: str) -> str:
+    """
+    Nome tab per la notazione A1 (tra apici se contiene spazi o simboli).
+    """
+    if re.fullmatch(r"[A-Za-z0-9_]+", title):
+        return title
+    return "'" + title.replace("'", "''") + "'"
+
+
+def _norm(v) -> str:
+    return str(v or "").strip().lower()
+
+
+# ============================================================
+# LAYOUT
+# ============================================================
+
+@dataclass(frozen=True)
+class GanttLayout:
+    """
+    Posizione dei dati in un Gantt.
+    Colonne 0-based (1 = B), righe 1-based.
+
+    - header_row: riga con "Nome area" (i dati seguono)
+    - has_header: False se l'intestazione non è stata trovata e si usa
+      il layout standard (nessuna verifica alla lettura)
+    """
+    worksheet: str = "GANTT"
+    header_row: int = 9
+    name_col: int = 1
+    duration_col: int = 3
+    deadline_col: int = 4
+    has_header: bool = True
+
+    @property
+    def start_cell(self) -> str:
+        """
+        Cella data inizio progetto: dopo "Scadenza" nella riga intestazione.
+        """
+        return f"{col_letter(self.deadline_col + 1)}{self.header_row}"
+
+    @property
+    def columns(self) -> tuple:
+        """
+        Lettere colonna (nome, durata, scadenza), per i riferimenti cella.
+        """
+        return col_letter(self.name_col), col_letter(self.duration_col), col_letter(self.deadline_col)
+
+    def data_range(self, max_rows: int = 1200) -> str:
+        first = min(self.name_col, self.duration_col, self.deadline_col)
+        last = max(self.name_col, self.duration_col, self.deadline_col)
+        end_row = self.header_row + max_rows - 1
+        return f"{sheet_ref(self.worksheet)}!{col_letter(first)}{self.header_row}:{col_letter(last)}{end_row}"
+
+    def canonical(self, values: List[list]) -> List[list]:
+        """
+        Righe lette da data_range() nella forma standard B..E
+        ([nome, _, durata, scadenza]) attesa da parse_gantt_rows.
+        """
+        first = min(self.name_col, self.duration_col, self.deadline_col)
+        offsets = (self.name_col - first, self.duration_col - first, self.deadline_col - first)
+        if offsets == (0, 2, 3):
+            return values
+
+        def cell(row, i):
+            return row[i] if i < len(row) else ""
+
+        return [
+            [cell(row, offsets[0]), "", cell(row, offsets[1]), cell(row, offsets[2])] if row else []
+            for row in values
+        ]
+
+    def matches(self, values: List[list]) -> bool:
+        """
+        True se le righe lette iniziano con l'intestazione attesa.
+        """
+        if not self.has_header:
+            return True
+        return bool(values) and bool(values[0]) and _norm(values[0][0]) == HEADER_NAME
+
+
+DEFAULT_LAYOUT = GanttLayout()
+
+
+def find_layout(worksheet: str, rows: List[list], first_row: int = 1) -> Optional[GanttLayout]:
+    """
+    Cerca la riga "Nome area" nelle righe (testo) di un tab.
+    rows[0] è la riga first_row, colonna A.
+    """
+    for i, row in enumerate(rows):
+        cells = [_norm(v) for v in row]
+        if HEADER_NAME not in cells:
+            continue
+
+        name_col = cells.index(HEADER_NAME)
+        duration_col = next((c for c, v in enumerate(cells) if c > name_col and v.startswith("durata")), name_col + 2)
+        deadline_col = next((c for c, v in enumerate(cells) if c > name_col and v.startswith("scadenza")), name_col + 3)
+        return GanttLayout(
+            worksheet=worksheet,
+            header_row=first_row + i,
+            name_col=name_col,
+            duration_col=duration_col,
+            deadline_col=deadline_col,
+        )
+    return None
+
+
+def _candidate_tabs(titles: List[str], preferred: str) -> List[str]:
+    exact = [t for t in titles if t.strip().lower() == preferred.lower()]
+    named = [t for t in titles if "gantt" in t.lower() and t not in exact]
+    others = [t for t in titles if t not in exact and t not in named]
+    return (exact + named + others)[:MAX_TABS]
+
+
+def tab_titles(service, key: str, quota=None) -> List[str]:
+    """
+    Titoli dei tab di uno spreadsheet (fields ridotto ai soli titoli).
+    """
+    if quota is not None:
+        quota.acquire()
+    meta = service.spreadsheets().get(spreadsheetId=key, fields="sheets.properties.title").execute()
+    return [s["properties"]["title"] for s in meta.get("sheets", [])]
+
+
+def scan_tabs(service, key: str, tabs: List[str], quota=None) -> Dict[str, GanttLayout]:
+    """
+    Cerca l'intestazione nelle prime SCAN_ROWS righe dei tab indicati,
+    con una sola chiamata spreadsheets.get (solo testo delle celle).
+    Ritorna solo i tab in cui "Nome area" è stato trovato.
+    """
+    if quota is not None:
+        quota.acquire()
+    grid = service.spreadsheets().get(
+        spreadsheetId=key,
+        ranges=[f"{sheet_ref(t)}!A1:{SCAN_LAST_COL}{SCAN_ROWS}" for t in tabs],
+        includeGridData=True,
+        fields="sheets(properties(title),data(startRow,rowData(values(formattedValue))))",
+    ).execute()
+
+    found: Dict[str, GanttLayout] = {}
+    for sheet in grid.get("sheets", []):
+        title = sheet.get("properties", {}).get("title", "")
+        for block in sheet.get("data", []):
+            rows = [
+                [cell.get("formattedValue", "") for cell in row.get("values", [])]
+                for row in block.get("rowData", [])
+            ]
+            layout = find_layout(title, rows, first_row=block.get("startRow", 0) + 1)
+            if layout is not None:
+                found.setdefault(title, layout)
+    return found
+
+
+def detect_layout(service, key: str, quota=None, preferred: str = "GANTT") -> GanttLayout:
+    """
+    Rileva il layout di un Gantt via Sheets API (2 chiamate).
+    Intestazione non trovata → layout standard senza verifica.
+    """
+    candidates = _candidate_tabs(tab_titles(service, key, quota), preferred)
+    if not candidates:
+        return GanttLayout(worksheet=preferred, has_header=False)
+
+    found = scan_tabs(service, key, candidates, quota)
+
+    for title in candidates:
+        if title in found:
+            return found[title]
+
+    worksheet = candidates[0] if candidates[0].lower() == preferred.lower() else preferred
+    return GanttLayout(worksheet=worksheet, has_header=False)
+
+
+# ============================================================
+# PIU' TAB PER GANTT (colonna config Fogli_Gantt)
+# ============================================================
+
+def is_pattern(title: str) -> bool:
+    return any(ch in title for ch in "*?[")
+
+
+def match_tabs(titles: List[str], wanted: List[str]) -> List[str]:
+    """
+    Tab da leggere, nell'ordine del foglio: titoli esatti (senza
+    distinzione maiuscole/minuscole) o pattern tipo "Fase *".
+    """
+    out = []
+    for title in titles:
+        if any(
+            fnmatch.fnmatchcase(title.lower(), w.lower()) if is_pattern(w) else title.lower() == w.lower()
+            for w in wanted
+        ):
+            out.append(title)
+    return out
+
+
+def tab_key(key: str, tab: str) -> str:
+    """
+    Chiave in cache del layout di un singolo tab.
+    """
+    return f"{key}!{tab}"
+
+
+# ============================================================
+# CACHE LAYOUT (PER SPREADSHEET)
+# ============================================================
+
+def _http_status(e: Exception) -> Optional[int]:
+    # googleapiclient.errors.HttpError: stato in e.resp.status
+    try:
+        return int(getattr(getattr(e, "resp", None), "status", None))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transport_error(e: Exception) -> bool:
+    """
+    Errore di rete o di quota (HTTP diverso da 400: 429, 5xx, permessi;
+    connessione, timeout): non dipende dal layout.
+    """
+    status = _http_status(e)
+    if status is not None:
+        return status != 400
+    return isinstance(e, OSError)
+
+
+def is_layout_error(e: Exception) -> bool:
+    """
+    True se l'errore di lettura dipende dal layout e un nuovo
+    rilevamento può risolverlo: HTTP 400 ("Unable to parse range",
+    tab rinominato), ValueError dei controlli di lettura (data inizio
+    vuota) e dei file locali ("Tab ... non trovato").
+    """
+    if is_transport_error(e):
+        return False
+    return _http_status(e) == 400 or isinstance(e, (ValueError, KeyError, IndexError))
+
+
+class LayoutCache:
+    """
+    Layout rilevati: spreadsheet key (o key!tab, vedi tab_key) → GanttLayout.
+
+    filename: file JSON in storage/ (None = solo in memoria).
+    put() aggiorna la memoria, flush() salva (solo se qualcosa è cambiato).
+    I layout senza intestazione non vengono salvati e scadono dopo
+    HEADERLESS_RETRY_HOURS.
+    Thread-safe: i worker di fetch leggono in thread separati.
+    """
+
+    def __init__(self, filename: Optional[str] = LAYOUTS_FILE):
+        self._filename = filename
+        self._lock = threading.Lock()
+        self._layouts: Optional[Dict[str, GanttLayout]] = None
+        # key → scadenza (time.monotonic) dei layout senza intestazione
+        self._headerless: Dict[str, float] = {}
+        self._dirty = False
+        self.detections = 0
+
+    def _current(self) -> Dict[str, GanttLayout]:
+        if self._layouts is None:
+            raw = load_json(self._filename, {}) if self._filename else {}
+            self._layouts = {}
+            for key, data in raw.items():
+                try:
+                    layout = GanttLayout(**data)
+                except TypeError:
+                    # voce di un formato vecchio: verrà rilevata di nuovo
+                    continue
+                # salvato da una versione precedente: rilevato di nuovo
+                # e tolto dal file al prossimo flush
+                if layout.has_header:
+                    self._layouts[key] = layout
+                else:
+                    self._dirty = True
+        return self._layouts
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[GanttLayout]:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            layouts = self._current()
+            if key in self._headerless and self._headerless[key] <= now:
+                # senza intestazione da troppo: nuovo rilevamento
+                del self._headerless[key]
+                layouts.pop(key, None)
+            return layouts.get(key)
+
+    def put(self, key: str, layout: GanttLayout, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            layouts = self._current()
+            if not layout.has_header:
+                if key not in self._headerless:
+                    # prima salvato con intestazione: va tolto dal file
+                    self._dirty = self._dirty or key in layouts
+                    self._headerless[key] = now + HEADERLESS_RETRY_HOURS * 3600
+                layouts[key] = layout
+                return
+            self._headerless.pop(key, None)
+            if layouts.get(key) == layout:
+                return
+            layouts[key] = layout
+            self._dirty = True
+
+    def flush(self) -> None:
+        """
+        Salva i layout con intestazione, se cambiati dall'ultimo flush.
+        """
+        with self._lock:
+            if not self._dirty or not self._filename:
+                return
+            save_json(self._filename, {
+                k: asdict(v) for k, v in self._layouts.items() if k not in self._headerless
+            })
+            self._dirty = False
+
+    def fetch(
+        self,
+        key: str,
+        read: Callable[[GanttLayout], List[list]],
+        detect: Callable[[], GanttLayout],
+        fallback: GanttLayout = DEFAULT_LAYOUT,
+    ) -> List[list]:
+        """
+        Legge il Gantt con il layout in cache; al primo accesso, o se il
+        layout non corrisponde più al foglio, lo rileva e rilegge.
+        Ritorna le righe nella forma standard B..E.
+
+        Rilevamento fallito → lettura con `fallback` (non salvato:
+        si riprova alla lettura successiva).
+        """
+        cached = self.get(key)
+        error: Optional[Exception] = None
+        if cached is not None:
+            try:
+                values = read(cached)
+                if cached.matches(values):
+                    return cached.canonical(values)
+            except Exception as e:
+                # rete / quota: nessun rilevamento, l'errore esce subito
+                if not is_layout_error(e):
+                    raise
+                # tab rinominato, righe inserite (data inizio vuota)...
+                error = e
+            print(f"🔁 Layout Gantt {key} da verificare: nuovo rilevamento")
+
+        try:
+            layout = detect()
+        except Exception as e:
+            if error is not None:
+                raise error
+            if is_transport_error(e):
+                raise
+            print(f"⚠️ Rilevamento layout Gantt {key} fallito ({type(e).__name__}: {e}): layout standard")
+            return fallback.canonical(read(fallback))
+
+        if error is not None and layout == cached:
+            # layout invariato: l'errore non dipende dal layout
+            raise error
+
+        self.detections += 1
+        self.put(key, layout)
+        return layout.canonical(read(layout))
+
+
+# Cache condivisa (le key degli spreadsheet sono univoche tra i tenant)
+LAYOUTS = LayoutCache()
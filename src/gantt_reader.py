@@ -5,8 +5,22 @@
 # ============================================================
 
 import re
+from dataclasses import replace
 from datetime import date, datetime, timedelta
-from typing import List, Tuple, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from gantt_layout import (
+    LAYOUTS,
+    GanttLayout,
+    LayoutCache,
+    detect_layout,
+    is_pattern,
+    match_tabs,
+    scan_tabs,
+    sheet_ref,
+    tab_key,
+    tab_titles,
+)
 
 
 # ============================================================
@@ -67,7 +81,7 @@ def gs_serial_to_date(serial: float) -> date:
 # LETTURA CELLA SINGOLA
 # ============================================================
 
-def _get_cell(sheet_api, spreadsheet_id: str, a1: str, value_render_option: str) -> Optional[str]:
+def _get_cell(sheet_api, spreadsheet_id: str, a1: str, value_render_option: str, quota=None) -> Optional[str]:
     """
     Legge una singola cella da Google Sheets usando A1 notation.
 
@@ -76,10 +90,14 @@ def _get_cell(sheet_api, spreadsheet_id: str, a1: str, value_render_option: str)
     - spreadsheet_id: ID foglio
     - a1: riferimento cella (es: "GANTT!F9")
     - value_render_option: UNFORMATTED_VALUE o FORMATTED_VALUE
+    - quota: budget chiamate del tenant (quota.QuotaBudget), opzionale
 
     Ritorna:
     - valore cella oppure None se vuota
     """
+    if quota is not None:
+        quota.acquire()
+
     res = sheet_api.values().get(
         spreadsheetId=spreadsheet_id,
         range=a1,
@@ -96,9 +114,9 @@ def _get_cell(sheet_api, spreadsheet_id: str, a1: str, value_render_option: str)
 # LETTURA DATA INIZIO PROGETTO (F9)
 # ============================================================
 
-def read_start_date(service, spreadsheet_id: str, worksheet_title: str, debug: bool = False) -> date:
+def read_start_date(service, spreadsheet_id: str, worksheet_title: str, debug: bool = False, quota=None, cell: str = "F9") -> date:
     """
-    Legge la data inizio progetto da cella F9.
+    Legge la data inizio progetto da cella F9 (o `cell`, dal layout rilevato).
 
     Logica robusta:
     1) Prova come seriale numerico (UNFORMATTED_VALUE)
@@ -113,18 +131,36 @@ def read_start_date(service, spreadsheet_id: str, worksheet_title: str, debug: b
 
     # 1) Tentativo lettura seriale numerico
     try:
-        raw = _get_cell(sheet_api, spreadsheet_id, f"{worksheet_title}!F9", "UNFORMATTED_VALUE")
+        raw = _get_cell(sheet_api, spreadsheet_id, f"{worksheet_title}!{cell}", "UNFORMATTED_VALUE", quota)
         if raw is not None and str(raw).strip() != "":
             d = gs_serial_to_date(float(raw))
             if debug:
-                print(f"[GANTT] F9 unformatted={raw} -> start_date={d}")
+                print(f"[GANTT] {cell} unformatted={raw} -> start_date={d}")
             return d
     except Exception as e:
         if debug:
-            print(f"[GANTT] F9 unformatted read failed: {type(e).__name__}: {e}")
+            print(f"[GANTT] {cell} unformatted read failed: {type(e).__name__}: {e}")
 
     # 2) Fallback: stringa formattata
-    raw = _get_cell(sheet_api, spreadsheet_id, f"{worksheet_title}!F9", "FORMATTED_VALUE")
+    raw = _get_cell(sheet_api, spreadsheet_id, f"{worksheet_title}!{cell}", "FORMATTED_VALUE", quota)
+    return parse_start_date_text(raw)
+
+
+def check_start_value(raw) -> date:
+    """
+    Data inizio letta come UNFORMATTED_VALUE: seriale, altrimenti testo
+    (stessa logica di read_start_date, senza la seconda lettura).
+    """
+    if isinstance(raw, (int, float)) and not isinstance(raw, bool):
+        return gs_serial_to_date(raw)
+    return parse_start_date_text(raw)
+
+
+def parse_start_date_text(raw) -> date:
+    """
+    Interpreta la data inizio (F9) letta come testo:
+    dd/mm, dd/mm/yy, dd/mm/yyyy o ISO.
+    """
     if not raw:
         raise ValueError("Cella F9 (data inizio progetto) vuota")
 
@@ -231,64 +267,159 @@ def parse_duration_days(v) -> int:
 # ============================================================
 # LETTURA SERVIZI DAL GANTT
 # ============================================================
+#
+# La lettura è divisa in due fasi, usabili separatamente
+# (es. dalla pipeline del job, che le esegue in stadi diversi):
+#
+#   fetch_gantt_values → righe grezze (chiamate Google API)
+#   parse_gantt_rows   → servizi (solo CPU, nessuna chiamata)
+#
+# ============================================================
 
-def read_services_deadlines(
+class GanttService(tuple):
+    """
+    Servizio letto da un Gantt a più tab (Fogli_Gantt):
+
+        (AREA, NomeServizio, DurataGiorni, Scadenza) + .tab
+
+    Si comporta come la tupla normale (unpacking, confronti): il tab è
+    contesto in più, mostrato nei messaggi (service_label).
+    """
+    tab = ""
+
+    def __new__(cls, area: str, name: str, duration: int, deadline: date, tab: str = ""):
+        self = super().__new__(cls, (area, name, duration, deadline))
+        self.tab = tab
+        return self
+
+    def __getnewargs__(self):
+        return (*self, self.tab)
+
+
+def service_label(service) -> str:
+    """
+    Nome del servizio da mostrare: "Nome (Tab)" per i Gantt a più tab.
+    """
+    tab = getattr(service, "tab", "")
+    return f"{service[1]} ({tab})" if tab else service[1]
+
+
+class TabbedRows(list):
+    """
+    Righe di più tab dello stesso Gantt (fetch_gantt_tabs):
+    lista di (layout, righe B..E), un elemento per tab.
+    parse_gantt_rows le interpreta tab per tab.
+    """
+
+
+def fetch_gantt_values(
     service,
     gantt_url: str,
     worksheet_title: str = "GANTT",
     start_row: int = 9,
     max_rows: int = 1200,
     debug: bool = False,
-) -> List[Tuple[str, str, int, date]]:
+    quota=None,
+    layout: Optional[GanttLayout] = None,
+) -> List[list]:
     """
-    Legge il Gantt e ritorna lista di servizi nel formato:
-
-        (AREA, NomeServizio, DurataGiorni, Scadenza)
+    Legge dal Gantt il blocco B{start_row}:E{end_row} così com'è
+    (UNFORMATTED_VALUE), senza interpretarlo.
 
-    Logica di riconoscimento AREA:
-      - Colonna B non vuota
-      - Colonna D (durata) vuota
-      - Colonna E (scadenza) vuota
-      → è titolo area
+    layout: posizione dei dati rilevata (gantt_layout.py); se data
+    sostituisce worksheet_title/start_row e il range letto è quello del
+    layout (righe NON ancora riportate alla forma B..E: layout.canonical).
 
-    Colonne lette:
-      B = Nome area / Nome servizio
-      D = Durata
-      E = Scadenza
+    quota: budget chiamate del tenant (quota.QuotaBudget), opzionale.
     """
+    if layout is None:
+        layout = GanttLayout(worksheet=worksheet_title, header_row=start_row, has_header=False)
 
     # Estrazione ID foglio
     key = extract_spreadsheet_key(gantt_url)
     sheet_api = service.spreadsheets()
 
     # Lettura data inizio progetto (utile per robustezza futura)
-    _ = read_start_date(service, key, worksheet_title, debug=debug)
+    _ = read_start_date(service, key, sheet_ref(layout.worksheet), debug=debug, quota=quota, cell=layout.start_cell)
 
-    # Calcolo range dinamico
-    end_row = start_row + max_rows - 1
-    rng = f"{worksheet_title}!B{start_row}:E{end_row}"
+    # Range dinamico
+    rng = layout.data_range(max_rows)
 
     # Lettura blocco dati
+    if quota is not None:
+        quota.acquire()
     res = sheet_api.values().get(
         spreadsheetId=key,
         range=rng,
         valueRenderOption="UNFORMATTED_VALUE",
     ).execute()
 
-    values = res.get("values", [])
+    return res.get("values", [])
+
+
+def parse_gantt_rows(
+    values: List[list],
+    today: Optional[date] = None,
+    issues: Optional[List[Tuple[str, str]]] = None,
+    start_row: int = 9,
+    worksheet_title: str = "GANTT",
+    columns: Tuple[str, str, str] = ("B", "D", "E"),
+    tab: str = "",
+) -> List[Tuple[str, str, int, date]]:
+    """
+    Interpreta le righe grezze B..E del Gantt e ritorna lista di servizi:
+
+        (AREA, NomeServizio, DurataGiorni, Scadenza)
+
+    TabbedRows (Gantt a più tab): ogni tab viene interpretato con il suo
+    layout e i servizi sono GanttService con il tab di provenienza
+    (l'area riparte da "Generale" ad ogni tab).
+
+    Logica di riconoscimento AREA:
+      - Colonna B non vuota
+      - Colonna D (durata) vuota
+      - Colonna E (scadenza) vuota
+      → è titolo area
+
+    issues: se passata, riceve (cella, motivo) per ogni riga servizio
+    scartata, es. ("GANTT!E15", "scadenza non valida: 'boh'").
+    start_row / worksheet_title / columns (nome, durata, scadenza) servono
+    solo per i riferimenti cella.
+    """
+    if isinstance(values, TabbedRows):
+        merged: List[Tuple[str, str, int, date]] = []
+        for layout, rows in values:
+            merged.extend(parse_gantt_rows(
+                rows,
+                today,
+                issues,
+                start_row=layout.header_row,
+                worksheet_title=layout.worksheet,
+                columns=layout.columns,
+                tab=layout.worksheet,
+            ))
+        return merged
 
     out: List[Tuple[str, str, int, date]] = []
     current_area = "Generale"  # fallback se nessuna area definita
-    today = date.today()
+    today = today or date.today()
+
+    col_name, col_duration, col_deadline = columns
+
+    def drop(col: str, r: int, reason: str):
+        if issues is not None:
+            issues.append((f"{worksheet_title}!{col}{r}", reason))
+
+    for i, row in enumerate(values):
+        r = start_row + i
 
-    for row in values:
         # Garantisce almeno 4 colonne (B,C,D,E)
         while len(row) < 4:
             row.append("")
 
-        nome = (row[0] or "").strip()  # Colonna B
-        durata_raw = row[2]            # Colonna D
-        scad_raw = row[3]              # Colonna E
+        nome = str(row[0] or "").strip()  # Colonna B
+        durata_raw = row[2]               # Colonna D
+        scad_raw = row[3]                 # Colonna E
 
         durata_str = str(durata_raw).strip() if durata_raw is not None else ""
         scad_str = str(scad_raw).strip() if scad_raw is not None else ""
@@ -307,16 +438,202 @@ def read_services_deadlines(
             continue
 
         # Riga servizio incompleta
-        if not nome or not durata_str or not scad_str:
+        if not nome:
+            drop(col_name, r, "nome servizio mancante")
+            continue
+        if not durata_str:
+            drop(col_duration, r, f"durata mancante ({nome})")
+            continue
+        if not scad_str:
+            drop(col_deadline, r, f"scadenza mancante ({nome})")
             continue
 
-        # Parsing robusto
+        # Parsing robusto: una riga sporca non deve bloccare l'intero Gantt
         try:
             durata = parse_duration_days(durata_raw)
+        except Exception:
+            drop(col_duration, r, f"durata non valida: {durata_str!r} ({nome})")
+            continue
+        try:
             scad = parse_deadline_value(scad_raw, today)
-            out.append((current_area, nome, durata, scad))
         except Exception:
-            # Una riga sporca non deve bloccare l'intero Gantt
+            drop(col_deadline, r, f"scadenza non valida: {scad_str!r} ({nome})")
             continue
 
-    return out
\ No newline at end of file
+        out.append(GanttService(current_area, nome, durata, scad, tab) if tab else (current_area, nome, durata, scad))
+
+    return out
+
+
+def fetch_gantt_detected(
+    service,
+    gantt_url: str,
+    worksheet_title: str = "GANTT",
+    start_row: int = 9,
+    max_rows: int = 1200,
+    debug: bool = False,
+    quota=None,
+    cache: LayoutCache = LAYOUTS,
+) -> List[list]:
+    """
+    Come fetch_gantt_values, ma con il layout del foglio rilevato una
+    volta e tenuto in cache (gantt_layout.py). Righe in forma B..E.
+
+    worksheet_title: tab preferito nel rilevamento.
+    start_row: riga dati se l'intestazione "Nome area" non si trova.
+    """
+    key = extract_spreadsheet_key(gantt_url)
+
+    def detect() -> GanttLayout:
+        layout = detect_layout(service, key, quota, preferred=worksheet_title)
+        if not layout.has_header:
+            layout = replace(layout, header_row=start_row)
+        if debug:
+            print(f"[GANTT] layout {key}: {layout}")
+        return layout
+
+    def read(layout: GanttLayout) -> List[list]:
+        return fetch_gantt_values(service, gantt_url, max_rows=max_rows, debug=debug, quota=quota, layout=layout)
+
+    fallback = GanttLayout(worksheet=worksheet_title, header_row=start_row, has_header=False)
+    return cache.fetch(key, read, detect, fallback)
+
+
+def fetch_gantt_tabs(
+    service,
+    gantt_url: str,
+    worksheets: Sequence[str],
+    max_rows: int = 1200,
+    debug: bool = False,
+    quota=None,
+    cache: LayoutCache = LAYOUTS,
+) -> TabbedRows:
+    """
+    Legge più tab dello stesso Gantt (titoli o pattern tipo "Fase *")
+    con UNA chiamata values.batchGet: per ogni tab la cella data inizio
+    e il blocco dati del suo layout.
+
+    Chiamate in più solo se servono:
+      - pattern → titoli dei tab (spreadsheets.get, solo titoli)
+      - tab senza layout in cache → un rilevamento per tutti i tab nuovi
+      - layout non più valido (intestazione spostata, data inizio non
+        leggibile) → nuovo rilevamento e seconda batchGet dei soli tab
+        cambiati
+    """
+    key = extract_spreadsheet_key(gantt_url)
+
+    if any(is_pattern(w) for w in worksheets):
+        tabs = match_tabs(tab_titles(service, key, quota), list(worksheets))
+        if not tabs:
+            raise ValueError(f"Nessun tab del Gantt corrisponde a Fogli_Gantt: {', '.join(worksheets)}")
+    else:
+        tabs = list(dict.fromkeys(worksheets))
+
+    def detect(titles: List[str]) -> Dict[str, GanttLayout]:
+        found = {t.lower(): layout for t, layout in scan_tabs(service, key, titles, quota).items()}
+        cache.detections += 1
+        out = {}
+        for t in titles:
+            out[t] = found.get(t.lower()) or GanttLayout(worksheet=t, has_header=False)
+            cache.put(tab_key(key, t), out[t])
+            if debug:
+                print(f"[GANTT] layout {key} tab {t}: {out[t]}")
+        return out
+
+    def read(layouts: Dict[str, GanttLayout]) -> Dict[str, Tuple[List[list], Optional[Exception]]]:
+        ranges = []
+        for layout in layouts.values():
+            ranges += [f"{sheet_ref(layout.worksheet)}!{layout.start_cell}", layout.data_range(max_rows)]
+        if quota is not None:
+            quota.acquire()
+        res = service.spreadsheets().values().batchGet(
+            spreadsheetId=key,
+            ranges=ranges,
+            valueRenderOption="UNFORMATTED_VALUE",
+        ).execute()
+        value_ranges = res.get("valueRanges", [])
+
+        out = {}
+        for i, (t, layout) in enumerate(layouts.items()):
+            start = value_ranges[2 * i].get("values", []) if 2 * i < len(value_ranges) else []
+            rows = value_ranges[2 * i + 1].get("values", []) if 2 * i + 1 < len(value_ranges) else []
+            error = None
+            try:
+                check_start_value(start[0][0] if start and start[0] else None)
+                if not layout.matches(rows):
+                    raise ValueError("intestazione \"Nome area\" non trovata")
+            except Exception as e:
+                error = e
+            out[t] = (rows, error)
+        return out
+
+    layouts = {t: cache.get(tab_key(key, t)) for t in tabs}
+    missing = [t for t, layout in layouts.items() if layout is None]
+    fresh = detect(missing) if missing else {}
+    layouts.update(fresh)
+    results = read(layouts)
+
+    # layout in cache non più validi: nuovo rilevamento dei soli tab coinvolti
+    stale = [t for t, (_, error) in results.items() if error is not None and t not in fresh]
+    if stale:
+        print(f"🔁 Layout Gantt {key} tab {', '.join(stale)} da verificare: nuovo rilevamento")
+        redetected = detect(stale)
+        changed = {t: layout for t, layout in redetected.items() if layout != layouts[t]}
+        layouts.update(changed)
+        if changed:
+            results.update(read(changed))
+
+    blocks = TabbedRows()
+    for t in tabs:
+        rows, error = results[t]
+        if error is not None:
+            raise ValueError(f"Tab '{t}': {error}") from error
+        blocks.append((layouts[t], layouts[t].canonical(rows)))
+    return blocks
+
+
+def read_services_deadlines(
+    service,
+    gantt_url: str,
+    worksheet_title: Union[str, Sequence[str]] = "GANTT",
+    start_row: int = 9,
+    max_rows: int = 1200,
+    debug: bool = False,
+    quota=None,
+) -> List[Tuple[str, str, int, date]]:
+    """
+    Legge il Gantt e ritorna lista di servizi nel formato:
+
+        (AREA, NomeServizio, DurataGiorni, Scadenza)
+
+    Colonne lette (template standard, altrimenti quelle rilevate):
+      B = Nome area / Nome servizio
+      D = Durata
+      E = Scadenza
+
+    worksheet_title: un titolo, oppure più titoli / pattern ("Fase *")
+    letti insieme (fetch_gantt_tabs): i servizi riportano il tab di
+    provenienza (GanttService.tab).
+
+    quota: budget chiamate del tenant (quota.QuotaBudget), opzionale.
+    """
+    if not isinstance(worksheet_title, str) or is_pattern(worksheet_title):
+        return parse_gantt_rows(fetch_gantt_tabs(
+            service,
+            gantt_url,
+            [worksheet_title] if isinstance(worksheet_title, str) else worksheet_title,
+            max_rows=max_rows,
+            debug=debug,
+            quota=quota,
+        ))
+
+    values = fetch_gantt_detected(
+        service,
+        gantt_url,
+        worksheet_title=worksheet_title,
+        start_row=start_row,
+        max_rows=max_rows,
+        debug=debug,
+        quota=quota,
+    )
+    return parse_gantt_rows(values)
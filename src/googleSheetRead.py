@@ -32,39 +32,74 @@ IMPERSONATED_USER = os.getenv("IMPERSONATED_USER")
 # ID del foglio Google di configurazione (NON il link completo)
 CONFIG_SPREADSHEET_ID = os.getenv("CONFIG_SPREADSHEET_ID")
 
-# Range di lettura del foglio config:
-# A: Nome progetto
-# B: ChatId Telegram
-# C: Giorni_avviso
-# D: Link Gantt
-CONFIG_RANGE = os.getenv("CONFIG_RANGE", "Foglio1!A2:E")
+# Range dei dati del foglio config (la riga subito sopra è l'intestazione).
+# Le colonne vengono riconosciute dal nome nell'intestazione, non dalla posizione:
+# Nome, ChatId, Giorni_avviso, Gantt, Topic_Destinazione, Fogli_Gantt
+CONFIG_RANGE = os.getenv("CONFIG_RANGE", "Foglio1!A2:Z")
 
 # Scope autorizzazioni richieste.
 # Attualmente full access a Sheets + Drive.
-# Se si vuole maggiore sicurezza, si possono usare scope readonly.
+# Se si vuole maggiore sicurezza, si possono usare scope readonly
+# (in quel caso le colonne di stato del config non vengono scritte).
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive",
 ]
 
-# Intestazioni usate per costruire i dizionari di output
-HEADERS = ["Nome", "ChatId", "Giorni_avviso", "Gantt", "Topic_Destinazione"]
+# Intestazioni usate per costruire i dizionari di output.
+# Usate anche come ordine posizionale se il foglio non ha un'intestazione riconoscibile.
+HEADERS = ["Nome", "ChatId", "Giorni_avviso", "Gantt", "Topic_Destinazione", "Fogli_Gantt"]
+
+# Varianti ammesse nell'intestazione (già normalizzate) -> chiave canonica
+HEADER_ALIASES = {
+    "nome": "Nome",
+    "nomeprogetto": "Nome",
+    "progetto": "Nome",
+    "chatid": "ChatId",
+    "chatidgruppotelegram": "ChatId",
+    "giorniavviso": "Giorni_avviso",
+    "gantt": "Gantt",
+    "gannt": "Gantt",
+    "linkgantt": "Gantt",
+    "topicdestinazione": "Topic_Destinazione",
+    "topic": "Topic_Destinazione",
+    "fogligantt": "Fogli_Gantt",
+    "tabgantt": "Fogli_Gantt",
+    "ultimaesecuzione": "Ultima_esecuzione",
+    "esito": "Esito",
+    "serviziletti": "Servizi_letti",
+    "promemoriainviati": "Promemoria_inviati",
+    "prossimopromemoria": "Prossimo_promemoria",
+}
+
+# Colonne senza le quali nessuna riga è un progetto valido
+REQUIRED_HEADERS = ["Nome", "ChatId", "Gantt"]
+
+# Colonne di stato scritte dal bot a fine job (config_status.py):
+# opzionali, attive solo se presenti nell'intestazione, mai lette come dati
+STATUS_HEADERS = ["Ultima_esecuzione", "Esito", "Servizi_letti", "Promemoria_inviati", "Prossimo_promemoria"]
+
+
+class ConfigEntries(list):
+    """
+    Righe config (lista di dict, come prima) + posizione delle colonne
+    di stato: status_columns = {"Esito": indice colonna nel range, ...}
+    """
+    status_columns: Dict[str, int] = {}
 
 
 # ============================================================
 # CREAZIONE SERVIZIO GOOGLE SHEETS
 # ============================================================
 
-def get_sheets_service():
+def _delegated_credentials(service_account_json: Optional[str] = None, impersonated_user: Optional[str] = None):
     """
-    Crea e restituisce il client Google Sheets API v4
-    usando Service Account + Domain Wide Delegation.
+    Credenziali Service Account + Domain Wide Delegation.
 
     Processo:
-    1) Carica chiave JSON
+    1) Carica chiave JSON (default SERVICE_ACCOUNT_FILE)
     2) Applica scope
-    3) Impersona utente reale (IMPERSONATED_USER)
-    4) Costruisce oggetto service
+    3) Impersona utente reale (default IMPERSONATED_USER)
     """
 
     # Verifica che il file credenziali esista
@@ -72,19 +107,41 @@ def get_sheets_service():
     #    raise FileNotFoundError(f"File non trovato: {SERVICE_ACCOUNT_FILE}")
 
     # Caricamento credenziali service account
-    SERVICE_ACCOUNT_JSON = json.loads(SERVICE_ACCOUNT_FILE)
+    SERVICE_ACCOUNT_JSON = json.loads(service_account_json or SERVICE_ACCOUNT_FILE)
     creds = service_account.Credentials.from_service_account_info(
         SERVICE_ACCOUNT_JSON,
         scopes=SCOPES,
     )
 
     # Impersonificazione utente reale dominio JEToP
-    delegated_creds = creds.with_subject(IMPERSONATED_USER)
+    return creds.with_subject(impersonated_user or IMPERSONATED_USER)
+
+
+def get_sheets_service(service_account_json: Optional[str] = None, impersonated_user: Optional[str] = None):
+    """
+    Crea e restituisce il client Google Sheets API v4
+    usando Service Account + Domain Wide Delegation.
+
+    I parametri permettono a ogni tenant di avere il proprio client.
+    """
+    delegated_creds = _delegated_credentials(service_account_json, impersonated_user)
 
     # Costruzione client Sheets API v4
     return build("sheets", "v4", credentials=delegated_creds)
 
 
+def get_drive_service(service_account_json: Optional[str] = None, impersonated_user: Optional[str] = None):
+    """
+    Crea e restituisce il client Google Drive API v3
+    (stesse credenziali di get_sheets_service).
+
+    Usato per il feed delle modifiche (changes.list).
+    """
+    delegated_creds = _delegated_credentials(service_account_json, impersonated_user)
+
+    return build("drive", "v3", credentials=delegated_creds)
+
+
 # ============================================================
 # UTILITA': ESTRAZIONE ID DA LINK GOOGLE SHEETS
 # ============================================================
@@ -124,21 +181,128 @@ def extract_id_from_url(url: str) -> Optional[str]:
     return None
 
 
+# ============================================================
+# INTESTAZIONE FOGLIO CONFIG -> MAPPATURA COLONNE
+# ============================================================
+
+def _norm_header(h) -> str:
+    """
+    Normalizza un'intestazione per il confronto:
+      " Giorni_Avviso " → "giorniavviso"
+    """
+    return re.sub(r"[^a-z0-9]", "", str(h or "").lower())
+
+
+def with_header_row(rng: str) -> str:
+    """
+    Estende il range dei dati per includere la riga di intestazione
+    (quella subito sopra la prima riga dati).
+
+      "Foglio1!A2:Z" → "Foglio1!A1:Z"
+      "Foglio1!A1:Z" → invariato (l'intestazione è già la prima riga)
+    """
+    m = re.fullmatch(r"(?:(.+)!)?([A-Za-z]+)(\d+)(:.*)?", rng.strip())
+    if not m:
+        return rng
+
+    sheet, col, row, rest = m.groups()
+    row_i = max(int(row) - 1, 1)
+    prefix = f"{sheet}!" if sheet else ""
+    return f"{prefix}{col}{row_i}{rest or ''}"
+
+
+def _range_first_row(rng: str) -> int:
+    """
+    Numero della prima riga di un range A1 (default 1).
+    """
+    m = re.search(r"[A-Za-z]+(\d+)", rng.split("!")[-1])
+    return int(m.group(1)) if m else 1
+
+
+def map_header(header_row: List[str]) -> Dict[int, str]:
+    """
+    Costruisce la mappatura indice colonna -> chiave.
+
+    Le intestazioni note vengono ricondotte alla chiave canonica
+    (es. "Gannt", "Giorni_Avviso" → "Gantt", "Giorni_avviso"),
+    quelle sconosciute vengono mantenute con il loro nome.
+
+    Ritorna dict vuoto se la riga non contiene nessuna intestazione nota.
+    """
+    mapping: Dict[int, str] = {}
+    known = 0
+
+    for i, h in enumerate(header_row):
+        label = str(h or "").strip()
+        if not label:
+            continue
+
+        canonical = HEADER_ALIASES.get(_norm_header(label))
+        if canonical:
+            known += 1
+            # La prima occorrenza vince (colonne duplicate ignorate)
+            if canonical in mapping.values():
+                continue
+            mapping[i] = canonical
+        else:
+            mapping[i] = label
+
+    return mapping if known else {}
+
+
+def complete_required(mapping: Dict[int, str]) -> Dict[int, str]:
+    """
+    Intestazione riconosciuta ma senza una colonna obbligatoria
+    (es. "Gruppo Telegram" invece di "ChatId"): si usa la sua posizione
+    in HEADERS, se quella colonna non è già una chiave nota.
+    Altrimenti errore esplicito, invece di scartare in silenzio
+    tutte le righe.
+    """
+    known = set(HEADER_ALIASES.values())
+    for key in REQUIRED_HEADERS:
+        if key in mapping.values():
+            continue
+        i = HEADERS.index(key)
+        if i in mapping and mapping[i] in known:
+            raise ValueError(
+                f"Intestazione config: colonna '{key}' non trovata "
+                f"(colonne lette: {', '.join(mapping.values())})"
+            )
+        print(f"⚠️ Intestazione config: colonna '{key}' non trovata, uso la colonna {i + 1} ({mapping.get(i, 'senza nome')})")
+        mapping[i] = key
+    return mapping
+
+
 # ============================================================
 # LETTURA FOGLIO DI CONFIGURAZIONE
 # ============================================================
 
-def export_data() -> Tuple[List[Dict[str, str]], object, object]:
+def export_data(
+    spreadsheet_id: Optional[str] = None,
+    config_range: Optional[str] = None,
+    service=None,
+    quota=None,
+) -> Tuple[List[Dict[str, str]], object, object]:
     """
     Legge il foglio Google di configurazione del bot.
 
+    Senza parametri usa CONFIG_SPREADSHEET_ID / CONFIG_RANGE e un client
+    creato al momento; per i tenant si passano foglio, range, client
+    dedicato e budget di chiamate (quota.QuotaBudget).
+
+    L'intestazione (riga sopra CONFIG_RANGE) viene letta nella stessa
+    chiamata e usata per mappare le colonne per nome, quindi l'ordine
+    delle colonne nel foglio non conta.
+
     Ritorna:
       - data: lista di dict nel formato:
             {
               "Nome": ...,
               "ChatId": ...,
               "Giorni_avviso": ...,
-              "Gantt": ...
+              "Gantt": ...,
+              "Topic_Destinazione": ...,
+              "_row": numero riga nel foglio (int)
             }
       - sheet_api: oggetto API Sheets (per riutilizzo)
       - service: oggetto service completo (usato poi per leggere Gantt)
@@ -150,36 +314,73 @@ def export_data() -> Tuple[List[Dict[str, str]], object, object]:
 
     try:
         # Inizializza servizio Google Sheets
-        service = get_sheets_service()
+        if service is None:
+            service = get_sheets_service()
         sheet_api = service.spreadsheets()
 
-        # Lettura range configurato
+        if quota is not None:
+            quota.acquire()
+
+        # Lettura range configurato + riga di intestazione
+        rng = with_header_row(config_range or CONFIG_RANGE)
         result = sheet_api.values().get(
-            spreadsheetId=CONFIG_SPREADSHEET_ID,
-            range=CONFIG_RANGE,
+            spreadsheetId=spreadsheet_id or CONFIG_SPREADSHEET_ID,
+            range=rng,
             valueRenderOption="FORMATTED_VALUE",  # restituisce valori come mostrati nel foglio
         ).execute()
 
         rows = result.get("values", [])
-
-        data: List[Dict[str, str]] = []
-
-        for row in rows:
-            # Salta righe completamente vuote
-            if not row or not any(str(x).strip() for x in row):
-                continue
-
-            # Padding: se la riga ha meno colonne di HEADERS,
-            # aggiungiamo stringhe vuote per evitare errori zip()
-            row = row + [""] * (len(HEADERS) - len(row))
-
-            # Crea dict associando HEADERS -> valori riga
-            entry = dict(zip(HEADERS, row))
-            data.append(entry)
+        data = rows_to_entries(rows, _range_first_row(rng))
 
         return data, sheet_api, service
 
     except Exception as e:
         # Errore generico nella lettura
         print("ERRORE export_data:", e)
-        return -1, None, None
\ No newline at end of file
+        return -1, None, None
+
+
+def rows_to_entries(rows: List[List[str]], first_row: int = 1) -> List[Dict[str, str]]:
+    """
+    Converte le righe lette (intestazione inclusa) in lista di dict.
+
+    - La prima riga non vuota è l'intestazione → mappatura colonne.
+    - Se non contiene intestazioni note si usa l'ordine di HEADERS
+      e anche quella riga viene trattata come dato.
+    - Colonne obbligatorie non riconosciute: complete_required
+      (posizione di HEADERS oppure ValueError).
+    - Ogni dict riporta il numero di riga del foglio in "_row".
+    - Le colonne di stato (STATUS_HEADERS) non finiscono nei dict:
+      la loro posizione è in data.status_columns (ConfigEntries).
+    """
+    data = ConfigEntries()
+    data.status_columns = {}
+    mapping: Optional[Dict[int, str]] = None
+
+    for offset, row in enumerate(rows):
+        # Salta righe completamente vuote
+        if not row or not any(str(x).strip() for x in row):
+            continue
+
+        if mapping is None:
+            mapping = map_header(row)
+            if mapping:
+                data.status_columns = {key: i for i, key in mapping.items() if key in STATUS_HEADERS}
+                mapping = {i: key for i, key in mapping.items() if key not in STATUS_HEADERS}
+                complete_required(mapping)
+                continue
+            # Nessuna intestazione riconosciuta: ordine posizionale
+            mapping = dict(enumerate(HEADERS))
+
+        # Le colonne mancanti (celle finali vuote) diventano stringhe vuote
+        entry: Dict[str, str] = {key: "" for key in mapping.values()}
+        for i, key in mapping.items():
+            if i < len(row):
+                entry[key] = row[i]
+        for key in HEADERS:
+            entry.setdefault(key, "")
+
+        entry["_row"] = first_row + offset
+        data.append(entry)
+
+    return data
@@ -0,0 +1,413 @@
+# ical_feed.py
+
+# ============================================================
+# FEED iCALENDAR DELLE SCADENZE
+# ============================================================
+#
+# Le scadenze lette dai Gantt vengono pubblicate come calendari .ics
+# (uno per progetto e uno per ogni area del progetto), serviti da un
+# piccolo server HTTP locale:
+#
+#   /ics/<tenant>/<progetto>.ics
+#   /ics/<tenant>/<progetto>/<area>.ics
+#
+# - I feed vengono rigenerati solo quando i servizi letti dal Gantt
+#   cambiano (confronto impronta); le richieste dei client calendario
+#   leggono solo la memoria: nessuna chiamata Sheets, nessuna rigenerazione
+# - I feed sono salvati in storage/ e riletti dopo un riavvio
+# - Ogni risposta ha un ETag: i client che mandano If-None-Match
+#   (anche lista di ETag, deboli W/"..." o *) ricevono 304 senza corpo
+# - Nel job giornaliero (esecuzione completa) i feed dei progetti tolti
+#   dal config vengono eliminati (FeedStore.prune)
+#
+# Env:
+#   ICAL_PORT  → porta del server (vuoto/0 = disattivato)
+#   ICAL_BIND  → indirizzo di ascolto (default 0.0.0.0)
+#   ICAL_TOKEN → se impostato, richiesto come ?token=... in ogni URL
+#
+# ============================================================
+
+import hashlib
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from gantt_reader import service_label
+from project_config import Project
+from storage import load_json, save_json, storage_path
+
+
+ICAL_PORT = int(os.getenv("ICAL_PORT", "0") or 0)
+ICAL_BIND = os.getenv("ICAL_BIND", "0.0.0.0")
+ICAL_TOKEN = os.getenv("ICAL_TOKEN", "")
+
+
+# ============================================================
+# GENERAZIONE .ics
+# ============================================================
+
+def slug(s: str) -> str:
+    """
+    "M&C Social" → "m-c-social"
+    """
+    return re.sub(r"[^a-z0-9]+", "-", (s or "").lower()).strip("-") or "x"
+
+
+def _escape(text: str) -> str:
+    return (
+        str(text)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """
+    Righe iCalendar: max 75 byte, continuazione con spazio iniziale.
+    """
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line
+
+    parts: List[str] = []
+    current = ""
+    for ch in line:
+        limit = 75 if not parts else 74
+        if len((current + ch).encode("utf-8")) > limit:
+            parts.append(current)
+            current = ch
+        else:
+            current += ch
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+
+def build_calendar(name: str, events: List[Tuple[str, str, int, date]], project_name: str, stamp: str) -> bytes:
+    """
+    Calendario con un evento "tutto il giorno" per ogni scadenza.
+    events: lista (area, servizio, durata, scadenza)
+    """
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//JEToP//Bot Scadenze//IT",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_escape(name)}",
+    ]
+
+    seen: Dict[str, int] = {}
+    for event in events:
+        area, _, duration, deadline = event
+        service = service_label(event)
+        base = f"{project_name}|{area}|{service}"
+        seen[base] = seen.get(base, 0) + 1
+        uid = hashlib.sha1(f"{base}|{seen[base]}".encode("utf-8")).hexdigest()
+        summary = _escape(f"[{area}] {service}")
+        description = _escape(f"Progetto: {project_name}\nArea: {area}\nDurata: {duration} giorni")
+
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{uid}@bot-scadenze",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{deadline.strftime('%Y%m%d')}",
+            f"DTEND;VALUE=DATE:{(deadline + timedelta(days=1)).strftime('%Y%m%d')}",
+            f"SUMMARY:{summary}",
+            f"DESCRIPTION:{description}",
+            "TRANSP:TRANSPARENT",
+            "END:VEVENT",
+        ]
+
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(l) for l in lines) + "\r\n").encode("utf-8")
+
+
+# ============================================================
+# ARCHIVIO FEED (in memoria + storage/)
+# ============================================================
+#
+# I feed sopravvivono ai riavvii: corpi in storage/ical/<hash>.ics,
+# indice in storage/ical_feeds.json (salvati con flush() a fine
+# esecuzione, solo se qualcosa è cambiato):
+#
+# {
+#   "feeds":    {"<percorso>": {"file": "<hash>.ics", "etag": "\"...\""}},
+#   "projects": {"<tenant>\u001f<progetto>\u001f<gantt_key>": ["<impronta>", ["<percorso>", ...]]},
+#   "bases":    {"<tenant>\u001f<progetto>\u001f<gantt_key>": "/ics/<tenant>/<progetto>"}
+# }
+#
+# Progetti con lo stesso slug (nomi ripetuti o "P-1" / "P 1") ricevono
+# un suffisso (-2, -3...) assegnato una volta sola e salvato in "bases",
+# così gli URL restano stabili.
+#
+# ============================================================
+
+FEEDS_INDEX_FILE = "ical_feeds.json"
+FEEDS_DIR = "ical"
+
+_SEP = "\x1f"
+
+
+def _unique(path: str, taken, suffix: str = "") -> str:
+    """
+    path libero in taken, altrimenti path-2, path-3...
+    suffix: estensione da tenere in fondo (".ics").
+    """
+    stem = path[: -len(suffix)] if suffix else path
+    candidate, n = path, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{stem}-{n}{suffix}"
+    return candidate
+
+
+def _body_file(path: str) -> str:
+    return hashlib.sha1(path.encode("utf-8")).hexdigest() + ".ics"
+
+
+class FeedStore:
+    """
+    Feed già generati: percorso → (corpo, etag).
+
+    update() viene chiamato dalla pipeline per ogni progetto letto;
+    rigenera i feed solo se i servizi del progetto sono cambiati.
+    flush() salva su file i feed cambiati; dopo un riavvio vengono
+    riletti al primo accesso (anche dal server HTTP).
+    Thread-safe: il server HTTP legge da altri thread.
+    """
+
+    def __init__(self, filename: str = FEEDS_INDEX_FILE, directory: str = FEEDS_DIR):
+        self._filename = filename
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._feeds: Dict[str, Tuple[bytes, str]] = {}
+        # chiave progetto → (impronta servizi, percorsi generati)
+        self._projects: Dict[str, Tuple[str, List[str]]] = {}
+        # chiave progetto → percorso base (con eventuale suffisso)
+        self._bases: Dict[str, str] = {}
+        self._changed: set = set()
+        self._removed: set = set()
+        # progetti tolti dall'indice da prune() (anche senza feed da cancellare)
+        self._pruned = False
+        self.regenerated = 0
+
+    @staticmethod
+    def _fingerprint(services) -> str:
+        h = hashlib.sha1()
+        for s in services:
+            area, _, duration, deadline = s
+            h.update(f"{area}\x1f{service_label(s)}\x1f{duration}\x1f{deadline.isoformat()}\x1e".encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def key(tenant_name: str, project: Project) -> str:
+        return f"{tenant_name}{_SEP}{project.name}{_SEP}{project.gantt_key}"
+
+    def _load(self) -> None:
+        """
+        Rilegge indice e corpi salvati (una volta, sotto lock).
+        Corpo mancante o illeggibile → feed scartato, rigenerato al prossimo job.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+
+        index = load_json(self._filename, {})
+        self._bases = dict(index.get("bases", {}))
+        self._projects = {k: (v[0], list(v[1])) for k, v in index.get("projects", {}).items()}
+        for path, entry in index.get("feeds", {}).items():
+            try:
+                with open(storage_path(os.path.join(self._directory, entry["file"])), "rb") as f:
+                    self._feeds[path] = (f.read(), entry["etag"])
+            except Exception:
+                continue
+        # progetti con feed mancanti: impronta azzerata → rigenerati
+        for k, (fp, paths) in self._projects.items():
+            if any(p not in self._feeds for p in paths):
+                self._projects[k] = ("", paths)
+
+    def _base(self, tenant_name: str, project: Project, key: str) -> str:
+        base = self._bases.get(key)
+        if base is None:
+            wanted = f"/ics/{slug(tenant_name)}/{slug(project.name)}"
+            base = _unique(wanted, set(self._bases.values()))
+            if base != wanted:
+                print(f"⚠️ Feed iCal: '{project.name}' ha lo stesso percorso di un altro progetto, uso {base}")
+            self._bases[key] = base
+        return base
+
+    def update(self, tenant_name: str, project: Project, services) -> bool:
+        """
+        Ritorna True se i feed del progetto sono stati rigenerati.
+        """
+        key = self.key(tenant_name, project)
+        fp = self._fingerprint(services)
+
+        with self._lock:
+            self._load()
+            previous = self._projects.get(key)
+            base = self._base(tenant_name, project, key)
+        if previous and previous[0] == fp:
+            return False
+
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        feeds: Dict[str, bytes] = {
+            f"{base}.ics": build_calendar(project.name, list(services), project.name, stamp)
+        }
+
+        by_area: Dict[str, list] = {}
+        for s in services:
+            by_area.setdefault(s[0], []).append(s)
+        for area, items in by_area.items():
+            # aree diverse con lo stesso slug ("M&C" / "M C") → suffisso
+            path = _unique(f"{base}/{slug(area)}.ics", feeds, ".ics")
+            feeds[path] = build_calendar(f"{project.name} — {area}", items, project.name, stamp)
+
+        with self._lock:
+            # Aree sparite dal Gantt → feed rimossi
+            for path in (previous[1] if previous else []):
+                if path not in feeds:
+                    self._feeds.pop(path, None)
+                    self._changed.discard(path)
+                    self._removed.add(path)
+            for path, body in feeds.items():
+                self._feeds[path] = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+                self._changed.add(path)
+                self._removed.discard(path)
+            self._projects[key] = (fp, list(feeds))
+            self.regenerated += 1
+
+        return True
+
+    def prune(self, tenant_name: str, projects: List[Project]) -> int:
+        """
+        Esecuzione completa del tenant: elimina i feed dei progetti non più
+        nel config (e libera il loro percorso base).
+        Ritorna il numero di progetti rimossi.
+        """
+        keep = {self.key(tenant_name, p) for p in projects}
+        prefix = f"{tenant_name}{_SEP}"
+
+        with self._lock:
+            self._load()
+            gone = [k for k in set(self._projects) | set(self._bases) if k.startswith(prefix) and k not in keep]
+            for k in gone:
+                _, paths = self._projects.pop(k, ("", []))
+                self._bases.pop(k, None)
+                for path in paths:
+                    self._feeds.pop(path, None)
+                    self._changed.discard(path)
+                    self._removed.add(path)
+            if gone:
+                self._pruned = True
+        return len(gone)
+
+    def flush(self) -> None:
+        """
+        Salva corpi cambiati, elimina quelli rimossi e riscrive l'indice.
+        """
+        with self._lock:
+            if not (self._changed or self._removed or self._pruned):
+                return
+            os.makedirs(storage_path(self._directory), exist_ok=True)
+            for path in self._changed:
+                target = storage_path(os.path.join(self._directory, _body_file(path)))
+                with open(target + ".tmp", "wb") as f:
+                    f.write(self._feeds[path][0])
+                os.replace(target + ".tmp", target)
+            for path in self._removed:
+                try:
+                    os.remove(storage_path(os.path.join(self._directory, _body_file(path))))
+                except FileNotFoundError:
+                    pass
+            save_json(self._filename, {
+                "feeds": {p: {"file": _body_file(p), "etag": etag} for p, (_, etag) in self._feeds.items()},
+                "projects": {k: [fp, paths] for k, (fp, paths) in self._projects.items()},
+                "bases": self._bases,
+            })
+            self._changed.clear()
+            self._removed.clear()
+            self._pruned = False
+
+    def get(self, path: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            self._load()
+            return self._feeds.get(path)
+
+    def paths(self) -> List[str]:
+        with self._lock:
+            self._load()
+            return sorted(self._feeds)
+
+
+# ============================================================
+# SERVER HTTP
+# ============================================================
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match (RFC 9110): "*" oppure lista di ETag separati da virgola,
+    confrontati in modo debole (W/"x" equivale a "x").
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def weak(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return any(weak(tag) == weak(etag) for tag in if_none_match.split(","))
+
+
+def _make_handler(store: FeedStore, token: str):
+    class FeedHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+
+            if token and parse_qs(url.query).get("token", [""])[0] != token:
+                self.send_error(403)
+                return
+
+            feed = store.get(url.path)
+            if feed is None:
+                self.send_error(404)
+                return
+
+            body, etag = feed
+            if etag_matches(self.headers.get("If-None-Match"), etag):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/calendar; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "max-age=300")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Centinaia di client in polling: niente log per richiesta
+            pass
+
+    return FeedHandler
+
+
+def start_server(store: FeedStore, port: int = ICAL_PORT, bind: str = ICAL_BIND, token: str = ICAL_TOKEN) -> ThreadingHTTPServer:
+    """
+    Avvia il server dei feed in un thread daemon.
+    """
+    server = ThreadingHTTPServer((bind, port), _make_handler(store, token))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ical-feed", daemon=True).start()
+    return server
@@ -1,11 +1,11 @@
 # main.py (python-telegram-bot v20+)
-from datetime import date, time as dtime
-from typing import Dict, List, Tuple
+from datetime import date, datetime, time as dtime, timedelta
 from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
+import asyncio
 import os
-import json
+import time
 
 load_dotenv()
 
@@ -19,334 +19,574 @@ from telegram.ext import (
     filters,
 )
 
-import googleSheetRead as gs
-from gantt_reader import read_services_deadlines
+import audit
+import config_status
+import deadline_diff
+import drive_watcher
+import ical_feed
+from gantt_layout import LAYOUTS
+from pipeline import run_pipeline
+import prefetch
+import profiling
+import topic_digest
+import unreachable
+from reminders import Delivery
+from tenants import Tenant, load_tenants
 import topic_registry as tr
 
-import random
-
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 ERROR_CHAT_ID = int(os.getenv("ERROR_CHAT_ID"))
 
+# Utenti abilitati ai comandi di amministrazione (id separati da virgola).
+# Sono comunque ammessi i comandi inviati nella chat ERROR_CHAT_ID.
+ADMIN_USER_IDS = {
+    int(x) for x in os.getenv("ADMIN_USER_IDS", "").split(",") if x.strip().lstrip("-").isdigit()
+}
+
+# Organizzazioni servite (foglio config, credenziali, chat errori, quota).
+# Ogni tenant tiene i propri progetti compilati tra un'esecuzione e l'altra.
+TENANTS = load_tenants(ERROR_CHAT_ID)
+
 MESSAGE_TIME = os.getenv("MESSAGE_TIME", "15:00")
 TZ = ZoneInfo(os.getenv("TIMEZONE", "Europe/Rome"))
 
+# Update Telegram elaborati in parallelo (un handler lento non blocca gli altri)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
 
-# --------------------------------------
-# Messaggi personalizzabili per gravità
-# --------------------------------------
-
-# Permette la lettura delle variabili dell'env delle frasi come lista di stringhe
-def load_message_list(env_name: str, default: list[str] | None = None) -> list[str]:
-    """
-    Legge una variabile dall'env e la converte in lista di stringhe.
-    Il formato atteso nell'env è JSON, ad esempio:
-    MESSAGES=["frase 1","frase 2"]
-    """
-    raw = os.getenv(env_name)
+# Modalità digest: un messaggio fissato per topic, modificato ogni giorno
+DIGEST_MODE = os.getenv("DIGEST_MODE", "").strip().lower() in {"1", "true", "yes", "si"}
 
-    if not raw:
-        return default.copy() if default else []
+# Ogni quanti minuti controllare il feed modifiche Drive (0 = disattivato)
+DRIVE_WATCH_MINUTES = float(os.getenv("DRIVE_WATCH_MINUTES", "10"))
 
-    try:
-        parsed = json.loads(raw)
-        if isinstance(parsed, list):
-            return [str(x) for x in parsed if str(x).strip()]
-    except Exception:
-        pass
+# Feed .ics delle scadenze (aggiornati dalla pipeline, serviti se ICAL_PORT > 0)
+ICAL_FEEDS = ical_feed.FeedStore()
 
-    # fallback: una sola frase semplice non JSON
-    return [raw.strip()] if raw.strip() else (default.copy() if default else [])
+# Ultimi servizi letti per progetto (notifica scadenze spostate)
+SNAPSHOTS = deadline_diff.SnapshotStore()
 
+# Esecuzioni (job completo, /run_now, watcher Drive) mai sovrapposte
+RUN_LOCK = asyncio.Lock()
 
-# Frasi
-OVERDUE_MESSAGES = load_message_list("OVERDUE_MESSAGES")
-TODAY_MESSAGES = load_message_list("TODAY_MESSAGES")
-TOMORROW_MESSAGES = load_message_list("TOMORROW_MESSAGES")
-SOON_MESSAGES = load_message_list("SOON_MESSAGES")
-DEFAULT_MESSAGES = load_message_list("DEFAULT_MESSAGES", ["Occhio alla tabella di marcia 📅"])
 
-# Classifica la "gravità" delle scadenze per i messaggi personalizzati
-def get_severity_messages(days_left: int) -> list[str]:
+# -----------------------
+# Invio su topic o generale
+# -----------------------
+async def send_to_group_or_topic(
+    context: ContextTypes.DEFAULT_TYPE,
+    chat_id: int,
+    area_or_topic_name: str,
+    text: str,
+    forced_thread_id: int | None = None,
+):
     """
-    Restituisce la lista base di frasi in base alla gravità.
+    Invia messaggio:
+    - se forced_thread_id è dato: invia in quel thread_id
+    - altrimenti prova lookup area/topic_name -> thread_id (topic_registry)
+    - fallback nel generale
+
+    Topic eliminato (thread not found) → il messaggio va nel generale,
+    il topic entra nella cache negativa e le aree collegate vengono
+    tolte dalla mappa (tr.mark_stale).
     """
-    if days_left < 0:
-        return OVERDUE_MESSAGES.copy()
-    if days_left == 0:
-        return TODAY_MESSAGES.copy()
-    if days_left == 1:
-        return TOMORROW_MESSAGES.copy()
-    if days_left < 5:
-        return SOON_MESSAGES.copy()
-    return DEFAULT_MESSAGES.copy()
+    topic_id = forced_thread_id
+    if topic_id is None:
+        topic_id = tr.get_topic(chat_id, area_or_topic_name)
 
+    # Topic già noto come eliminato: direttamente nel generale
+    if topic_id is not None and unreachable.blocked(chat_id, topic_id):
+        topic_id = None
 
-# Aggiunge condizioni extra per i messaggi in base al topic
-def extend_conditional_messages(messages: list[str], area: str, days_left: int) -> list[str]:
-    """
-    Aggiunge frasi extra in base a condizioni personalizzate.
-    """
-    area_clean = (area or "").strip()
+    if topic_id is None:
+        await context.bot.send_message(chat_id=chat_id, text=text)
+        return
+
+    try:
+        await context.bot.send_message(chat_id=chat_id, message_thread_id=topic_id, text=text)
+    except Exception as e:
+        if unreachable.classify(e) != unreachable.THREAD_NOT_FOUND:
+            raise
+        unreachable.record(chat_id, topic_id, unreachable.THREAD_NOT_FOUND)
+        areas = await asyncio.to_thread(tr.mark_stale, chat_id, topic_id)
+        where = f" (aree: {', '.join(areas)})" if areas else ""
+        print(f"⚠️ Topic {topic_id} non trovato in chat {chat_id}{where}: invio nel generale")
+        await context.bot.send_message(chat_id=chat_id, text=text)
+        return
 
-    # Esempio: aggiungi frasi solo se l'area NON è IT o Web
-    if area_clean not in {"IT", "Web"}:
-        messages.extend([
-            "Un IT avrebbe già finito...",
-            "Un IT farebbe decisamente di meglio",
-            "Credo ci siano pochi IT qui in mezzo...",
-        ])
-    return messages
+    unreachable.clear(chat_id, topic_id)
 
 
-# Sceglie la frase a caso 
-def get_random_fun_message(area: str, days_left: int) -> str:
+async def deliver(context: ContextTypes.DEFAULT_TYPE, d: Delivery) -> bool:
     """
-    Costruisce la lista finale di frasi candidate e ne sceglie una a caso.
+    Invia un messaggio prodotto da reminders.render_project.
+
+    Chat irraggiungibile (bot rimosso, chat inesistente):
+      - in cache negativa → invio saltato, ritorna False
+      - primo fallimento → errore segnalato (una volta sola)
     """
-    candidates = get_severity_messages(days_left)
-    candidates = extend_conditional_messages(candidates, area, days_left)
+    if unreachable.blocked(d.chat_id):
+        return False
 
-    if not candidates:
-        candidates = DEFAULT_MESSAGES
+    try:
+        if d.general:
+            await context.bot.send_message(chat_id=d.chat_id, text=d.text)
+        else:
+            # invia nel topic indicato (nome) o nel forced thread_id numerico
+            await send_to_group_or_topic(
+                context,
+                d.chat_id,
+                d.topic,
+                d.text,
+                forced_thread_id=d.forced_thread_id,
+            )
+    except Exception as e:
+        reason = unreachable.classify(e)
+        if reason in (unreachable.FORBIDDEN, unreachable.CHAT_NOT_FOUND):
+            if not unreachable.record(d.chat_id, None, reason):
+                # già segnalata in precedenza: niente nuovo errore
+                return False
+        raise
 
-    return random.choice(candidates)
+    unreachable.clear(d.chat_id)
+    return True
 
 
 # -----------------------
-# Utility: soglie avvisi
+# Segnalazione errori (riepilogo per tenant)
 # -----------------------
-def parse_custom_days(raw: str) -> set[int]:
+def report_row_error(tenant: Tenant, row: int, e: Exception, project_name: str = ""):
     """
-    "7,5,4" -> {7,5,4}
-    Celle vuote/valori non numerici -> ignorati
+    Registra l'errore di una riga config nel riepilogo del tenant.
+    L'invio su ERROR_CHAT_ID avviene a fine esecuzione (flush_errors).
     """
-    if not raw:
-        return set()
-    raw = str(raw).strip()
-    if not raw:
-        return set()
+    print(f"❌ [{tenant.name}] ERRORE riga config {row}: {type(e).__name__}: {e}")
+    where = f"riga {row}" + (f" ({project_name})" if project_name else "")
+    tenant.errors.add(where, e)
 
-    out: set[int] = set()
-    for part in raw.split(","):
-        part = part.strip()
-        if not part:
-            continue
+
+async def flush_errors(context: ContextTypes.DEFAULT_TYPE, tenant: Tenant):
+    """
+    Invia il riepilogo errori del tenant, se dovuto
+    (rispettando l'intervallo minimo tra riepiloghi).
+    """
+    for text in tenant.errors.take():
         try:
-            out.add(int(part))
-        except Exception:
-            continue
-    return out
+            await context.bot.send_message(chat_id=tenant.error_chat_id, text=text)
+        except Exception as e2:
+            print("❌ Non riesco a inviare su ERROR_CHAT_ID:", type(e2).__name__, e2)
 
 
-def thresholds_for_service(duration_days: int, custom_days: set[int]) -> set[int]:
+# -----------------------
+# Job: controllo scadenze
+# -----------------------
+async def load_tenant_config(tenant: Tenant):
     """
-    Standard:
-      - metà: ceil(d/2)
-      - giorno prima: 1
-      - giorno stesso: 0
-      - giorno dopo: -1
-    + custom days dal foglio config (es. 7,5,4)
+    Legge il foglio config del tenant con il suo client e la sua quota
+    (in un thread, per non bloccare gli altri tenant) e aggiorna la cache.
+
+    Ritorna (stats, client) oppure (None, None) se la lettura fallisce.
     """
-    half = (duration_days + 1) // 2  # ceil(d/2)
-    return {half, 1, 0, -1} | custom_days
+    def _read():
+        client = tenant.source.client()
+        return tenant.source.read_config(client, tenant.config_spreadsheet_id, tenant.config_range, tenant.quota), client
 
+    data, client = await tenant.quota.run(_read)
+    if data is None:
+        return None, None
 
-def label_for_days_left(days_left: int) -> str:
-    if days_left == -1:
-        return "🟥 Scaduto IERI"
-    if days_left == 0:
-        return "🟥 In scadenza OGGI"
-    if days_left == 1:
-        return "🟧 Scade DOMANI"
-    return f"🟨 Scade tra {days_left} giorni"
+    return tenant.config_cache.refresh(data), client
 
 
-def build_message(project_name: str, area: str, grouped: dict) -> str:
+async def check_deadlines_job(context: ContextTypes.DEFAULT_TYPE, dry_run: bool = False):
     """
-    grouped: dict days_left -> list[(service_name, deadline_date, service_area)]
+    Controllo scadenze di tutti i tenant.
+    Ritorna {nome_tenant: PipelineStats} (per profiling e comandi).
+
+    dry_run: legge e costruisce i messaggi senza inviarli, senza segnare
+    il ledger, senza aggiornare snapshot/digest/stato nel config e senza
+    consumare la pre-lettura (usato da /profile_run).
     """
-    lines = [
-        "⏰ PROMEMORIA SCADENZE",
-        f"📌 Progetto: {project_name}",
-    ]
+    # Un eventuale /run_now in corso dura pochi secondi: si aspetta
+    async with RUN_LOCK:
+        print(f"✅ check_deadlines_job avviato ({date.today()})")
+
+        # I tenant girano in parallelo: uno lento o in errore non blocca gli altri
+        results = await asyncio.gather(
+            *(check_tenant_deadlines(context, tenant, dry_run) for tenant in TENANTS),
+            return_exceptions=True,
+        )
+
+    for tenant, result in zip(TENANTS, results):
+        if isinstance(result, Exception):
+            print(f"❌ [{tenant.name}] job fallito: {type(result).__name__}: {result}")
+            tenant.errors.add("job scadenze", result)
+        await flush_errors(context, tenant)
+
+    return {
+        tenant.name: result
+        for tenant, result in zip(TENANTS, results)
+        if result is not None and not isinstance(result, Exception)
+    }
+
+
+async def scheduled_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Job schedulato: normale, oppure profilato se PROFILE_NEXT_RUN=1.
+    """
+    if profiling.take_env_request():
+        await run_profiled_job(context)
+    else:
+        await check_deadlines_job(context)
 
-    for days_left in sorted(grouped.keys()):
-        lines.append(label_for_days_left(days_left))
-        for name, dline, service_area in grouped[days_left]:
-            fun_line = get_random_fun_message(service_area, days_left)
-            lines.append(f" 🏷️ {name} — {dline.strftime('%d/%m/%Y')}")
-            lines.append(f"    💬 {fun_line}")
-        lines.append("")
 
-    return "\n".join(lines).strip()
+async def run_profiled_job(context: ContextTypes.DEFAULT_TYPE, dry_run: bool = False) -> str:
+    """
+    Esegue il job sotto profiling, salva il report e ne invia
+    un riepilogo su ERROR_CHAT_ID. Ritorna il riepilogo.
+    dry_run: vedi check_deadlines_job.
+    """
+    report_path, summary = await profiling.run_profiled(lambda: check_deadlines_job(context, dry_run))
+    if dry_run:
+        summary += "\n(prova a vuoto: nessun messaggio inviato)"
+    print(f"📊 Report profiling: {report_path}")
+    try:
+        await context.bot.send_message(chat_id=ERROR_CHAT_ID, text=summary)
+    except Exception as e2:
+        print("❌ Non riesco a inviare su ERROR_CHAT_ID:", type(e2).__name__, e2)
+    return summary
 
 
-def parse_topic_destination(raw: str) -> tuple[str, int | None]:
+async def run_projects(
+    context: ContextTypes.DEFAULT_TYPE,
+    tenant: Tenant,
+    projects,
+    today: date,
+    only_new: bool = False,
+    prefetched: dict | None = None,
+    status: config_status.RunStatus | None = None,
+    full: bool = False,
+    dry_run: bool = False,
+):
     """
-    Interpreta il campo 'Topic_Destinazione' dal foglio config.
-
-    Supporta:
-    - "" (vuoto) -> ("", None)  => nessun override
-    - "Generale" -> ("generale", None) => invia nel generale
-    - "IT" / "Marketing" -> ("IT", None) => invia nel topic con quel nome (via topic_registry)
-    - "4" (numero) -> ("", 4) => invia direttamente nel thread_id 4 (senza lookup)
+    Valuta e invia per un insieme di progetti del tenant (pipeline).
+    prefetched: servizi pre-letti per Project.read_key (prefetch.py).
+    status: raccolta dello stato per riga config (config_status.py).
+    full: projects è tutto il config del tenant (job giornaliero): si
+    tolgono i feed iCal e (in modalità digest) le sezioni dei progetti rimossi.
+    dry_run: messaggi costruiti ma non inviati, ledger e snapshot intatti.
+
+    In modalità digest i messaggi diventano sezioni del digest di ogni
+    topic, pubblicate a fine pipeline (solo se il contenuto è cambiato).
+
+    Scadenze spostate rispetto all'esecuzione precedente: notifica
+    dopo i promemoria (deadline_diff.py, non in modalità digest).
     """
-    if not raw:
-        return "", None
+    async def on_error(project, e: Exception):
+        report_row_error(tenant, project.row, e, project.name)
+        if status is not None:
+            status.error(project.row, e)
+
+    async def send(d: Delivery) -> bool:
+        if dry_run:
+            return True
+        ok = await deliver(context, d)
+        if status is not None:
+            status.delivered(d.row, ok is not False)
+        return ok
+
+    changes: list = []
+
+    def on_services(project, services):
+        ICAL_FEEDS.update(tenant.name, project, services)
+        if status is not None:
+            status.services(project, services)
+        if dry_run:
+            return
+        # anche i Gantt pre-letti: il watcher Drive rilegge solo dopo il
+        # job giornaliero, quindi lo snapshot non è mai più recente
+        diff = SNAPSHOTS.update(SNAPSHOTS.key(tenant.name, project), services)
+        if deadline_diff.DEADLINE_CHANGE_NOTIFY and not DIGEST_MODE:
+            changes.extend((project, d) for d in deadline_diff.render_changes(project, diff, today))
+
+    if not DIGEST_MODE:
+        stats = await run_pipeline(
+            projects,
+            tenant.source,
+            send,
+            on_error,
+            today=today,
+            quota=tenant.quota,
+            ledger=None if dry_run else tenant.ledger,
+            only_new=only_new,
+            on_services=on_services,
+            prefetched=prefetched,
+        )
+        for project, d in changes:
+            try:
+                if await send(d) is False:
+                    stats.skipped += 1
+                else:
+                    stats.sent_messages += 1
+            except Exception as e:
+                stats.errors += 1
+                await on_error(project, e)
+        if full and not dry_run:
+            ICAL_FEEDS.prune(tenant.name, projects)
+        await asyncio.to_thread(SNAPSHOTS.flush)
+        await asyncio.to_thread(ICAL_FEEDS.flush)
+        await asyncio.to_thread(unreachable.flush)
+        await asyncio.to_thread(LAYOUTS.flush)
+        return stats
+
+    collector = topic_digest.DigestCollector(tenant.name, (p.name for p in projects), full=full)
+
+    def on_digest_services(project, services):
+        collector.read(project.name)
+        on_services(project, services)
+
+    async def add_section(d: Delivery) -> None:
+        await collector.add(d)
+        # sezioni vuote: rimuovono solo la sezione precedente dal digest
+        if status is not None and d.text:
+            status.delivered(d.row, True)
+
+    stats = await run_pipeline(
+        projects,
+        tenant.source,
+        add_section,
+        on_error,
+        today=today,
+        quota=tenant.quota,
+        ledger=None if dry_run else tenant.ledger,
+        render=topic_digest.render_sections,
+        on_services=on_digest_services,
+        prefetched=prefetched,
+    )
 
-    s = str(raw).strip()
-    if not s:
-        return "", None
+    if dry_run:
+        # testi dei digest costruiti, nessuna modifica né stato salvato
+        targets = collector.targets
+        for sections in targets.values():
+            topic_digest.build_digest_parts(sections)
+        stats.sent_messages = len(targets)
+        return stats
+
+    def on_digest_error(chat_id, thread_id, e: Exception):
+        print(f"❌ [{tenant.name}] digest {chat_id}/{thread_id}: {type(e).__name__}: {e}")
+        reason = unreachable.classify(e)
+        if reason is not None:
+            blocked_thread = thread_id if reason == unreachable.THREAD_NOT_FOUND else None
+            if not unreachable.record(chat_id, blocked_thread, reason):
+                return
+        tenant.errors.add(f"digest chat {chat_id} topic {thread_id or 'generale'}", e)
+
+    def skip_unreachable(chat_id, thread_id) -> bool:
+        return bool(
+            unreachable.blocked(chat_id)
+            or (thread_id is not None and unreachable.blocked(chat_id, thread_id))
+        )
+
+    stats.sent_messages = await topic_digest.publish(
+        context.bot, collector, on_digest_error, skip=skip_unreachable
+    )
+    if full:
+        ICAL_FEEDS.prune(tenant.name, projects)
+    await asyncio.to_thread(SNAPSHOTS.flush)
+    await asyncio.to_thread(ICAL_FEEDS.flush)
+    await asyncio.to_thread(unreachable.flush)
+    await asyncio.to_thread(LAYOUTS.flush)
+    return stats
 
-    # se è numerico -> thread_id esplicito
-    if s.lstrip("-").isdigit():
-        try:
-            return "", int(s)
-        except Exception:
-            return "", None
 
-    return s, None
+async def check_tenant_deadlines(context: ContextTypes.DEFAULT_TYPE, tenant: Tenant, dry_run: bool = False):
+    today = date.today()
 
+    # Config e Gantt già letti dalla pre-lettura: restano valutazione e invio
+    # (prova a vuoto: pre-lettura lasciata al job vero, si rilegge tutto)
+    if not dry_run:
+        tenant.prefetch.stop()
+    if not dry_run and tenant.prefetch.config_ready_on(today):
+        config_stats = tenant.prefetch.config_stats
+    else:
+        config_stats, _ = await load_tenant_config(tenant)
+    if config_stats is None:
+        tenant.errors.add(
+            "foglio config",
+            RuntimeError("impossibile leggere il foglio di configurazione (export_data fallita)"),
+        )
+        return
 
-# -----------------------
-# Invio su topic o generale
-# -----------------------
-async def send_to_group_or_topic(
-    context: ContextTypes.DEFAULT_TYPE,
-    chat_id: int,
-    area_or_topic_name: str,
-    text: str,
-    forced_thread_id: int | None = None,
-):
+    print(
+        f"ℹ️ [{tenant.name}] Config: righe={config_stats['righe']}, "
+        f"ricompilate={config_stats['ricompilate']}, progetti={config_stats['progetti']}"
+    )
+
+    # Stato per progetto da riscrivere nel config (solo se ha le colonne di stato)
+    status = None
+    if tenant.config_cache.status_columns and not dry_run:
+        status = config_status.RunStatus(
+            datetime.now(TZ), tenant.config_cache.projects, today, tenant.config_cache.skipped
+        )
+
+    # Righe config non valide (es. link Gantt illeggibile)
+    for row, e in tenant.config_cache.errors:
+        report_row_error(tenant, row, e)
+        if status is not None:
+            status.error(row, e)
+
+    prefetched = {} if dry_run else tenant.prefetch.services_for(today)
+    stats = await run_projects(
+        context, tenant, tenant.config_cache.projects, today,
+        prefetched=prefetched, status=status, full=True, dry_run=dry_run,
+    )
+    if dry_run:
+        return stats
+    tenant.ledger.mark_daily_done(today)
+    tenant.prefetch.clear()
+
+    if status is not None:
+        await write_config_status(tenant, status)
+
+    print(
+        f"✅ [{tenant.name}] Job completato: progetti_processati={stats.projects}, "
+        f"messaggi_inviati={stats.sent_messages}, saltati={stats.skipped}, "
+        f"gantt_pre_letti={len(prefetched)}"
+    )
+
+    profiling.log_slow_projects(tenant.name, stats.durations)
+    return stats
+
+
+async def write_config_status(tenant: Tenant, status: config_status.RunStatus):
     """
-    Invia messaggio:
-    - se forced_thread_id è dato: invia in quel thread_id
-    - altrimenti prova lookup area/topic_name -> thread_id (topic_registry)
-    - fallback nel generale
+    Scrive lo stato dei progetti nelle colonne di stato del config
+    (una sola values.batchUpdate). Un errore finisce nel riepilogo errori
+    ma non blocca il job.
     """
-    if forced_thread_id is not None:
-        await context.bot.send_message(chat_id=chat_id, message_thread_id=forced_thread_id, text=text)
-        return
+    def _write():
+        return tenant.source.write_config_status(
+            tenant.source.client(),
+            tenant.config_spreadsheet_id,
+            tenant.config_range,
+            tenant.config_cache.status_columns,
+            status.rows(),
+            tenant.quota,
+        )
 
-    topic_id = tr.get_topic(chat_id, area_or_topic_name)
-    if topic_id is None:
-        await context.bot.send_message(chat_id=chat_id, text=text)
-    else:
-        await context.bot.send_message(chat_id=chat_id, message_thread_id=topic_id, text=text)
+    try:
+        written = await tenant.quota.run(_write)
+        print(f"📝 [{tenant.name}] Stato scritto nel foglio config: {written} righe")
+    except Exception as e:
+        print(f"❌ [{tenant.name}] scrittura stato config fallita: {type(e).__name__}: {e}")
+        tenant.errors.add("stato foglio config", e)
 
 
 # -----------------------
-# Job: controllo scadenze
+# Job: pre-lettura Gantt prima dell'invio
 # -----------------------
-async def check_deadlines_job(context: ContextTypes.DEFAULT_TYPE):
-    print(f"✅ check_deadlines_job avviato ({date.today()})")
+async def prefetch_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    PREFETCH_MINUTES prima di MESSAGE_TIME: rilegge config e Gantt
+    di tutti i tenant, senza inviare nulla (vedi prefetch.py).
+    """
+    # Giorno dell'invio (MESSAGE_TIME poco dopo mezzanotte → domani)
+    send_day = (datetime.now(TZ) + timedelta(minutes=prefetch.PREFETCH_MINUTES + 1)).date()
 
-    data, sheet_api, service = gs.export_data()
-    if data == -1 or sheet_api is None or service is None:
-        try:
-            await context.bot.send_message(
-                chat_id=ERROR_CHAT_ID,
-                text="⚠️ Errore: impossibile leggere il foglio di configurazione (export_data fallita)."
-            )
-        except Exception as e2:
-            print("❌ Non riesco a inviare su ERROR_CHAT_ID:", type(e2).__name__, e2)
+    results = await asyncio.gather(
+        *(prefetch_tenant(tenant, send_day) for tenant in TENANTS),
+        return_exceptions=True,
+    )
+
+    for tenant, result in zip(TENANTS, results):
+        if isinstance(result, Exception):
+            # Nessuna segnalazione: all'invio il job legge tutto normalmente
+            print(f"⚠️ [{tenant.name}] pre-lettura fallita: {type(result).__name__}: {result}")
+
+
+async def prefetch_tenant(tenant: Tenant, send_day: date):
+    store = tenant.prefetch
+    store.start(send_day)
+    started = asyncio.get_running_loop().time()
+
+    config_stats, _ = await load_tenant_config(tenant)
+    if config_stats is None:
+        print(f"⚠️ [{tenant.name}] pre-lettura: foglio config non leggibile, lettura all'invio")
         return
+    store.config_stats = config_stats
+
+    done = await prefetch.prefetch_projects(
+        tenant.config_cache.projects,
+        store,
+        tenant.source,
+        send_day,
+        quota=tenant.quota,
+    )
+    await asyncio.to_thread(LAYOUTS.flush)
+    print(
+        f"✅ [{tenant.name}] Pre-lettura: {done} Gantt pronti per l'invio "
+        f"({asyncio.get_running_loop().time() - started:.1f}s)"
+    )
 
-    today = date.today()
-    sent_messages = 0
-    total_projects = 0
 
-    for idx, entry in enumerate(data):
-        try:
-            project_name = (entry.get("Nome", "") or "").strip()
-            chat_id_raw = (entry.get("ChatId", "") or "").strip()
-            gantt_url = (entry.get("Gantt", "") or entry.get("Gannt", "") or "").strip()
-            giorni_avviso_raw = (entry.get("Giorni_Avviso", "") or entry.get("Giorni_avviso", "") or "").strip()
+# -----------------------
+# Job: modifiche Gantt in giornata (feed Drive)
+# -----------------------
+async def drive_watch_job(context: ContextTypes.DEFAULT_TYPE):
+    # Job completo o /run_now in corso: tick saltato (doppi invii).
+    # Il page token non avanza, le modifiche si leggono al tick successivo.
+    if RUN_LOCK.locked():
+        print("⏳ Watcher Drive: controllo scadenze in corso, tick saltato")
+        return
 
-            # NUOVO: override destinazione
-            topic_dest_raw = (entry.get("Topic_Destinazione", "") or "").strip()
+    async with RUN_LOCK:
+        results = await asyncio.gather(
+            *(watch_tenant_changes(context, tenant) for tenant in TENANTS),
+            return_exceptions=True,
+        )
 
-            # riga non valida
-            if not project_name or not chat_id_raw or not gantt_url:
-                continue
+    for tenant, result in zip(TENANTS, results):
+        if isinstance(result, Exception):
+            print(f"❌ [{tenant.name}] watcher Drive fallito: {type(result).__name__}: {result}")
+            tenant.errors.add("watcher Drive", result)
+        await flush_errors(context, tenant)
 
-            # evita righe “spazzatura” tipo header ripetuti
-            if not chat_id_raw.lstrip("-").isdigit():
-                continue
 
-            chat_id = int(chat_id_raw)
-            custom_days = parse_custom_days(giorni_avviso_raw)
-            total_projects += 1
+async def watch_tenant_changes(context: ContextTypes.DEFAULT_TYPE, tenant: Tenant):
+    """
+    Legge il feed modifiche Drive del tenant e rivaluta solo i Gantt cambiati,
+    inviando i promemoria non già inviati dal job giornaliero di oggi.
+    """
+    # Export locali: nessun feed modifiche Drive
+    if not tenant.source.remote:
+        return
 
-            # parse override destinazione
-            topic_dest_name, forced_thread_id = parse_topic_destination(topic_dest_raw)
+    token = drive_watcher.load_page_token(tenant.name)
 
-            services = read_services_deadlines(service, gantt_url)
+    def _poll():
+        return drive_watcher.poll_changes(tenant.drive_service(), token, tenant.quota)
 
-            # area -> days_left -> list[(service_name, deadline)]
-            per_area: Dict[str, Dict[int, List[Tuple[str, date, str]]]] = {}
+    changed, new_token = await tenant.quota.run(_poll)
 
-            for area, service_name, duration_days, deadline in services:
-                days_left = (deadline - today).days
-                thresholds = thresholds_for_service(duration_days, custom_days)
+    if changed:
+        # Foglio config modificato → ricompila (solo le righe cambiate)
+        if tenant.config_spreadsheet_id in changed:
+            await load_tenant_config(tenant)
 
-                if days_left in thresholds:
-                    per_area.setdefault(area, {})
-                    per_area[area].setdefault(days_left, [])
-                    per_area[area][days_left].append((service_name, deadline, area))
+        today = date.today()
+        projects = drive_watcher.changed_projects(tenant.config_cache.projects, set(changed))
 
-            # -----------------------------------------
-            # INVIO: due modalità
-            # -----------------------------------------
-            # 1) Se Topic_Destinazione è VUOTO -> modalità classica: un messaggio per area
-            if not topic_dest_raw:
-                for area, grouped in per_area.items():
-                    msg = build_message(project_name, area, grouped)
-                    await send_to_group_or_topic(context, chat_id, area, msg)
-                    sent_messages += 1
+        if projects and not tenant.ledger.daily_done_on(today):
+            # Prima del job giornaliero: niente invii, ma i Gantt pre-letti
+            # sono ormai vecchi → il job li rilegge
+            for p in projects:
+                tenant.prefetch.discard(p.read_key)
+        elif projects:
+            print(f"🔎 [{tenant.name}] Gantt modificati: {', '.join(p.name for p in projects)}")
 
-            # 2) Se Topic_Destinazione è COMPILATO -> manda TUTTO in un'unica destinazione
-            else:
-                # unisco tutti i servizi di tutte le aree in un unico grouped
-                grouped_all: Dict[int, List[Tuple[str, date, str]]] = {}
-                for area, grouped in per_area.items():
-                    for days_left, items in grouped.items():
-                        grouped_all.setdefault(days_left, [])
-                        # Prefix area per chiarezza quando si invia tutto insieme
-                        grouped_all[days_left].extend([(f"[{item_area}] {name}", dline, item_area) for name, dline, item_area in items])
-                
-                # se oggi non c'è nulla da avvisare, non invio nulla
-                if grouped_all:
-                    # etichetta "area" nel messaggio: usiamo il nome del topic destinazione (o "Generale")
-                    label = topic_dest_name if topic_dest_name else (topic_dest_raw or "Generale")
-                    msg = build_message(project_name, label, grouped_all)
-
-                    # se scrivono "Generale" -> invia nel generale (nessun topic)
-                    if topic_dest_raw.strip().lower() == "generale":
-                        await context.bot.send_message(chat_id=chat_id, text=msg)
-                    else:
-                        # invia nel topic indicato (nome) o nel forced thread_id numerico
-                        await send_to_group_or_topic(
-                            context,
-                            chat_id,
-                            topic_dest_name if topic_dest_name else label,
-                            msg,
-                            forced_thread_id=forced_thread_id,
-                        )
-                    sent_messages += 1
-
-        except Exception as e:
-            print(f"❌ ERRORE riga config {idx+2}: {type(e).__name__}: {e}")
-            try:
-                await context.bot.send_message(
-                    chat_id=ERROR_CHAT_ID,
-                    text=f"⚠️ Errore riga config {idx+2}: {type(e).__name__}: {e}"
-                )
-            except Exception as e2:
-                print("❌ Non riesco a inviare su ERROR_CHAT_ID:", type(e2).__name__, e2)
+            stats = await run_projects(context, tenant, projects, today, only_new=True)
+            print(f"✅ [{tenant.name}] Rivalutazione in giornata: messaggi_inviati={stats.sent_messages}")
 
-    print(f"✅ Job completato: progetti_processati={total_projects}, messaggi_inviati={sent_messages}")
+    drive_watcher.save_page_token(tenant.name, new_token)
 
 
 # -----------------------
@@ -364,13 +604,13 @@ async def on_forum_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if msg.forum_topic_created:
         name = msg.forum_topic_created.name.strip()
-        tr.set_topic(chat.id, name, thread_id)
+        await asyncio.to_thread(tr.set_topic, chat.id, name, thread_id)
         print(f"✅ Topic creato auto-registrato: '{name}' -> {thread_id}")
         return
 
     if msg.forum_topic_edited and msg.forum_topic_edited.name:
         new_name = msg.forum_topic_edited.name.strip()
-        tr.rename_area_by_thread(chat.id, thread_id, new_name)
+        await asyncio.to_thread(tr.rename_area_by_thread, chat.id, thread_id, new_name)
         print(f"✅ Topic rinominato aggiornato: '{new_name}' (thread {thread_id})")
         return
 
@@ -399,10 +639,219 @@ async def register_area(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     area = " ".join(context.args).strip()
-    tr.set_topic(chat.id, area, thread_id)
+    await asyncio.to_thread(tr.set_topic, chat.id, area, thread_id)
     await msg.reply_text(f"✅ Registrato: area '{area}' → topic_id {thread_id}")
 
 
+def is_admin(update: Update) -> bool:
+    """
+    Comandi di amministrazione: ammessi dagli utenti in ADMIN_USER_IDS
+    oppure da chiunque nella chat errori (globale o di un tenant).
+    """
+    chat = update.effective_chat
+    user = update.effective_user
+    if chat and (chat.id == ERROR_CHAT_ID or any(chat.id == t.error_chat_id for t in TENANTS)):
+        return True
+    return bool(user and user.id in ADMIN_USER_IDS)
+
+
+async def reload_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.effective_message
+    if not is_admin(update):
+        await msg.reply_text("⛔ Comando riservato agli amministratori.")
+        return
+
+    results = await asyncio.gather(
+        *(load_tenant_config(tenant) for tenant in TENANTS),
+        return_exceptions=True,
+    )
+
+    lines = ["🔄 Configurazione ricaricata"]
+    for tenant, result in zip(TENANTS, results):
+        stats = None if isinstance(result, Exception) else result[0]
+        if stats is None:
+            lines.append(f"⚠️ [{tenant.name}] impossibile leggere il foglio di configurazione")
+            continue
+
+        lines.append(
+            f"[{tenant.name}] righe={stats['righe']}, ricompilate={stats['ricompilate']}, "
+            f"progetti={stats['progetti']}"
+        )
+        for row, e in tenant.config_cache.errors:
+            lines.append(f"⚠️ [{tenant.name}] Riga {row}: {type(e).__name__}: {e}")
+    await msg.reply_text("\n".join(lines))
+
+
+async def audit_tenant(tenant: Tenant) -> list[str]:
+    """
+    Valida foglio config e Gantt del tenant (nessun invio di promemoria).
+    Ritorna i messaggi del report.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    calls_before = tenant.quota.calls
+
+    def _read():
+        return tenant.source.read_config(
+            tenant.source.client(), tenant.config_spreadsheet_id, tenant.config_range, tenant.quota
+        )
+
+    data = await tenant.quota.run(_read)
+    if data is None:
+        return [f"⚠️ [{tenant.name}] impossibile leggere il foglio di configurazione"]
+
+    config_issues = audit.audit_config(data)
+    # copia: l'audit non cambia i progetti usati dal job
+    configs = tenant.config_cache.copy()
+    configs.refresh(data)
+
+    audits = await audit.audit_projects(
+        configs.projects,
+        tenant.source,
+        quota=tenant.quota,
+    )
+    await asyncio.to_thread(LAYOUTS.flush)
+
+    return audit.render_report(
+        tenant.name,
+        config_issues,
+        audits,
+        calls=tenant.quota.calls - calls_before,
+        elapsed=loop.time() - started,
+    )
+
+
+async def audit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.effective_message
+    if not is_admin(update):
+        await msg.reply_text("⛔ Comando riservato agli amministratori.")
+        return
+
+    await msg.reply_text("🔎 Audit di foglio config e Gantt in corso...")
+
+    results = await asyncio.gather(
+        *(audit_tenant(tenant) for tenant in TENANTS),
+        return_exceptions=True,
+    )
+
+    for tenant, result in zip(TENANTS, results):
+        if isinstance(result, Exception):
+            result = [f"❌ [{tenant.name}] audit fallito: {type(result).__name__}: {result}"]
+        for text in result:
+            await msg.reply_text(text)
+
+
+def find_projects(name: str, chat_id: int):
+    """
+    Progetti (tenant, progetto) per nome (senza maiuscole/minuscole)
+    oppure, senza nome, collegati alla chat indicata.
+    """
+    key = name.strip().lower()
+    return [
+        (tenant, p)
+        for tenant in TENANTS
+        for p in tenant.config_cache.projects
+        if (p.name.strip().lower() == key if key else p.chat_id == chat_id)
+    ]
+
+
+async def run_now(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.effective_message
+    if not is_admin(update):
+        await msg.reply_text("⛔ Comando riservato agli amministratori.")
+        return
+
+    # Mai in sovrapposizione con il job completo (doppi invii)
+    if RUN_LOCK.locked():
+        await msg.reply_text("⏳ Un controllo scadenze è già in corso, riprova tra poco.")
+        return
+
+    async with RUN_LOCK:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        name = " ".join(context.args or []).strip()
+
+        targets = find_projects(name, update.effective_chat.id)
+        if not targets:
+            # Progetto nuovo o cache vuota (bot appena avviato): rilegge i config
+            await asyncio.gather(*(load_tenant_config(t) for t in TENANTS), return_exceptions=True)
+            targets = find_projects(name, update.effective_chat.id)
+
+        if not targets:
+            if name:
+                await msg.reply_text(f"⚠️ Nessun progetto chiamato '{name}' nel foglio config.")
+            else:
+                await msg.reply_text("⚠️ Nessun progetto collegato a questa chat. Uso: /run_now NOME_PROGETTO")
+            return
+
+        today = date.today()
+        lines = []
+        for tenant in TENANTS:
+            projects = [p for t, p in targets if t is tenant]
+            if not projects:
+                continue
+            stats = await run_projects(context, tenant, projects, today)
+            await flush_errors(context, tenant)
+            lines.append(
+                f"[{tenant.name}] {', '.join(p.name for p in projects)}: "
+                f"messaggi_inviati={stats.sent_messages}, errori={stats.errors}"
+            )
+
+    await msg.reply_text(f"✅ /run_now completato in {loop.time() - started:.1f}s\n" + "\n".join(lines))
+
+
+async def unreachable_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /unreachable               → elenca le destinazioni in cache negativa
+    /unreachable reset         → azzera tutta la cache
+    /unreachable reset CHAT_ID → azzera solo la chat (e i suoi topic)
+    """
+    msg = update.effective_message
+    if not is_admin(update):
+        await msg.reply_text("⛔ Comando riservato agli amministratori.")
+        return
+
+    args = context.args or []
+    if args and args[0].lower() == "reset":
+        target = args[1] if len(args) > 1 else ""
+        if target and not target.lstrip("-").isdigit():
+            await msg.reply_text("Uso: /unreachable reset [CHAT_ID]")
+            return
+        removed = await asyncio.to_thread(unreachable.reset, int(target) if target else None)
+        await msg.reply_text(f"✅ Cache destinazioni azzerata: {removed} voci rimosse")
+        return
+
+    items = await asyncio.to_thread(unreachable.entries)
+    if not items:
+        await msg.reply_text("✅ Nessuna destinazione irraggiungibile")
+        return
+
+    now = time.time()
+    lines = ["🚫 Destinazioni irraggiungibili:"]
+    for key, entry in items:
+        left = entry.get("until", 0) - now
+        state = f"sospesa ancora {left / 3600:.1f} h" if left > 0 else "nuovo tentativo al prossimo invio"
+        lines.append(
+            f" • {key}: {entry.get('reason')}, {entry.get('failures')} fallimenti "
+            f"dal {entry.get('since')}, {state}"
+        )
+    lines.append("\nPer riprovare subito: /unreachable reset [CHAT_ID]")
+    await msg.reply_text("\n".join(lines))
+
+
+async def profile_run(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.effective_message
+    if not is_admin(update):
+        await msg.reply_text("⛔ Comando riservato agli amministratori.")
+        return
+
+    # Prova a vuoto: stesse letture e stessi messaggi costruiti del job,
+    # ma nessun invio, ledger/snapshot/digest intatti, niente stato nel config.
+    # Restano solo il report di profiling e gli eventuali errori su ERROR_CHAT_ID.
+    await msg.reply_text("📊 Avvio job scadenze con profiling (prova a vuoto, nessun messaggio inviato)...")
+    await run_profiled_job(context, dry_run=True)
+
+
 def parse_hhmm(s: str) -> dtime:
     hh, mm = s.split(":")
     return dtime(hour=int(hh), minute=int(mm), tzinfo=TZ)
@@ -413,11 +862,22 @@ def parse_hhmm(s: str) -> dtime:
 # -----------------------
 def main():
     defaults = Defaults(tzinfo=TZ)
-    app = ApplicationBuilder().token(TOKEN).defaults(defaults).build()
+    app = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .defaults(defaults)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .build()
+    )
 
     # Handler comandi
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("register_area", register_area))
+    app.add_handler(CommandHandler("reload_config", reload_config))
+    app.add_handler(CommandHandler("profile_run", profile_run))
+    app.add_handler(CommandHandler("audit", audit_command))
+    app.add_handler(CommandHandler("run_now", run_now))
+    app.add_handler(CommandHandler("unreachable", unreachable_command))
 
     # Handler service messages topic create/rename
     app.add_handler(MessageHandler(filters.StatusUpdate.ALL, on_forum_events))
@@ -427,13 +887,29 @@ def main():
     else:
         # Job giornaliero
         t = parse_hhmm(MESSAGE_TIME)
-        app.job_queue.run_daily(check_deadlines_job, time=t)
+        app.job_queue.run_daily(scheduled_job, time=t)
 
         # (opzionale) test immediato:
-        # app.job_queue.run_once(check_deadlines_job, when=1)
+        # app.job_queue.run_once(scheduled_job, when=1)
 
         print(f"✅ Scheduler attivo: invio giornaliero alle {MESSAGE_TIME} ({TZ})")
 
+        # Pre-lettura config e Gantt prima dell'invio
+        if prefetch.PREFETCH_MINUTES > 0:
+            t_pre = (datetime.combine(date.today(), t) - timedelta(minutes=prefetch.PREFETCH_MINUTES)).timetz()
+            app.job_queue.run_daily(prefetch_job, time=t_pre)
+            print(f"✅ Pre-lettura Gantt attiva: {prefetch.PREFETCH_MINUTES:g} minuti prima dell'invio")
+
+        # Watcher modifiche Gantt in giornata
+        if DRIVE_WATCH_MINUTES > 0:
+            app.job_queue.run_repeating(drive_watch_job, interval=DRIVE_WATCH_MINUTES * 60, first=60)
+            print(f"✅ Watcher Drive attivo: ogni {DRIVE_WATCH_MINUTES:g} minuti")
+
+    # Feed iCalendar
+    if ical_feed.ICAL_PORT > 0:
+        ical_feed.start_server(ICAL_FEEDS)
+        print(f"✅ Feed iCalendar su http://{ical_feed.ICAL_BIND}:{ical_feed.ICAL_PORT}/ics/")
+
     app.run_polling()
 
 
@@ -0,0 +1,342 @@
+# pipeline.py
+
+# ============================================================
+# PIPELINE A STADI DEL CONTROLLO SCADENZE
+# ============================================================
+#
+# Il job non elabora più un progetto dall'inizio alla fine prima di
+# passare al successivo: ogni fase è uno stadio con i propri worker,
+# collegato al successivo da una coda limitata (asyncio.Queue maxsize).
+#
+#   progetti → fetch Gantt → parse → valutazione soglie → testo → invio
+#
+# L'invio segue l'urgenza, non l'ordine delle righe config:
+#   - la coda di invio è una coda a priorità (scaduti, oggi, domani, ...)
+#   - i messaggi urgenti (scadenza entro PIPELINE_URGENT_DAYS giorni,
+#     default 1) partono appena pronti
+#   - gli altri vengono trattenuti finché tutti i progetti sono stati
+#     valutati, così un "tra 7 giorni" del primo progetto non passa
+#     davanti a uno "scaduto" dell'ultimo
+#
+# - le code limitate danno backpressure: se l'invio rallenta, i fetch
+#   si fermano invece di accumulare Gantt in memoria
+# - l'invio parte appena il primo progetto è pronto, mentre gli altri
+#   Gantt sono ancora in download
+# - un errore su un progetto viene segnalato (on_error) e non ferma gli altri;
+#   se fallisce anche on_error l'errore viene solo stampato, e uno stadio
+#   che si interrompe comunque cancella gli altri (nessuno resta in attesa
+#   su una coda che non verrà più svuotata)
+# - i Gantt già letti in anticipo (prefetch.py) entrano direttamente
+#   nella valutazione
+#
+# Concorrenza per stadio da env (PIPELINE_<STADIO>_WORKERS):
+#   FETCH=4, PARSE=1, EVAL=1, RENDER=1, SEND=2
+# Dimensione di ogni coda: PIPELINE_QUEUE_SIZE (default 8)
+#
+# ============================================================
+
+import asyncio
+import itertools
+import math
+import os
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from gantt_reader import parse_gantt_rows
+from project_config import Project
+from quota import run_io
+from reminders import Delivery, SentLedger, evaluate_services, render_project
+from sources import as_source
+
+
+STAGES = ("fetch", "parse", "eval", "render", "send")
+
+DEFAULT_WORKERS = {"fetch": 4, "parse": 1, "eval": 1, "render": 1, "send": 2}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(int(os.getenv(name, default)), 1)
+    except ValueError:
+        return default
+
+
+def load_settings() -> Dict[str, int]:
+    """
+    Worker per stadio + dimensione code, letti dall'env.
+    """
+    settings = {
+        stage: _env_int(f"PIPELINE_{stage.upper()}_WORKERS", DEFAULT_WORKERS[stage])
+        for stage in STAGES
+    }
+    settings["queue_size"] = _env_int("PIPELINE_QUEUE_SIZE", 8)
+    try:
+        settings["urgent_days"] = int(os.getenv("PIPELINE_URGENT_DAYS", "1"))
+    except ValueError:
+        settings["urgent_days"] = 1
+    return settings
+
+
+# Sentinella di fine stream (una per ogni worker dello stadio successivo)
+_DONE = object()
+
+
+def _urgency(d: Delivery) -> float:
+    """
+    Priorità di invio: meno giorni alla scadenza = prima.
+    I messaggi senza scadenza (es. sezioni digest) vanno per ultimi.
+    """
+    return math.inf if d.days_left is None else d.days_left
+
+
+class _UrgencyQueue(asyncio.PriorityQueue):
+    """
+    Coda di invio: esce per primo il messaggio più urgente, a parità di
+    urgenza in ordine di arrivo; le sentinelle di fine escono per ultime.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._seq = itertools.count()
+
+    def _put(self, item):
+        priority = math.inf if item is _DONE else _urgency(item[1])
+        super()._put((priority, item is _DONE, next(self._seq), item))
+
+    def _get(self):
+        return super()._get()[-1]
+
+
+@dataclass
+class PipelineStats:
+    projects: int = 0
+    sent_messages: int = 0
+    errors: int = 0
+    # invii saltati da deliver (destinazione irraggiungibile, vedi unreachable.py)
+    skipped: int = 0
+    # nome progetto -> secondi spesi in fetch + parse (attesa quota inclusa)
+    durations: Dict[str, float] = field(default_factory=dict)
+
+
+async def _stage(
+    inq: asyncio.Queue,
+    outq: Optional[asyncio.Queue],
+    workers: int,
+    downstream_workers: int,
+    handle: Callable[[object], Awaitable[list]],
+) -> None:
+    """
+    Esegue `workers` worker che leggono da inq, chiamano handle(item)
+    e mettono i risultati (lista, anche vuota) in outq.
+
+    Quando tutti i worker hanno finito, propaga la fine dello stream
+    allo stadio successivo.
+    """
+    async def worker():
+        while True:
+            item = await inq.get()
+            if item is _DONE:
+                return
+            for out in await handle(item):
+                if outq is not None:
+                    await outq.put(out)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+    if outq is not None:
+        for _ in range(downstream_workers):
+            await outq.put(_DONE)
+
+
+async def run_pipeline(
+    projects: List[Project],
+    source,
+    deliver: Callable[[Delivery], Awaitable[Optional[bool]]],
+    on_error: Callable[[Project, Exception], Awaitable[None]],
+    today: Optional[date] = None,
+    quota=None,
+    settings: Optional[Dict[str, int]] = None,
+    ledger: Optional[SentLedger] = None,
+    only_new: bool = False,
+    render: Optional[Callable[..., List[Delivery]]] = None,
+    on_services: Optional[Callable[[Project, list], object]] = None,
+    prefetched: Optional[Dict[str, list]] = None,
+) -> PipelineStats:
+    """
+    Elabora i progetti attraverso gli stadi della pipeline.
+
+    - source: sorgente dei Gantt (sources.Source) oppure factory di client
+      Sheets; ogni worker di fetch ha un client proprio (i client
+      googleapiclient non sono thread-safe)
+    - deliver: invia un messaggio (Delivery); False = invio saltato
+    - on_error: segnala l'errore di un progetto
+    - quota: budget chiamate del tenant, condiviso dai worker di fetch
+    - ledger: registro dei promemoria già valutati oggi (aggiornato)
+    - only_new: invia solo i promemoria non presenti nel ledger
+      (controlli in giornata dopo il job giornaliero)
+    - render(project, per_area, services, today): produce i messaggi;
+      default reminders.render_project (es. topic_digest.render_sections)
+    - on_services(project, services): chiamata per ogni Gantt letto
+      (es. aggiornamento dei feed iCalendar)
+    - prefetched: read_key → servizi già letti (prefetch.py); quei
+      progetti saltano fetch e parse e vanno direttamente alla valutazione
+    """
+    settings = settings or load_settings()
+    source = as_source(source)
+    today = today or date.today()
+    render = render or (lambda project, per_area, services, day: render_project(project, per_area))
+    stats = PipelineStats()
+    loop = asyncio.get_running_loop()
+
+    size = settings["queue_size"]
+    q_fetch: asyncio.Queue = asyncio.Queue(size)
+    q_parse: asyncio.Queue = asyncio.Queue(size)
+    q_eval: asyncio.Queue = asyncio.Queue(size)
+    q_render: asyncio.Queue = asyncio.Queue(size)
+    # Senza limite: i messaggi sono piccoli e la backpressure resta sugli stadi a monte
+    q_send: asyncio.Queue = _UrgencyQueue()
+    # messaggi non urgenti, rilasciati a valutazione completa.
+    # Senza limite anche questa: contiene al più un messaggio per
+    # progetto/area con un promemoria oggi, cioè gli stessi testi che il
+    # run deve comunque inviare (qualche KB ciascuno). Un limite
+    # anticiperebbe gli invii non urgenti e romperebbe l'ordine per urgenza.
+    held: List[tuple] = []
+
+    prefetched = prefetched or {}
+
+    async def report(project: Project, e: Exception) -> None:
+        # on_error non deve far cadere un worker: gli stadi a monte
+        # resterebbero bloccati sulla coda piena
+        try:
+            await on_error(project, e)
+        except Exception as report_error:
+            print(f"⚠️ Pipeline: segnalazione errore di {project.name} fallita: {report_error}")
+
+    async def feed():
+        # Gantt pre-letti: direttamente alla valutazione, prima di
+        # chiudere lo stream di fetch (la fine di q_eval arriva dopo)
+        for project in projects:
+            services = prefetched.get(project.read_key)
+            if services is None:
+                continue
+            stats.projects += 1
+            try:
+                if on_services is not None:
+                    on_services(project, services)
+            except Exception as e:
+                stats.errors += 1
+                await report(project, e)
+                continue
+            await q_eval.put((project, services))
+
+        for project in projects:
+            if project.read_key in prefetched:
+                continue
+            await q_fetch.put(project)
+        for _ in range(settings["fetch"]):
+            await q_fetch.put(_DONE)
+
+    # client per worker di fetch, creato alla prima richiesta
+    local_clients: Dict[int, object] = {}
+
+    async def fetch(project: Project) -> list:
+        stats.projects += 1
+        started = loop.time()
+        try:
+            worker_id = id(asyncio.current_task())
+            if worker_id not in local_clients:
+                local_clients[worker_id] = await run_io(quota, source.client)
+            values = await run_io(
+                quota, source.fetch_gantt, local_clients[worker_id], project.gantt_url, quota, project.worksheets
+            )
+        except Exception as e:
+            stats.errors += 1
+            await report(project, e)
+            return []
+        return [(project, values, loop.time() - started)]
+
+    async def parse(item) -> list:
+        project, values, fetch_secs = item
+        started = loop.time()
+        try:
+            services = parse_gantt_rows(values, today)
+            if on_services is not None:
+                on_services(project, services)
+        except Exception as e:
+            stats.errors += 1
+            await report(project, e)
+            return []
+        # tempo di fetch + parse (esclusa l'attesa in coda tra i due stadi)
+        stats.durations[project.name] = fetch_secs + loop.time() - started
+        return [(project, services)]
+
+    async def evaluate(item) -> list:
+        project, services = item
+        try:
+            per_area = evaluate_services(services, project.custom_days, today)
+            if ledger is not None:
+                if only_new:
+                    per_area = ledger.filter_new(project, per_area, today)
+                ledger.record(project, per_area, today)
+            return [(project, services, per_area)]
+        except Exception as e:
+            stats.errors += 1
+            await report(project, e)
+            return []
+
+    async def render_stage(item) -> list:
+        project, services, per_area = item
+        try:
+            deliveries = render(project, per_area, services, today)
+        except Exception as e:
+            stats.errors += 1
+            await report(project, e)
+            return []
+
+        for d in deliveries:
+            if _urgency(d) <= settings.get("urgent_days", 1):
+                await q_send.put((project, d))
+            else:
+                held.append((project, d))
+        return []
+
+    async def render_then_release():
+        await _stage(q_render, None, settings["render"], 0, render_stage)
+        # Tutti i progetti valutati: via anche i messaggi non urgenti
+        for entry in held:
+            await q_send.put(entry)
+        for _ in range(settings["send"]):
+            await q_send.put(_DONE)
+
+    async def send(item) -> list:
+        project, delivery = item
+        try:
+            if await deliver(delivery) is False:
+                stats.skipped += 1
+            else:
+                stats.sent_messages += 1
+        except Exception as e:
+            stats.errors += 1
+            await report(project, e)
+        return []
+
+    tasks = [
+        asyncio.ensure_future(coro)
+        for coro in (
+            feed(),
+            _stage(q_fetch, q_parse, settings["fetch"], settings["parse"], fetch),
+            _stage(q_parse, q_eval, settings["parse"], settings["eval"], parse),
+            _stage(q_eval, q_render, settings["eval"], settings["render"], evaluate),
+            render_then_release(),
+            _stage(q_send, None, settings["send"], 0, send),
+        )
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # uno stadio caduto (o il job cancellato): fermo anche gli altri
+        for task in tasks:
+            task.cancel()
+
+    return stats
@@ -0,0 +1,149 @@
+# prefetch.py
+
+# ============================================================
+# PRE-LETTURA DEI GANTT PRIMA DI MESSAGE_TIME
+# ============================================================
+#
+# Il job giornaliero legge tutti i Gantt all'orario di invio: i
+# promemoria "delle 15:00" partono alle 15:00 + il tempo di lettura,
+# che per gli ultimi progetti può essere di parecchi minuti.
+#
+# Con la pre-lettura:
+#   - PREFETCH_MINUTES prima di MESSAGE_TIME (default 20) si rilegge il
+#     foglio config e si leggono + interpretano i Gantt, con al massimo
+#     PREFETCH_CONCURRENCY letture in parallelo (default 2) e sempre
+#     dentro la quota del tenant
+#   - i servizi letti restano in memoria (PrefetchStore, uno per tenant),
+#     una volta per Gantt anche se più progetti lo condividono
+#   - a MESSAGE_TIME il job fa solo valutazione e invio; i progetti senza
+#     dati pre-letti (errore, pre-lettura non finita) vengono letti
+#     normalmente dalla pipeline
+#
+# Un Gantt modificato tra pre-lettura e invio viene scartato dal watcher
+# Drive (PrefetchStore.discard): il job lo rilegge all'orario di invio,
+# così il primo invio della giornata usa già le date nuove.
+#
+# ============================================================
+
+import asyncio
+import os
+from datetime import date
+from typing import Dict, List, Optional
+
+from gantt_reader import parse_gantt_rows
+from project_config import Project
+from quota import run_io
+from sources import as_source
+
+
+PREFETCH_MINUTES = float(os.getenv("PREFETCH_MINUTES", "20"))
+PREFETCH_CONCURRENCY = max(int(os.getenv("PREFETCH_CONCURRENCY", "2")), 1)
+
+
+class PrefetchStore:
+    """
+    Risultati della pre-lettura di un tenant, validi per un solo giorno.
+
+    - config_stats: statistiche della rilettura config (None = non riuscita)
+    - services: Project.read_key (Gantt + tab) → servizi interpretati
+    """
+
+    def __init__(self):
+        self.day: Optional[date] = None
+        self.config_stats: Optional[Dict[str, int]] = None
+        self._services: Dict[str, list] = {}
+        # Gantt modificati dopo la pre-lettura: mai più pre-letti oggi
+        self._discarded: set = set()
+        self._stopped = False
+
+    def start(self, day: date) -> None:
+        self.day = day
+        self.config_stats = None
+        self._services = {}
+        self._discarded = set()
+        self._stopped = False
+
+    def stop(self) -> None:
+        """
+        Il job è partito: la pre-lettura non inizia altre letture.
+        """
+        self._stopped = True
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    def put(self, read_key: str, services: list) -> None:
+        # lettura iniziata prima della modifica: scartata
+        if read_key in self._discarded:
+            return
+        self._services[read_key] = services
+
+    def discard(self, read_key: str) -> None:
+        """
+        Gantt modificato dopo la pre-lettura: il job lo rilegge.
+        """
+        self._services.pop(read_key, None)
+        self._discarded.add(read_key)
+
+    def config_ready_on(self, day: date) -> bool:
+        return self.day == day and self.config_stats is not None
+
+    def services_for(self, day: date) -> Dict[str, list]:
+        """
+        Servizi pre-letti per il giorno indicato (vuoto se di un altro giorno).
+        """
+        return dict(self._services) if self.day == day else {}
+
+    def clear(self) -> None:
+        self.day = None
+        self.config_stats = None
+        self._services = {}
+        self._discarded = set()
+
+
+async def prefetch_projects(
+    projects: List[Project],
+    store: PrefetchStore,
+    source,
+    today: date,
+    quota=None,
+    concurrency: int = PREFETCH_CONCURRENCY,
+) -> int:
+    """
+    Legge e interpreta i Gantt dei progetti (ognuno una volta sola),
+    al massimo `concurrency` alla volta, salvando i servizi in store.
+
+    Gli errori non vengono segnalati qui: il progetto resta senza dati
+    pre-letti e il job lo rilegge (e segnala l'errore) all'orario di invio.
+
+    Ritorna il numero di Gantt pre-letti.
+    """
+    source = as_source(source)
+    queue: asyncio.Queue = asyncio.Queue()
+    by_key = {p.read_key: p for p in projects}
+    for key in by_key:
+        queue.put_nowait(key)
+    done = 0
+
+    async def worker():
+        nonlocal done
+        # i client googleapiclient non sono thread-safe: uno per worker
+        client = None
+        while not store.stopped:
+            try:
+                key = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                if client is None:
+                    client = await run_io(quota, source.client)
+                project = by_key[key]
+                values = await run_io(quota, source.fetch_gantt, client, project.gantt_url, quota, project.worksheets)
+                store.put(key, parse_gantt_rows(values, today))
+                done += 1
+            except Exception as e:
+                print(f"⚠️ Pre-lettura Gantt {key} fallita ({type(e).__name__}: {e}): lettura all'invio")
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, queue.qsize()))))
+    return done
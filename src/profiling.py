@@ -0,0 +1,164 @@
+# profiling.py
+
+# ============================================================
+# PROFILING DEL JOB GIORNALIERO
+# ============================================================
+#
+# Modalità profiling attivabile senza toccare il codice:
+#   - env PROFILE_NEXT_RUN=1  → profila la prima esecuzione del job
+#   - comando /profile_run    → esegue subito il job profilato, a vuoto
+#                               (nessun invio, vedi main.check_deadlines_job)
+#
+# Un'esecuzione profilata gira sotto cProfile + tracemalloc e produce
+# un report in storage/profiles/ con:
+#   - funzioni più costose (tempo cumulativo)
+#   - punti di allocazione memoria più pesanti
+#   - durata fetch + parse per progetto
+#
+# Nota: le letture Google girano in thread (QuotaBudget.run) che
+# cProfile non segue; il loro peso si vede nelle durate per progetto.
+#
+# Indipendentemente dal profiling, ogni progetto il cui fetch + parse
+# supera SLOW_PROJECT_SECONDS viene annotato in storage/slow_projects.log.
+#
+# ============================================================
+
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from storage import storage_path
+
+
+SLOW_PROJECT_SECONDS = float(os.getenv("SLOW_PROJECT_SECONDS", "30"))
+
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+
+
+# Richiesta PROFILE_NEXT_RUN già usata da questo processo
+_ENV_REQUEST_TAKEN = False
+
+
+def profile_requested_by_env() -> bool:
+    """
+    True se PROFILE_NEXT_RUN è attivo (solo lettura dell'ambiente).
+    """
+    return os.getenv("PROFILE_NEXT_RUN", "").strip().lower() in {"1", "true", "yes", "si"}
+
+
+def take_env_request() -> bool:
+    """
+    True una sola volta per processo se PROFILE_NEXT_RUN è attivo
+    (le esecuzioni successive tornano normali).
+    """
+    global _ENV_REQUEST_TAKEN
+    if _ENV_REQUEST_TAKEN or not profile_requested_by_env():
+        return False
+    _ENV_REQUEST_TAKEN = True
+    return True
+
+
+# ============================================================
+# PROGETTI LENTI
+# ============================================================
+
+def log_slow_projects(label: str, durations: Dict[str, float], threshold: float = SLOW_PROJECT_SECONDS) -> List[Tuple[str, float]]:
+    """
+    Annota in storage/slow_projects.log i progetti sopra soglia.
+    Ritorna la lista (progetto, secondi) dei progetti lenti.
+    """
+    slow = sorted(((p, s) for p, s in durations.items() if s > threshold), key=lambda x: -x[1])
+    if not slow:
+        return slow
+
+    p = storage_path("slow_projects.log")
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    stamp = datetime.now().isoformat(timespec="seconds")
+    with open(p, "a", encoding="utf-8") as f:
+        for name, secs in slow:
+            f.write(f"[{stamp}] [{label}] {name}: fetch+parse {secs:.1f}s (soglia {threshold:.0f}s)\n")
+            print(f"🐢 [{label}] Progetto lento: {name} ({secs:.1f}s)")
+    return slow
+
+
+# ============================================================
+# ESECUZIONE PROFILATA
+# ============================================================
+
+async def run_profiled(job: Callable[[], Awaitable[Dict[str, object]]]) -> Tuple[str, str]:
+    """
+    Esegue job() sotto cProfile + tracemalloc.
+
+    job deve ritornare {nome_tenant: PipelineStats} (come check_deadlines_job).
+
+    Ritorna (percorso report, riepilogo breve per Telegram).
+    """
+    tracemalloc.start(25)
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+
+    profiler.enable()
+    try:
+        results = await job()
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    # Durate per progetto da tutti i tenant
+    durations: List[Tuple[str, float]] = []
+    for tenant_name, stats in (results or {}).items():
+        for project, secs in getattr(stats, "durations", {}).items():
+            durations.append((f"[{tenant_name}] {project}", secs))
+    durations.sort(key=lambda x: -x[1])
+
+    # Funzioni più costose
+    buf = io.StringIO()
+    ps = pstats.Stats(profiler, stream=buf)
+    ps.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    # Allocazioni
+    allocations = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    )).statistics("lineno")[:TOP_ALLOCATIONS]
+
+    lines = [
+        f"PROFILING check_deadlines_job — {datetime.now().isoformat(timespec='seconds')}",
+        f"Durata totale: {elapsed:.2f}s",
+        f"Picco memoria tracciata: {peak / 1024 / 1024:.1f} MiB",
+        "",
+        "== Durata fetch + parse per progetto ==",
+    ]
+    lines += [f"{secs:8.2f}s  {name}" for name, secs in durations] or ["(nessun progetto)"]
+    lines += ["", f"== Top {TOP_FUNCTIONS} funzioni (tempo cumulativo) ==", buf.getvalue()]
+    lines += [f"== Top {TOP_ALLOCATIONS} punti di allocazione ==", *[str(stat) for stat in allocations]]
+
+    os.makedirs(storage_path("profiles"), exist_ok=True)
+    report_path = storage_path(f"profiles/profile_{datetime.now():%Y%m%d_%H%M%S}.txt")
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    # Riepilogo breve
+    top_funcs = sorted(ps.stats.items(), key=lambda kv: -kv[1][3])[:5]
+    summary = [
+        "📊 Profiling job scadenze",
+        f"Durata: {elapsed:.1f}s — picco memoria: {peak / 1024 / 1024:.1f} MiB",
+        f"Progetti: {len(durations)}",
+    ]
+    if durations:
+        summary.append("Più lenti (fetch+parse):")
+        summary += [f" {secs:.1f}s {name}" for name, secs in durations[:5]]
+    summary.append("Funzioni (cumulativo):")
+    summary += [f" {ct:.2f}s {os.path.basename(fn)}:{line} {func}" for (fn, line, func), (_, _, _, ct, _) in top_funcs]
+    summary.append(f"Report: {report_path}")
+
+    return report_path, "\n".join(summary)
@@ -0,0 +1,281 @@
+# project_config.py
+
+# ============================================================
+# CONFIGURAZIONE PROGETTI COMPILATA
+# ============================================================
+#
+# Le righe del foglio CONFIG (dict prodotti da googleSheetRead.export_data)
+# vengono validate una sola volta e trasformate in oggetti Project.
+#
+# La cache è indicizzata sul contenuto della riga: alla lettura successiva
+# vengono ri-validate solo le righe cambiate (o nuove); le altre riusano
+# l'oggetto già compilato.
+#
+# ============================================================
+
+from dataclasses import dataclass, replace
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from gantt_reader import extract_spreadsheet_key
+
+
+# ============================================================
+# PARSING CAMPI CONFIG
+# ============================================================
+
+def parse_custom_days(raw: str) -> set[int]:
+    """
+    "7,5,4" -> {7,5,4}
+    Celle vuote/valori non numerici -> ignorati
+    """
+    if not raw:
+        return set()
+    raw = str(raw).strip()
+    if not raw:
+        return set()
+
+    out: set[int] = set()
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            out.add(int(part))
+        except Exception:
+            continue
+    return out
+
+
+def parse_topic_destination(raw: str) -> tuple[str, int | None]:
+    """
+    Interpreta il campo 'Topic_Destinazione' dal foglio config.
+
+    Supporta:
+    - "" (vuoto) -> ("", None)  => nessun override
+    - "Generale" -> ("generale", None) => invia nel generale
+    - "IT" / "Marketing" -> ("IT", None) => invia nel topic con quel nome (via topic_registry)
+    - "4" (numero) -> ("", 4) => invia direttamente nel thread_id 4 (senza lookup)
+    """
+    if not raw:
+        return "", None
+
+    s = str(raw).strip()
+    if not s:
+        return "", None
+
+    # se è numerico -> thread_id esplicito
+    if s.lstrip("-").isdigit():
+        try:
+            return "", int(s)
+        except Exception:
+            return "", None
+
+    return s, None
+
+
+def parse_worksheets(raw: str) -> Tuple[str, ...]:
+    """
+    Campo 'Fogli_Gantt': tab del Gantt da leggere insieme.
+    "Fase 1, Fase 2" → ("Fase 1", "Fase 2"); "Fase *" → ("Fase *",)
+    Vuoto → () (solo il tab GANTT, con rilevamento layout)
+    """
+    parts = str(raw or "").replace(";", ",").split(",")
+    return tuple(dict.fromkeys(p.strip() for p in parts if p.strip()))
+
+
+# ============================================================
+# PROGETTO COMPILATO
+# ============================================================
+
+@dataclass(frozen=True)
+class Project:
+    """
+    Riga del foglio CONFIG già validata.
+
+    - row: numero riga nel foglio (per i messaggi di errore)
+    - gantt_key: spreadsheetId estratto dal link Gantt
+    - custom_days: giorni di avviso personalizzati (Giorni_avviso)
+    - topic_dest_*: override destinazione (Topic_Destinazione)
+    - worksheets: tab / pattern del Gantt da leggere (Fogli_Gantt)
+    """
+    row: int
+    name: str
+    chat_id: int
+    gantt_url: str
+    gantt_key: str
+    custom_days: FrozenSet[int]
+    topic_dest_raw: str
+    topic_dest_name: str
+    forced_thread_id: Optional[int]
+    worksheets: Tuple[str, ...] = ()
+
+    @property
+    def read_key(self) -> str:
+        """
+        Identità della lettura del Gantt: progetti con lo stesso Gantt e
+        gli stessi tab condividono la lettura (pre-lettura, pipeline).
+        """
+        if not self.worksheets:
+            return self.gantt_key
+        return f"{self.gantt_key}|{','.join(self.worksheets)}"
+
+
+def _cell(entry: Dict[str, str], key: str) -> str:
+    return str(entry.get(key, "") or "").strip()
+
+
+def _fingerprint(entry: Dict[str, str]) -> Tuple:
+    """
+    Identità del contenuto di una riga (esclude il numero di riga,
+    così spostare una riga nel foglio non la fa ri-validare).
+    """
+    return tuple(sorted((k, str(v)) for k, v in entry.items() if k != "_row"))
+
+
+def skip_reason(entry: Dict[str, str]) -> Optional[str]:
+    """
+    Motivo per cui una riga config viene ignorata da compile_entry
+    (None se la riga è utilizzabile).
+    """
+    for key in ("Nome", "ChatId", "Gantt"):
+        if not _cell(entry, key):
+            return f"{key} mancante"
+
+    # evita righe “spazzatura” tipo header ripetuti
+    chat_id_raw = _cell(entry, "ChatId")
+    if not chat_id_raw.lstrip("-").isdigit():
+        return f"ChatId non numerico: {chat_id_raw!r}"
+
+    return None
+
+
+def compile_entry(entry: Dict[str, str], row: int) -> Optional[Project]:
+    """
+    Valida una riga config e la trasforma in Project.
+
+    Ritorna:
+      - Project se la riga è valida
+      - None se la riga va ignorata (campi obbligatori vuoti,
+        header ripetuti o righe "spazzatura" con ChatId non numerico)
+
+    Solleva ValueError se la riga sembra un progetto ma non è utilizzabile
+    (es. link Gantt da cui non si ricava la key).
+    """
+    project_name = _cell(entry, "Nome")
+    chat_id_raw = _cell(entry, "ChatId")
+    gantt_url = _cell(entry, "Gantt")
+    giorni_avviso_raw = _cell(entry, "Giorni_avviso")
+    topic_dest_raw = _cell(entry, "Topic_Destinazione")
+
+    # riga non valida o “spazzatura” (vedi skip_reason)
+    if skip_reason(entry) is not None:
+        return None
+
+    topic_dest_name, forced_thread_id = parse_topic_destination(topic_dest_raw)
+
+    return Project(
+        row=row,
+        name=project_name,
+        chat_id=int(chat_id_raw),
+        gantt_url=gantt_url,
+        gantt_key=extract_spreadsheet_key(gantt_url),
+        custom_days=frozenset(parse_custom_days(giorni_avviso_raw)),
+        topic_dest_raw=topic_dest_raw,
+        topic_dest_name=topic_dest_name,
+        forced_thread_id=forced_thread_id,
+        worksheets=parse_worksheets(_cell(entry, "Fogli_Gantt")),
+    )
+
+
+# ============================================================
+# CACHE TRA ESECUZIONI
+# ============================================================
+
+class ProjectConfigCache:
+    """
+    Insieme dei progetti compilati, riusato tra un'esecuzione e l'altra.
+
+    refresh() riceve le righe appena lette dal foglio e ricompila solo
+    quelle il cui contenuto non è già in cache.
+    """
+
+    def __init__(self):
+        # fingerprint riga -> Project | None (ignorata) | Exception (non valida)
+        self._compiled: Dict[Tuple, object] = {}
+        self.projects: List[Project] = []
+        self.errors: List[Tuple[int, Exception]] = []
+        # righe ignorate (skip_reason): (riga, motivo)
+        self.skipped: List[Tuple[int, str]] = []
+        # colonne di stato presenti nel foglio (googleSheetRead.ConfigEntries)
+        self.status_columns: Dict[str, int] = {}
+
+    def refresh(self, data: List[Dict[str, str]]) -> Dict[str, int]:
+        """
+        Aggiorna progetti ed errori a partire dalle righe del foglio.
+
+        Ritorna statistiche:
+          {"righe", "ricompilate", "progetti", "errori"}
+        """
+        compiled: Dict[Tuple, object] = {}
+        projects: List[Project] = []
+        errors: List[Tuple[int, Exception]] = []
+        skipped: List[Tuple[int, str]] = []
+        recompiled = 0
+
+        for idx, entry in enumerate(data):
+            row = int(entry.get("_row") or idx + 2)
+            fp = _fingerprint(entry)
+
+            if fp in compiled:
+                result = compiled[fp]
+            elif fp in self._compiled:
+                result = self._compiled[fp]
+            else:
+                recompiled += 1
+                try:
+                    result = compile_entry(entry, row)
+                except Exception as e:
+                    result = e
+            compiled[fp] = result
+
+            if isinstance(result, Exception):
+                errors.append((row, result))
+            elif result is not None:
+                projects.append(result if result.row == row else replace(result, row=row))
+            elif any(str(v).strip() for k, v in entry.items() if k != "_row"):
+                # riga con dati ma ignorata (righe con il solo stato scritto dal bot escluse)
+                skipped.append((row, skip_reason(entry)))
+
+        # Le righe sparite dal foglio escono anche dalla cache
+        self._compiled = compiled
+        self.projects = projects
+        self.errors = errors
+        self.skipped = skipped
+        self.status_columns = dict(getattr(data, "status_columns", {}))
+
+        return {
+            "righe": len(data),
+            "ricompilate": recompiled,
+            "progetti": len(projects),
+            "errori": len(errors),
+        }
+
+    def copy(self) -> "ProjectConfigCache":
+        """
+        Copia indipendente: refresh() sulla copia riusa le righe già
+        compilate senza cambiare i progetti di questa cache.
+        """
+        other = ProjectConfigCache()
+        other._compiled = dict(self._compiled)
+        other.projects = list(self.projects)
+        other.errors = list(self.errors)
+        other.skipped = list(self.skipped)
+        other.status_columns = dict(self.status_columns)
+        return other
+
+    def clear(self) -> None:
+        self._compiled = {}
+        self.projects = []
+        self.errors = []
+        self.skipped = []
+        self.status_columns = {}
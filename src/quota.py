@@ -0,0 +1,100 @@
+# quota.py
+
+# ============================================================
+# BUDGET DI CHIAMATE GOOGLE API (TOKEN BUCKET)
+# ============================================================
+#
+# Ogni tenant ha il proprio budget: le chiamate di un tenant non
+# consumano la quota degli altri.
+#
+# Le letture Google sono sincrone e girano in thread separati,
+# quindi il budget è protetto da un lock e acquire() blocca il
+# thread chiamante finché non c'è un token.
+#
+# I thread sono quelli del budget (QuotaBudget.run, QUOTA_THREADS per
+# tenant), non l'executor di default di asyncio: un tenant fermo in
+# attesa di token non blocca le altre operazioni in thread
+# (salvataggi, topic, altri tenant).
+#
+# ============================================================
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+# Thread per tenant dedicati alle letture Google
+QUOTA_THREADS = max(int(os.getenv("QUOTA_THREADS", "6")), 1)
+
+
+class QuotaBudget:
+    """
+    Token bucket: al massimo `per_minute` chiamate al minuto,
+    con una raffica iniziale pari a `burst` (default = per_minute).
+    """
+
+    def __init__(self, per_minute: int = 60, burst: int | None = None, threads: int = QUOTA_THREADS):
+        self.per_minute = max(int(per_minute), 1)
+        self.capacity = float(burst if burst is not None else self.per_minute)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self._threads = threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.calls = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.per_minute / 60.0)
+        self._last = now
+
+    def acquire(self, n: int = 1) -> float:
+        """
+        Consuma n token, attendendo se necessario.
+        Ritorna i secondi di attesa.
+
+        Blocca il thread: va chiamata dai thread del budget (run()).
+        n oltre la capacità non verrebbe mai soddisfatto → ValueError.
+        """
+        if n > self.capacity:
+            raise ValueError(f"Quota: richiesti {n} token, capacità del budget {self.capacity:g}")
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= n:
+                    self._tokens -= n
+                    self.calls += n
+                    return waited
+                wait = (n - self._tokens) * 60.0 / self.per_minute
+            time.sleep(wait)
+            waited += wait
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix="quota")
+            return self._executor
+
+    async def run(self, fn: Callable, *args):
+        """
+        Come asyncio.to_thread, ma nei thread di questo budget.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+
+
+async def run_io(quota: Optional[QuotaBudget], fn: Callable, *args):
+    """
+    Esegue una lettura Google in thread: nei thread del budget del
+    tenant se c'è, altrimenti con asyncio.to_thread.
+    """
+    if quota is None:
+        return await asyncio.to_thread(fn, *args)
+    return await quota.run(fn, *args)
@@ -0,0 +1,321 @@
+# reminders.py
+
+# ============================================================
+# LOGICA PROMEMORIA: SOGLIE, VALUTAZIONE E TESTO MESSAGGI
+# ============================================================
+#
+# Nucleo di valutazione condiviso da tutti i percorsi di invio
+# (job giornaliero, pipeline, comandi on-demand):
+#
+#   servizi Gantt → evaluate_services → per_area
+#   per_area      → render_project    → lista di Delivery
+#
+# Nessuna chiamata Telegram o Google qui dentro.
+#
+# ============================================================
+
+import json
+import os
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from gantt_reader import service_label
+from project_config import Project
+
+
+# --------------------------------------
+# Messaggi personalizzabili per gravità
+# --------------------------------------
+
+# Permette la lettura delle variabili dell'env delle frasi come lista di stringhe
+def load_message_list(env_name: str, default: list[str] | None = None) -> list[str]:
+    """
+    Legge una variabile dall'env e la converte in lista di stringhe.
+    Il formato atteso nell'env è JSON, ad esempio:
+    MESSAGES=["frase 1","frase 2"]
+    """
+    raw = os.getenv(env_name)
+
+    if not raw:
+        return default.copy() if default else []
+
+    try:
+        parsed = json.loads(raw)
+        if isinstance(parsed, list):
+            return [str(x) for x in parsed if str(x).strip()]
+    except Exception:
+        pass
+
+    # fallback: una sola frase semplice non JSON
+    return [raw.strip()] if raw.strip() else (default.copy() if default else [])
+
+
+# Frasi
+OVERDUE_MESSAGES = load_message_list("OVERDUE_MESSAGES")
+TODAY_MESSAGES = load_message_list("TODAY_MESSAGES")
+TOMORROW_MESSAGES = load_message_list("TOMORROW_MESSAGES")
+SOON_MESSAGES = load_message_list("SOON_MESSAGES")
+DEFAULT_MESSAGES = load_message_list("DEFAULT_MESSAGES", ["Occhio alla tabella di marcia 📅"])
+
+# Classifica la "gravità" delle scadenze per i messaggi personalizzati
+def get_severity_messages(days_left: int) -> list[str]:
+    """
+    Restituisce la lista base di frasi in base alla gravità.
+    """
+    if days_left < 0:
+        return OVERDUE_MESSAGES.copy()
+    if days_left == 0:
+        return TODAY_MESSAGES.copy()
+    if days_left == 1:
+        return TOMORROW_MESSAGES.copy()
+    if days_left < 5:
+        return SOON_MESSAGES.copy()
+    return DEFAULT_MESSAGES.copy()
+
+
+# Aggiunge condizioni extra per i messaggi in base al topic
+def extend_conditional_messages(messages: list[str], area: str, days_left: int) -> list[str]:
+    """
+    Aggiunge frasi extra in base a condizioni personalizzate.
+    """
+    area_clean = (area or "").strip()
+
+    # Esempio: aggiungi frasi solo se l'area NON è IT o Web
+    if area_clean not in {"IT", "Web"}:
+        messages.extend([
+            "Un IT avrebbe già finito...",
+            "Un IT farebbe decisamente di meglio",
+            "Credo ci siano pochi IT qui in mezzo...",
+        ])
+    return messages
+
+
+# Sceglie la frase a caso 
+def get_random_fun_message(area: str, days_left: int) -> str:
+    """
+    Costruisce la lista finale di frasi candidate e ne sceglie una a caso.
+    """
+    candidates = get_severity_messages(days_left)
+    candidates = extend_conditional_messages(candidates, area, days_left)
+
+    if not candidates:
+        candidates = DEFAULT_MESSAGES
+
+    return random.choice(candidates)
+
+
+# -----------------------
+# Utility: soglie avvisi
+# -----------------------
+def thresholds_for_service(duration_days: int, custom_days: set[int]) -> set[int]:
+    """
+    Standard:
+      - metà: ceil(d/2)
+      - giorno prima: 1
+      - giorno stesso: 0
+      - giorno dopo: -1
+    + custom days dal foglio config (es. 7,5,4)
+    """
+    half = (duration_days + 1) // 2  # ceil(d/2)
+    return {half, 1, 0, -1} | custom_days
+
+
+def label_for_days_left(days_left: int) -> str:
+    if days_left == -1:
+        return "🟥 Scaduto IERI"
+    if days_left == 0:
+        return "🟥 In scadenza OGGI"
+    if days_left == 1:
+        return "🟧 Scade DOMANI"
+    return f"🟨 Scade tra {days_left} giorni"
+
+
+def build_message(project_name: str, area: str, grouped: dict) -> str:
+    """
+    grouped: dict days_left -> list[(service_name, deadline_date, service_area)]
+    """
+    lines = [
+        "⏰ PROMEMORIA SCADENZE",
+        f"📌 Progetto: {project_name}",
+    ]
+
+    for days_left in sorted(grouped.keys()):
+        lines.append(label_for_days_left(days_left))
+        for name, dline, service_area in grouped[days_left]:
+            fun_line = get_random_fun_message(service_area, days_left)
+            lines.append(f" 🏷️ {name} — {dline.strftime('%d/%m/%Y')}")
+            lines.append(f"    💬 {fun_line}")
+        lines.append("")
+
+    return "\n".join(lines).strip()
+
+
+# -----------------------
+# Valutazione servizi
+# -----------------------
+
+# area -> days_left -> list[(service_name, deadline, service_area)]
+PerArea = Dict[str, Dict[int, List[Tuple[str, date, str]]]]
+
+
+def evaluate_services(services: Iterable[Tuple[str, str, int, date]], custom_days, today: date) -> PerArea:
+    """
+    Seleziona i servizi che oggi cadono su una soglia di avviso
+    e li raggruppa per area e giorni rimanenti.
+    """
+    per_area: PerArea = {}
+
+    for service in services:
+        area, _, duration_days, deadline = service
+        days_left = (deadline - today).days
+        thresholds = thresholds_for_service(duration_days, custom_days)
+
+        if days_left in thresholds:
+            per_area.setdefault(area, {})
+            per_area[area].setdefault(days_left, [])
+            # Gantt a più tab: "Nome (Tab)"
+            per_area[area][days_left].append((service_label(service), deadline, area))
+
+    return per_area
+
+
+def next_reminder_date(services: Iterable[Tuple[str, str, int, date]], custom_days, today: date) -> Optional[date]:
+    """
+    Primo giorno dopo oggi in cui almeno un servizio cade su una soglia
+    di avviso (None se non ci sono altri promemoria in programma).
+    """
+    best: Optional[date] = None
+    for _, _, duration_days, deadline in services:
+        for days in thresholds_for_service(duration_days, custom_days):
+            day = deadline - timedelta(days=days)
+            if day > today and (best is None or day < best):
+                best = day
+    return best
+
+
+# -----------------------
+# Messaggi da inviare
+# -----------------------
+@dataclass(frozen=True)
+class Delivery:
+    """
+    Messaggio pronto per l'invio.
+
+    - topic: nome area/topic da risolvere con topic_registry
+    - forced_thread_id: thread esplicito (Topic_Destinazione numerico)
+    - general: True → invio nel generale senza lookup
+    - days_left: giorni alla scadenza più urgente del messaggio
+      (ordine di invio: scaduti, oggi, domani, poi le altre soglie)
+    - row: riga config del progetto (stato per riga, config_status.py)
+    """
+    project_name: str
+    chat_id: int
+    topic: str
+    text: str
+    forced_thread_id: Optional[int] = None
+    general: bool = False
+    days_left: Optional[int] = None
+    row: Optional[int] = None
+
+
+def render_project(project: Project, per_area: PerArea) -> List[Delivery]:
+    """
+    Trasforma le scadenze selezionate di un progetto nei messaggi da inviare.
+
+    Due modalità:
+    1) Topic_Destinazione VUOTO -> un messaggio per area
+    2) Topic_Destinazione COMPILATO -> tutto in un'unica destinazione
+    """
+    out: List[Delivery] = []
+
+    if not project.topic_dest_raw:
+        for area, grouped in per_area.items():
+            msg = build_message(project.name, area, grouped)
+            out.append(Delivery(project.name, project.chat_id, area, msg, days_left=min(grouped), row=project.row))
+        return out
+
+    # unisco tutti i servizi di tutte le aree in un unico grouped
+    grouped_all: Dict[int, List[Tuple[str, date, str]]] = {}
+    for area, grouped in per_area.items():
+        for days_left, items in grouped.items():
+            grouped_all.setdefault(days_left, [])
+            # Prefix area per chiarezza quando si invia tutto insieme
+            grouped_all[days_left].extend([(f"[{item_area}] {name}", dline, item_area) for name, dline, item_area in items])
+
+    # se oggi non c'è nulla da avvisare, non invio nulla
+    if not grouped_all:
+        return out
+
+    # etichetta "area" nel messaggio: usiamo il nome del topic destinazione (o "Generale")
+    label = project.topic_dest_name if project.topic_dest_name else (project.topic_dest_raw or "Generale")
+    msg = build_message(project.name, label, grouped_all)
+
+    out.append(Delivery(
+        project.name,
+        project.chat_id,
+        label,
+        msg,
+        forced_thread_id=project.forced_thread_id,
+        # se scrivono "Generale" -> invia nel generale (nessun topic)
+        general=project.topic_dest_raw.strip().lower() == "generale",
+        days_left=min(grouped_all),
+        row=project.row,
+    ))
+    return out
+
+
+# -----------------------
+# Promemoria già inviati oggi
+# -----------------------
+class SentLedger:
+    """
+    Registro in memoria dei promemoria valutati nella giornata corrente.
+
+    Il job giornaliero registra tutto ciò che seleziona; i controlli
+    successivi della stessa giornata (es. watcher Drive) inviano solo
+    ciò che non è già nel registro. Il registro si azzera al cambio data.
+    """
+
+    def __init__(self):
+        self.day: Optional[date] = None
+        self.daily_done = False
+        self._keys: set = set()
+
+    def _roll(self, today: date) -> None:
+        if self.day != today:
+            self.day = today
+            self.daily_done = False
+            self._keys = set()
+
+    @staticmethod
+    def _key(project: Project, area: str, name: str, deadline: date, days_left: int) -> Tuple:
+        return (project.chat_id, project.name, area, name, deadline.isoformat(), days_left)
+
+    def mark_daily_done(self, today: date) -> None:
+        self._roll(today)
+        self.daily_done = True
+
+    def daily_done_on(self, today: date) -> bool:
+        return self.day == today and self.daily_done
+
+    def record(self, project: Project, per_area: PerArea, today: date) -> None:
+        self._roll(today)
+        for area, grouped in per_area.items():
+            for days_left, items in grouped.items():
+                for name, deadline, _ in items:
+                    self._keys.add(self._key(project, area, name, deadline, days_left))
+
+    def filter_new(self, project: Project, per_area: PerArea, today: date) -> PerArea:
+        """
+        Ritorna solo i promemoria non ancora registrati oggi.
+        """
+        self._roll(today)
+        out: PerArea = {}
+        for area, grouped in per_area.items():
+            for days_left, items in grouped.items():
+                new = [it for it in items if self._key(project, area, it[0], it[1], days_left) not in self._keys]
+                if new:
+                    out.setdefault(area, {})[days_left] = new
+        return out
@@ -0,0 +1,614 @@
+# sources.py
+
+# ============================================================
+# SORGENTI DATI (FOGLIO CONFIG + GANTT)
+# ============================================================
+#
+# Il bot legge foglio config e Gantt attraverso una "sorgente":
+#
+#   GoogleSheetsSource → Google Sheets API (default, produzione)
+#   LocalFileSource    → export locali XLSX / ODS / CSV
+#                        (sviluppo, test, benchmark, bundle esportati)
+#
+# Le due sorgenti restituiscono gli STESSI record:
+#   - read_config → lista di dict come googleSheetRead.export_data
+#   - write_config_status → colonne di stato del config (config_status.py)
+#   - fetch_gantt → righe grezze B..E come gantt_reader.fetch_gantt_values
+#                   (numeri come numeri, date come seriali Google), con
+#                   il layout del Gantt rilevato (gantt_layout.py);
+#                   con più tab (Fogli_Gantt) gantt_reader.TabbedRows
+# quindi pipeline, audit e parsing non sanno da dove arrivano i dati.
+#
+# Sorgente locale:
+#   DATA_SOURCE=local, LOCAL_DATA_DIR=<cartella>
+#   Un file per spreadsheet, con nome = ID del foglio:
+#     <ID>.xlsx   (richiede openpyxl: pip install openpyxl)
+#     <ID>.ods
+#     <ID>/<NomeTab>.csv  oppure  <ID>.csv (un solo tab)
+#   I file vengono letti in streaming: solo le colonne richieste,
+#   fino all'ultima riga popolata del range.
+#
+# ============================================================
+
+import csv
+import os
+import re
+import zipfile
+from datetime import date, datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+import googleSheetRead as gs
+from gantt_layout import (
+    DEFAULT_LAYOUT,
+    LAYOUTS,
+    SCAN_LAST_COL,
+    SCAN_ROWS,
+    GanttLayout,
+    LayoutCache,
+    col_letter,
+    find_layout,
+    is_pattern,
+    match_tabs,
+    sheet_ref,
+    tab_key,
+)
+from gantt_reader import (
+    TabbedRows,
+    check_start_value,
+    extract_spreadsheet_key,
+    fetch_gantt_detected,
+    fetch_gantt_tabs,
+    parse_gantt_rows,
+)
+
+try:
+    import openpyxl  # opzionale: solo per gli export .xlsx
+except ImportError:
+    openpyxl = None
+
+
+DATA_SOURCE = os.getenv("DATA_SOURCE", "google").strip().lower()
+LOCAL_DATA_DIR = os.getenv("LOCAL_DATA_DIR", "")
+
+# Origine dei seriali Google Sheets (come gs_serial_to_date)
+SERIAL_EPOCH = datetime(1899, 12, 30)
+
+
+# ============================================================
+# INTERFACCIA COMUNE
+# ============================================================
+
+class Source:
+    """
+    Sorgente di foglio config e Gantt.
+
+    client(): crea il client della sorgente; ogni worker ne usa uno
+    proprio (i client googleapiclient non sono thread-safe).
+    Gli altri metodi ricevono il client e, opzionalmente, il budget
+    di chiamate del tenant (quota.QuotaBudget).
+    """
+
+    # True se i file vivono su Drive (feed modifiche disponibile)
+    remote = True
+
+    def client(self):
+        raise NotImplementedError
+
+    def read_config(self, client, spreadsheet_id: str, config_range: str, quota=None) -> Optional[List[Dict[str, str]]]:
+        """
+        Righe del foglio config (formato export_data), None se illeggibile.
+        """
+        raise NotImplementedError
+
+    def write_config_status(
+        self,
+        client,
+        spreadsheet_id: str,
+        config_range: str,
+        columns: Dict[str, int],
+        rows: Dict[int, Dict[str, str]],
+        quota=None,
+    ) -> int:
+        """
+        Scrive le colonne di stato del foglio config (config_status.py).
+        columns: colonna di stato → indice nel range config
+        rows: riga foglio → {colonna di stato: valore}
+        Ritorna il numero di righe scritte.
+        """
+        raise NotImplementedError
+
+    def fetch_gantt(self, client, gantt_url: str, quota=None, worksheets: Tuple[str, ...] = ()) -> List[list]:
+        """
+        Righe grezze B..E del Gantt (formato fetch_gantt_values).
+        worksheets: tab / pattern da leggere insieme (Project.worksheets)
+        → TabbedRows, un blocco per tab.
+        """
+        raise NotImplementedError
+
+    def read_services_deadlines(self, client, gantt_url: str, quota=None, worksheets: Tuple[str, ...] = ()):
+        """
+        Servizi del Gantt: [(AREA, NomeServizio, DurataGiorni, Scadenza)].
+        """
+        return parse_gantt_rows(self.fetch_gantt(client, gantt_url, quota, worksheets))
+
+    def layout(self, gantt_url: str) -> GanttLayout:
+        """
+        Layout usato nell'ultima lettura del Gantt (per i riferimenti cella).
+        """
+        return LAYOUTS.get(extract_spreadsheet_key(gantt_url)) or DEFAULT_LAYOUT
+
+
+class GoogleSheetsSource(Source):
+    """
+    Google Sheets API (export_data / fetch_gantt_detected).
+    """
+
+    def __init__(self, service_factory: Callable[[], object]):
+        self._service_factory = service_factory
+
+    def client(self):
+        return self._service_factory()
+
+    def read_config(self, client, spreadsheet_id, config_range, quota=None):
+        data, sheet_api, _ = gs.export_data(spreadsheet_id, config_range, client, quota)
+        if data == -1 or sheet_api is None:
+            return None
+        return data
+
+    def write_config_status(self, client, spreadsheet_id, config_range, columns, rows, quota=None):
+        """
+        Una sola values.batchUpdate: per ogni riga un range per ogni
+        gruppo di colonne di stato adiacenti (di solito uno).
+        """
+        if not columns or not rows:
+            return 0
+
+        sheet, first_col, _, _, _ = parse_a1(config_range or gs.CONFIG_RANGE)
+        prefix = f"{sheet_ref(sheet)}!" if sheet else ""
+
+        # colonne adiacenti → un solo range per riga
+        runs: List[List[str]] = []
+        for header, col in sorted(columns.items(), key=lambda kv: kv[1]):
+            if runs and columns[runs[-1][-1]] == col - 1:
+                runs[-1].append(header)
+            else:
+                runs.append([header])
+
+        data = []
+        for row, values in rows.items():
+            for run in runs:
+                start = col_letter(first_col + columns[run[0]])
+                end = col_letter(first_col + columns[run[-1]])
+                data.append({
+                    "range": f"{prefix}{start}{row}:{end}{row}",
+                    "values": [[values.get(h, "") for h in run]],
+                })
+
+        if quota is not None:
+            quota.acquire()
+        client.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id or gs.CONFIG_SPREADSHEET_ID,
+            body={"valueInputOption": "RAW", "data": data},
+        ).execute()
+        return len(rows)
+
+    def fetch_gantt(self, client, gantt_url, quota=None, worksheets=()):
+        if worksheets:
+            return fetch_gantt_tabs(client, gantt_url, worksheets, quota=quota)
+        return fetch_gantt_detected(client, gantt_url, quota=quota)
+
+
+def as_source(source_or_factory) -> Source:
+    """
+    Accetta una sorgente oppure (come prima) una factory di client Sheets.
+    """
+    if isinstance(source_or_factory, Source):
+        return source_or_factory
+    return GoogleSheetsSource(source_or_factory)
+
+
+# ============================================================
+# RANGE A1
+# ============================================================
+
+def _col_index(letters: str) -> int:
+    """
+    "A" → 0, "Z" → 25, "AA" → 26
+    """
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + ord(ch) - ord("A") + 1
+    return n - 1
+
+
+def parse_a1(rng: str) -> Tuple[Optional[str], int, int, Optional[int], Optional[int]]:
+    """
+    "Foglio1!A2:Z"   → ("Foglio1", 0, 2, 25, None)
+    "GANTT!B9:E1208" → ("GANTT", 1, 9, 4, 1208)
+    Colonne 0-based, righe 1-based; None = fino alla fine.
+    """
+    sheet, _, cells = rng.strip().rpartition("!")
+    sheet = sheet.strip("'") or None
+
+    m = re.fullmatch(r"([A-Za-z]+)(\d*)(?::([A-Za-z]+)(\d*))?", cells.strip())
+    if not m:
+        raise ValueError(f"Range A1 non supportato: {rng}")
+
+    c0, r0, c1, r1 = m.groups()
+    first_col = _col_index(c0)
+    last_col = _col_index(c1) if c1 else (None if r0 == "" else first_col)
+    first_row = int(r0) if r0 else 1
+    last_row = int(r1) if r1 else (None if c1 or not r0 else first_row)
+    return sheet, first_col, first_row, last_col, last_row
+
+
+# ============================================================
+# LETTORI FILE (STREAMING)
+# ============================================================
+#
+# Ogni lettore produce (numero riga, celle) SOLO per le righe non vuote,
+# in ordine, con valori "nativi": str, int, float, bool, date/datetime.
+# Le righe vuote ripetute degli ODS (fino a 1M) non vengono mai espanse.
+#
+# ============================================================
+
+def _rows_csv(path: str) -> Iterator[Tuple[int, list]]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        # Excel/LibreOffice in italiano esportano con ";": separatore
+        # più frequente nelle prime righe
+        sample = f.read(65536)
+        f.seek(0)
+        delimiter = max(",;\t", key=sample.count)
+        for r, row in enumerate(csv.reader(f, delimiter=delimiter), start=1):
+            if any(c.strip() for c in row):
+                yield r, row
+
+
+def _rows_xlsx(path: str, sheet: Optional[str], first_row: int, last_row: Optional[int], last_col: Optional[int]):
+    if openpyxl is None:
+        raise RuntimeError("Lettura .xlsx non disponibile: installare openpyxl (pip install openpyxl)")
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[_match_sheet(wb.sheetnames, sheet, path)]
+        rows = ws.iter_rows(
+            min_row=first_row,
+            max_row=last_row,
+            max_col=None if last_col is None else last_col + 1,
+            values_only=True,
+        )
+        for r, row in enumerate(rows, start=first_row):
+            if any(v is not None and str(v).strip() != "" for v in row):
+                yield r, ["" if v is None else v for v in row]
+    finally:
+        wb.close()
+
+
+_ODS_NS = {
+    "table": "urn:oasis:names:tc:opendocument:xmlns:table:1.0",
+    "office": "urn:oasis:names:tc:opendocument:xmlns:office:1.0",
+    "text": "urn:oasis:names:tc:opendocument:xmlns:text:1.0",
+}
+
+
+def _ods_attr(elem, ns: str, name: str) -> Optional[str]:
+    return elem.get(f"{{{_ODS_NS[ns]}}}{name}")
+
+
+def _ods_cell_value(cell):
+    vtype = _ods_attr(cell, "office", "value-type")
+    if vtype in ("float", "percentage", "currency"):
+        v = float(_ods_attr(cell, "office", "value"))
+        return int(v) if v.is_integer() else v
+    if vtype == "date":
+        raw = _ods_attr(cell, "office", "date-value")
+        return datetime.fromisoformat(raw) if "T" in raw else date.fromisoformat(raw)
+    if vtype == "boolean":
+        return _ods_attr(cell, "office", "boolean-value") == "true"
+    paragraphs = cell.findall(f"{{{_ODS_NS['text']}}}p")
+    return "\n".join("".join(p.itertext()) for p in paragraphs)
+
+
+def _rows_ods(path: str, sheet: Optional[str], last_row: Optional[int], last_col: Optional[int]):
+    table_tag = f"{{{_ODS_NS['table']}}}table"
+    row_tag = f"{{{_ODS_NS['table']}}}table-row"
+    cell_tags = {f"{{{_ODS_NS['table']}}}table-cell", f"{{{_ODS_NS['table']}}}covered-table-cell"}
+
+    with zipfile.ZipFile(path) as z, z.open("content.xml") as content:
+        in_table = False
+        seen_tables: List[str] = []
+        r = 0
+
+        for event, elem in iterparse(content, events=("start", "end")):
+            if elem.tag == table_tag:
+                if event == "start":
+                    name = _ods_attr(elem, "table", "name") or ""
+                    seen_tables.append(name)
+                    in_table = sheet is None and len(seen_tables) == 1 or (
+                        sheet is not None and name.lower() == sheet.lower()
+                    )
+                    r = 0
+                elif in_table:
+                    return
+                continue
+
+            if not in_table or event != "end" or elem.tag != row_tag:
+                continue
+
+            repeat = int(_ods_attr(elem, "table", "number-rows-repeated") or 1)
+            cells: list = []
+            for cell in elem:
+                if cell.tag not in cell_tags:
+                    continue
+                times = int(_ods_attr(cell, "table", "number-columns-repeated") or 1)
+                value = _ods_cell_value(cell)
+                if last_col is not None:
+                    times = min(times, last_col + 1 - len(cells))
+                cells.extend([value] * max(times, 0))
+                if last_col is not None and len(cells) > last_col:
+                    break
+            elem.clear()
+
+            populated = any(v != "" for v in cells)
+            for _ in range(repeat if populated else 1):
+                r += 1
+                if last_row is not None and r > last_row:
+                    return
+                if populated:
+                    yield r, cells
+            if not populated:
+                r += repeat - 1
+
+    if sheet is not None and not any(sheet.lower() == t.lower() for t in seen_tables):
+        raise ValueError(f"Tab '{sheet}' non trovato in {os.path.basename(path)}")
+
+
+def _ods_table_names(path: str) -> List[str]:
+    table_tag = f"{{{_ODS_NS['table']}}}table"
+    names: List[str] = []
+    with zipfile.ZipFile(path) as z, z.open("content.xml") as content:
+        for event, elem in iterparse(content, events=("start", "end")):
+            if event == "start" and elem.tag == table_tag:
+                names.append(_ods_attr(elem, "table", "name") or "")
+            elif event == "end":
+                elem.clear()
+    return names
+
+
+def _match_sheet(names: List[str], sheet: Optional[str], path: str) -> str:
+    if sheet is None:
+        return names[0]
+    for n in names:
+        if n == sheet:
+            return n
+    for n in names:
+        if n.lower() == sheet.lower():
+            return n
+    raise ValueError(f"Tab '{sheet}' non trovato in {os.path.basename(path)}")
+
+
+# ============================================================
+# CONVERSIONE VALORI (come valueRenderOption dell'API)
+# ============================================================
+
+def _to_serial(v) -> float | int:
+    if isinstance(v, datetime):
+        delta = v - SERIAL_EPOCH
+        serial = delta.days + delta.seconds / 86400
+        return int(serial) if float(serial).is_integer() else serial
+    return (v - SERIAL_EPOCH.date()).days
+
+
+_NUMBER_RE = re.compile(r"-?\d+(\.\d+)?")
+
+
+def _unformatted(v):
+    """
+    UNFORMATTED_VALUE: numeri come numeri, date come seriali.
+    """
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, (date, datetime)):
+        return _to_serial(v)
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, str) and _NUMBER_RE.fullmatch(v.strip()):
+        s = v.strip()
+        return float(s) if "." in s else int(s)
+    return v
+
+
+def _formatted(v) -> str:
+    """
+    FORMATTED_VALUE: testo come mostrato nel foglio (formati it-IT).
+    """
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, datetime) and (v.hour, v.minute, v.second) == (0, 0, 0):
+        v = v.date()
+    if isinstance(v, datetime):
+        return v.strftime("%d/%m/%Y %H:%M:%S")
+    if isinstance(v, date):
+        return v.strftime("%d/%m/%Y")
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+# ============================================================
+# SORGENTE LOCALE
+# ============================================================
+
+class LocalFileSource(Source):
+    """
+    Export locali XLSX / ODS / CSV in una cartella (vedi intestazione).
+    Nessuna chiamata di rete: la quota non viene consumata.
+    """
+
+    remote = False
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # layout dei Gantt locali: rilevamento senza chiamate, solo in memoria
+        self._layouts = LayoutCache(filename=None)
+
+    def client(self):
+        return None
+
+    def _locate(self, key: str, sheet: Optional[str]) -> str:
+        base = os.path.join(self.directory, key)
+        for ext in (".xlsx", ".ods"):
+            if os.path.exists(base + ext):
+                return base + ext
+        if sheet and os.path.isdir(base):
+            for name in os.listdir(base):
+                stem, ext = os.path.splitext(name)
+                if ext.lower() == ".csv" and stem.lower() == sheet.lower():
+                    return os.path.join(base, name)
+        if os.path.exists(base + ".csv"):
+            return base + ".csv"
+        raise FileNotFoundError(f"Nessun export locale per il foglio {key} in {self.directory}")
+
+    def read_values(self, key: str, rng: str, formatted: bool) -> List[list]:
+        """
+        Valori del range A1 come li restituirebbe values.get:
+        righe vuote interne come [], celle finali vuote e righe
+        finali vuote omesse.
+        """
+        sheet, first_col, first_row, last_col, last_row = parse_a1(rng)
+        path = self._locate(key, sheet)
+        ext = os.path.splitext(path)[1].lower()
+
+        if ext == ".xlsx":
+            rows = _rows_xlsx(path, sheet, first_row, last_row, last_col)
+        elif ext == ".ods":
+            rows = _rows_ods(path, sheet, last_row, last_col)
+        else:
+            rows = _rows_csv(path)
+
+        convert = _formatted if formatted else _unformatted
+        out: List[list] = []
+
+        for r, cells in rows:
+            if r < first_row:
+                continue
+            if last_row is not None and r > last_row:
+                break
+
+            cells = list(cells[first_col: None if last_col is None else last_col + 1])
+            while cells and (cells[-1] is None or str(cells[-1]).strip() == ""):
+                cells.pop()
+            if not cells:
+                continue
+
+            # righe vuote intermedie
+            out.extend([] for _ in range(r - first_row - len(out)))
+            out.append([convert(v) if v not in (None, "") else "" for v in cells])
+
+        return out
+
+    def write_config_status(self, client, spreadsheet_id, config_range, columns, rows, quota=None):
+        """
+        Gli export locali non vengono modificati: lo stato va in
+        <ID config>.status.csv nella stessa cartella (riscritto ad ogni job).
+        """
+        if not columns or not rows:
+            return 0
+
+        headers = sorted(columns, key=columns.get)
+        path = os.path.join(self.directory, f"{spreadsheet_id or gs.CONFIG_SPREADSHEET_ID}.status.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Riga"] + headers)
+            for row, values in rows.items():
+                writer.writerow([row] + [values.get(h, "") for h in headers])
+        return len(rows)
+
+    def read_config(self, client, spreadsheet_id, config_range, quota=None):
+        try:
+            rng = gs.with_header_row(config_range or gs.CONFIG_RANGE)
+            key = spreadsheet_id or gs.CONFIG_SPREADSHEET_ID
+            rows = self.read_values(key, rng, formatted=True)
+            return gs.rows_to_entries(rows, parse_a1(rng)[2])
+        except Exception as e:
+            print("ERRORE lettura config locale:", e)
+            return None
+
+    def sheet_names(self, key: str) -> List[str]:
+        """
+        Titoli dei tab dell'export (CSV singolo: nessun titolo).
+        """
+        path = self._locate(key, None)
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".xlsx":
+            if openpyxl is None:
+                raise RuntimeError("Lettura .xlsx non disponibile: installare openpyxl (pip install openpyxl)")
+            wb = openpyxl.load_workbook(path, read_only=True)
+            try:
+                return list(wb.sheetnames)
+            finally:
+                wb.close()
+        if ext == ".ods":
+            return _ods_table_names(path)
+        base = os.path.join(self.directory, key)
+        if os.path.isdir(base):
+            return sorted(os.path.splitext(n)[0] for n in os.listdir(base) if n.lower().endswith(".csv"))
+        return []
+
+    def fetch_gantt(self, client, gantt_url, quota=None, worksheets=(), worksheet_title: str = "GANTT", start_row: int = 9, max_rows: int = 1200):
+        key = extract_spreadsheet_key(gantt_url)
+
+        def reader(cache_key: str, title: str):
+            fallback = GanttLayout(worksheet=title, header_row=start_row, has_header=False)
+
+            def detect() -> GanttLayout:
+                scan = f"{sheet_ref(title)}!A1:{SCAN_LAST_COL}{SCAN_ROWS}"
+                return find_layout(title, self.read_values(key, scan, formatted=True)) or fallback
+
+            def read(layout: GanttLayout) -> List[list]:
+                # Stessa verifica di read_start_date (cella data inizio)
+                cell = self.read_values(key, f"{sheet_ref(layout.worksheet)}!{layout.start_cell}", formatted=False)
+                check_start_value(cell[0][0] if cell else None)
+                return self.read_values(key, layout.data_range(max_rows), formatted=False)
+
+            return self._layouts.fetch(cache_key, read, detect, fallback)
+
+        if not worksheets:
+            return reader(key, worksheet_title)
+
+        # Più tab: nessuna batchGet da risparmiare, un tab alla volta
+        tabs = list(worksheets)
+        if any(is_pattern(w) for w in worksheets):
+            tabs = match_tabs(self.sheet_names(key), tabs)
+            if not tabs:
+                raise ValueError(f"Nessun tab del Gantt corrisponde a Fogli_Gantt: {', '.join(worksheets)}")
+
+        blocks = TabbedRows()
+        for t in tabs:
+            try:
+                rows = reader(tab_key(key, t), t)
+            except Exception as e:
+                raise ValueError(f"Tab '{t}': {e}") from e
+            layout = self._layouts.get(tab_key(key, t)) or GanttLayout(worksheet=t, header_row=start_row, has_header=False)
+            blocks.append((layout, rows))
+        return blocks
+
+    def layout(self, gantt_url: str) -> GanttLayout:
+        return self._layouts.get(extract_spreadsheet_key(gantt_url)) or DEFAULT_LAYOUT
+
+
+# ============================================================
+# SCELTA DA ENV
+# ============================================================
+
+def make_source(service_factory: Callable[[], object], kind: str = DATA_SOURCE, local_dir: str = LOCAL_DATA_DIR) -> Source:
+    """
+    DATA_SOURCE=local → LocalFileSource(LOCAL_DATA_DIR),
+    altrimenti Google Sheets con la factory data.
+    """
+    if kind == "local":
+        if not local_dir:
+            raise ValueError("DATA_SOURCE=local richiede LOCAL_DATA_DIR")
+        return LocalFileSource(local_dir)
+    return GoogleSheetsSource(service_factory)
@@ -0,0 +1,56 @@
+# storage.py
+
+# ============================================================
+# FILE DI STATO LOCALI (cartella storage/)
+# ============================================================
+#
+# Tutti i file di stato del bot (cache, log, token) vivono nella
+# cartella storage/ accanto ai sorgenti, come topic_map.json.
+# La cartella può essere spostata con env STORAGE_DIR
+# (es. un volume Docker).
+#
+# ============================================================
+
+import json
+import os
+from typing import Any
+
+
+def storage_path(filename: str) -> str:
+    """
+    Percorso assoluto di un file nella cartella storage/.
+    """
+    base = os.getenv("STORAGE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "storage")
+    return os.path.join(base, filename)
+
+
+def load_json(filename: str, default: Any) -> Any:
+    """
+    Legge un file JSON di stato.
+    File assente o corrotto → default (fail-safe, come topic_registry).
+    """
+    p = storage_path(filename)
+
+    if not os.path.exists(p):
+        return default
+
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def save_json(filename: str, data: Any) -> None:
+    """
+    Scrittura atomica: file temporaneo + os.replace().
+    """
+    p = storage_path(filename)
+    tmp = p + ".tmp"
+
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+    os.replace(tmp, p)
@@ -0,0 +1,158 @@
+# tenants.py
+
+# ============================================================
+# TENANT: UN FOGLIO CONFIG PER ORGANIZZAZIONE
+# ============================================================
+#
+# Un'unica istanza del bot può servire più gruppi, ognuno con:
+#   - il proprio foglio CONFIG
+#   - le proprie credenziali (service account + utente impersonato)
+#   - la propria chat errori
+#   - il proprio budget di chiamate Google API
+#
+# Configurazione via env TENANTS (lista JSON), ad esempio:
+#
+# TENANTS=[
+#   {"nome": "JEToP", "config_spreadsheet_id": "1AbC...",
+#    "impersonated_user": "bot@jetop.com", "error_chat_id": -1001234567890},
+#   {"nome": "Altro", "config_spreadsheet_id": "1XyZ...",
+#    "config_range": "Config!A2:Z",
+#    "service_account_env": "SERVICE_ACCOUNT_ALTRO",
+#    "impersonated_user": "bot@altro.org", "error_chat_id": -1009876543210,
+#    "reads_per_minute": 30}
+# ]
+#
+# "service_account_env" è il NOME della variabile d'ambiente che contiene
+# il JSON del service account (default SERVICE_ACCOUNT_FILE), così le
+# chiavi non finiscono dentro TENANTS.
+#
+# "data_source": "local" + "local_data_dir" leggono config e Gantt da
+# export locali invece che dall'API (default: env DATA_SOURCE /
+# LOCAL_DATA_DIR, vedi sources.py). Con sorgente locale il service
+# account non è richiesto.
+#
+# Se TENANTS non è impostata si usa un solo tenant costruito dalle
+# variabili storiche (CONFIG_SPREADSHEET_ID, IMPERSONATED_USER, ...).
+#
+# ============================================================
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import List
+
+import googleSheetRead as gs
+from error_digest import ErrorDigest
+from prefetch import PrefetchStore
+from project_config import ProjectConfigCache
+from quota import QuotaBudget
+from reminders import SentLedger
+from sources import DATA_SOURCE, LOCAL_DATA_DIR, Source, make_source
+
+
+# Budget di default: quota standard Sheets API per utente (letture/minuto)
+DEFAULT_READS_PER_MINUTE = int(os.getenv("SHEETS_READS_PER_MINUTE", "60"))
+
+
+@dataclass
+class Tenant:
+    """
+    Organizzazione servita dal bot.
+
+    config_cache, quota, errors, ledger e prefetch sono stato runtime:
+    sopravvivono tra un'esecuzione e l'altra ma non vengono mai condivisi
+    tra tenant.
+    """
+    name: str
+    config_spreadsheet_id: str
+    config_range: str
+    service_account_json: str
+    impersonated_user: str
+    error_chat_id: int
+    reads_per_minute: int = DEFAULT_READS_PER_MINUTE
+    data_source: str = DATA_SOURCE
+    local_data_dir: str = LOCAL_DATA_DIR
+    source: Source | None = field(default=None, repr=False)
+    config_cache: ProjectConfigCache = field(default_factory=ProjectConfigCache, repr=False)
+    quota: QuotaBudget | None = field(default=None, repr=False)
+    errors: ErrorDigest | None = field(default=None, repr=False)
+    ledger: SentLedger = field(default_factory=SentLedger, repr=False)
+    prefetch: PrefetchStore = field(default_factory=PrefetchStore, repr=False)
+
+    def __post_init__(self):
+        if self.quota is None:
+            self.quota = QuotaBudget(self.reads_per_minute)
+        if self.errors is None:
+            self.errors = ErrorDigest(self.name)
+        if self.source is None:
+            self.source = make_source(self.sheets_service, self.data_source, self.local_data_dir)
+
+    def sheets_service(self):
+        """
+        Client Sheets API dedicato al tenant.
+        """
+        return gs.get_sheets_service(self.service_account_json, self.impersonated_user)
+
+    def drive_service(self):
+        """
+        Client Drive API dedicato al tenant (feed modifiche).
+        """
+        return gs.get_drive_service(self.service_account_json, self.impersonated_user)
+
+
+def _tenant_from_dict(raw: dict, default_error_chat_id: int) -> Tenant:
+    name = str(raw.get("nome") or raw.get("name") or "").strip()
+    sheet_id = str(raw.get("config_spreadsheet_id") or "").strip()
+    if not name or not sheet_id:
+        raise ValueError(f"Tenant non valido (nome e config_spreadsheet_id obbligatori): {raw}")
+
+    data_source = str(raw.get("data_source") or DATA_SOURCE).strip().lower()
+
+    sa_env = str(raw.get("service_account_env") or "SERVICE_ACCOUNT_FILE")
+    sa_json = os.getenv(sa_env)
+    if not sa_json and data_source != "local":
+        raise ValueError(f"Tenant '{name}': variabile {sa_env} (service account) non impostata")
+
+    return Tenant(
+        name=name,
+        config_spreadsheet_id=sheet_id,
+        config_range=str(raw.get("config_range") or gs.CONFIG_RANGE),
+        service_account_json=sa_json or "",
+        impersonated_user=str(raw.get("impersonated_user") or gs.IMPERSONATED_USER or ""),
+        error_chat_id=int(raw.get("error_chat_id") or default_error_chat_id),
+        reads_per_minute=int(raw.get("reads_per_minute") or DEFAULT_READS_PER_MINUTE),
+        data_source=data_source,
+        local_data_dir=str(raw.get("local_data_dir") or LOCAL_DATA_DIR),
+    )
+
+
+def load_tenants(default_error_chat_id: int) -> List[Tenant]:
+    """
+    Legge i tenant da env TENANTS (JSON) oppure costruisce il tenant
+    unico dalle variabili storiche.
+    """
+    raw = os.getenv("TENANTS")
+
+    if not raw or not raw.strip():
+        return [
+            Tenant(
+                name="default",
+                config_spreadsheet_id=gs.CONFIG_SPREADSHEET_ID or "",
+                config_range=gs.CONFIG_RANGE,
+                service_account_json=gs.SERVICE_ACCOUNT_FILE or "",
+                impersonated_user=gs.IMPERSONATED_USER or "",
+                error_chat_id=default_error_chat_id,
+            )
+        ]
+
+    parsed = json.loads(raw)
+    if not isinstance(parsed, list) or not parsed:
+        raise ValueError("TENANTS deve essere una lista JSON non vuota")
+
+    tenants = [_tenant_from_dict(t, default_error_chat_id) for t in parsed]
+
+    names = [t.name for t in tenants]
+    if len(set(names)) != len(names):
+        raise ValueError(f"TENANTS: nomi duplicati {names}")
+
+    return tenants
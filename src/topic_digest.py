@@ -0,0 +1,351 @@
+# topic_digest.py
+
+# ============================================================
+# DIGEST "SCADENZE APERTE" AGGIORNATO SUL POSTO
+# ============================================================
+#
+# Modalità opzionale (env DIGEST_MODE=1) alternativa ai promemoria
+# giornalieri: ogni (chat, topic) ha UN messaggio fissato con tutte
+# le scadenze aperte, che ogni giorno viene modificato con
+# editMessageText invece di inviarne uno nuovo.
+#
+# - Il testo non contiene nulla che cambi da solo di giorno in giorno
+#   (niente frasi casuali né "tra N giorni"), quindi se le scadenze
+#   non cambiano il contenuto è identico
+# - Prima di ogni modifica si confronta l'hash del contenuto con
+#   quello salvato: se è uguale non si fa nessuna chiamata API
+# - Più progetti nello stesso topic hanno ognuno la propria sezione;
+#   ogni sezione viene salvata, così un aggiornamento parziale
+#   (watcher, comandi) non cancella le altre
+# - Un progetto letto nell'esecuzione perde le sezioni nei topic dove
+#   non ne ha più (area sparita o spostata altrove); nel job giornaliero
+#   (esecuzione completa) spariscono anche le sezioni dei progetti non
+#   più nel config. Ogni sezione ricorda il tenant che l'ha scritta, così
+#   un tenant non tocca le sezioni di un altro.
+# - Un digest oltre il limite Telegram (4096 caratteri) viene diviso in
+#   più messaggi consecutivi (fissato solo il primo); si modificano solo
+#   le parti cambiate, quelle non più necessarie vengono cancellate
+#
+# Stato salvato da topic_registry (get_digest / set_digest); le letture e
+# scritture del registro girano in thread (asyncio.to_thread) per non
+# bloccare il loop del bot.
+#
+# ============================================================
+
+import asyncio
+import hashlib
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import topic_registry as tr
+from gantt_reader import service_label
+from project_config import Project
+from reminders import Delivery
+
+
+TELEGRAM_MAX_CHARS = 4096
+
+DIGEST_HEADER = "📋 SCADENZE APERTE"
+
+# Tenant delle sezioni salvate prima che si registrasse il proprietario
+DEFAULT_OWNER = "default"
+
+
+# ============================================================
+# TESTO SEZIONI
+# ============================================================
+
+def _section_text(items: List[Tuple[str, date]]) -> str:
+    return "\n".join(
+        f" • {deadline.strftime('%d/%m/%Y')} — {name}"
+        for name, deadline in sorted(items, key=lambda x: (x[1], x[0]))
+    )
+
+
+def render_sections(project: Project, per_area, services, today: date) -> List[Delivery]:
+    """
+    Sezioni digest di un progetto: scadenze aperte (da oggi in poi).
+
+    Stesse due modalità dei promemoria:
+    - Topic_Destinazione vuoto → una sezione per area (topic dell'area)
+    - Topic_Destinazione compilato → un'unica sezione con prefisso [area]
+
+    Il testo di ogni sezione è l'elenco "data — servizio" (il nome progetto
+    viene aggiunto in pubblicazione). Le aree senza scadenze aperte producono
+    una sezione vuota, che rimuove la sezione precedente dal digest.
+    """
+    by_area: Dict[str, List[Tuple[str, date]]] = {}
+    for service in services:
+        area, _, _, deadline = service
+        by_area.setdefault(area, [])
+        if deadline >= today:
+            by_area[area].append((service_label(service), deadline))
+
+    if not project.topic_dest_raw:
+        return [
+            Delivery(project.name, project.chat_id, area, _section_text(items), row=project.row)
+            for area, items in by_area.items()
+        ]
+
+    merged = [(f"[{area}] {name}", d) for area, items in by_area.items() for name, d in items]
+    label = project.topic_dest_name if project.topic_dest_name else (project.topic_dest_raw or "Generale")
+    return [Delivery(
+        project.name,
+        project.chat_id,
+        label,
+        _section_text(merged),
+        forced_thread_id=project.forced_thread_id,
+        general=project.topic_dest_raw.strip().lower() == "generale",
+        row=project.row,
+    )]
+
+
+# ============================================================
+# RACCOLTA SEZIONI PER (CHAT, TOPIC)
+# ============================================================
+
+def resolve_thread(d: Delivery) -> Optional[int]:
+    """
+    thread_id di destinazione (None = generale), come send_to_group_or_topic.
+    """
+    if d.general:
+        return None
+    if d.forced_thread_id is not None:
+        return d.forced_thread_id
+    return tr.get_topic(d.chat_id, d.topic)
+
+
+class DigestCollector:
+    """
+    Raccoglie le sezioni prodotte dalla pipeline, raggruppate
+    per destinazione: (chat_id, thread_id) -> {progetto: testo}.
+
+    owner: tenant che scrive le sezioni.
+    projects + full=True: esecuzione su tutto il config del tenant, le
+    sezioni di progetti non elencati vengono rimosse.
+    """
+
+    def __init__(self, owner: str = DEFAULT_OWNER, projects: Iterable[str] = (), full: bool = False):
+        self.owner = owner
+        self.full = full
+        self._config = set(projects)
+        # progetti con Gantt letto in questa esecuzione
+        self._read: set = set()
+        # (chat_id, thread_id) -> progetto -> area -> testo
+        self._parts: Dict[Tuple[int, Optional[int]], Dict[str, Dict[str, str]]] = {}
+
+    def read(self, project_name: str) -> None:
+        self._read.add(project_name)
+
+    async def add(self, d: Delivery) -> None:
+        key = (d.chat_id, await asyncio.to_thread(resolve_thread, d))
+        self._parts.setdefault(key, {}).setdefault(d.project_name, {})[d.topic] = d.text
+
+    @property
+    def targets(self) -> Dict[Tuple[int, Optional[int]], Dict[str, str]]:
+        """
+        Sezioni per destinazione. Più aree dello stesso progetto nello
+        stesso topic (es. fallback General) vengono unite in ordine di area,
+        così il testo non dipende dall'ordine di arrivo dalla pipeline.
+        """
+        return {
+            key: {
+                project: "\n".join(areas[a] for a in sorted(areas) if areas[a])
+                for project, areas in projects.items()
+            }
+            for key, projects in self._parts.items()
+        }
+
+    def stale(self, key: Tuple[int, Optional[int]], state: Dict) -> List[str]:
+        """
+        Sezioni salvate in un digest da togliere: progetti di questo tenant
+        letti ora ma senza sezione in questo topic, oppure (esecuzione
+        completa) non più nel config.
+        """
+        here = self._parts.get(key, {})
+        owners = state.get("owners", {})
+        return [
+            p for p in state.get("sections", {})
+            if owners.get(p, DEFAULT_OWNER) == self.owner
+            and p not in here
+            and (p in self._read or (self.full and p not in self._config))
+        ]
+
+
+# ============================================================
+# PUBBLICAZIONE
+# ============================================================
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _section_pieces(project: str, text: str) -> List[str]:
+    """
+    Blocco "📌 progetto + scadenze"; una sezione oltre il limite di un
+    messaggio viene spezzata tra le righe ("📌 progetto (segue)").
+    """
+    block = f"📌 {project}\n{text}"
+    if len(block) <= TELEGRAM_MAX_CHARS:
+        return [block]
+
+    pieces: List[str] = []
+    current = f"📌 {project}"
+    for line in text.split("\n"):
+        line = line[: TELEGRAM_MAX_CHARS // 2]
+        if len(current) + 1 + len(line) > TELEGRAM_MAX_CHARS:
+            pieces.append(current)
+            current = f"📌 {project} (segue)"
+        current += "\n" + line
+    pieces.append(current)
+    return pieces
+
+
+def build_digest_parts(sections: Dict[str, str]) -> List[str]:
+    """
+    Testo del digest (sezioni in ordine di progetto), diviso in messaggi
+    di al più TELEGRAM_MAX_CHARS caratteri senza spezzare le righe.
+    """
+    pieces = [piece for p in sorted(sections) if sections[p] for piece in _section_pieces(p, sections[p])]
+    if not pieces:
+        return [f"{DIGEST_HEADER}\n\nNessuna scadenza aperta ✅"]
+
+    parts: List[str] = []
+    current = DIGEST_HEADER
+    for piece in pieces:
+        if len(current) + 2 + len(piece) > TELEGRAM_MAX_CHARS:
+            parts.append(current)
+            current = piece
+        else:
+            current += "\n\n" + piece
+    parts.append(current)
+    return parts
+
+
+async def publish(bot, collector: DigestCollector, on_error=None, skip=None) -> int:
+    """
+    Aggiorna i digest toccati dalla raccolta.
+
+    Per ogni destinazione:
+      - unisce le nuove sezioni a quelle salvate, togliendo quelle
+        superate (DigestCollector.stale), anche nei digest senza
+        sezioni nuove
+      - contenuto invariato (stesso hash) → nessuna chiamata API
+      - altrimenti editMessageText sulle parti cambiate,
+        oppure invio (+ pin della prima parte) se il messaggio non esiste più
+
+    on_error(chat_id, thread_id, e): chiamata se una destinazione fallisce
+    (le altre vengono comunque aggiornate).
+
+    skip(chat_id, thread_id): se vero la destinazione non viene toccata
+    (es. chat irraggiungibile, vedi unreachable.py).
+
+    Ritorna il numero di chiamate Telegram effettuate.
+    """
+    calls = 0
+    targets = collector.targets
+    for key, state in (await asyncio.to_thread(tr.all_digests)).items():
+        if key not in targets and collector.stale(key, state):
+            targets[key] = {}
+
+    for (chat_id, thread_id), new_sections in targets.items():
+        if skip is not None and skip(chat_id, thread_id):
+            continue
+        try:
+            calls += await _publish_one(bot, chat_id, thread_id, new_sections, collector)
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(chat_id, thread_id, e)
+
+    return calls
+
+
+async def _publish_one(
+    bot, chat_id: int, thread_id: Optional[int], new_sections: Dict[str, str], collector: DigestCollector
+) -> int:
+    """
+    Aggiorna un singolo digest. Ritorna le chiamate Telegram effettuate.
+    """
+    calls = 0
+    state = await asyncio.to_thread(tr.get_digest, chat_id, thread_id)
+    sections = dict(state.get("sections", {}))
+    owners = dict(state.get("owners", {}))
+    for p in collector.stale((chat_id, thread_id), state):
+        sections.pop(p, None)
+    sections.update(new_sections)
+    owners.update({p: collector.owner for p in new_sections})
+    sections = {p: t for p, t in sections.items() if t}
+    owners = {p: owners.get(p, DEFAULT_OWNER) for p in sections}
+
+    parts = build_digest_parts(sections)
+    part_hashes = [_content_hash(part) for part in parts]
+    content_hash = _content_hash("\x1e".join(parts))
+
+    # Contenuto invariato → nessuna chiamata (si salvano solo i proprietari)
+    if state.get("message_id") and state.get("hash") == content_hash:
+        if state.get("sections") != sections or state.get("owners") != owners:
+            await asyncio.to_thread(tr.set_digest, chat_id, thread_id, {**state, "sections": sections, "owners": owners})
+        return 0
+
+    # stato salvato prima della divisione in parti: un solo messaggio
+    old_ids = state.get("message_ids") or ([state["message_id"]] if state.get("message_id") else [])
+    old_hashes = state.get("part_hashes") or [state.get("hash")]
+    message_ids: List[int] = []
+    # una parte inviata di nuovo: anche le successive, per restare in ordine
+    resend = False
+
+    for i, (part, part_hash) in enumerate(zip(parts, part_hashes)):
+        message_id = old_ids[i] if i < len(old_ids) and not resend else None
+        if message_id and i < len(old_hashes) and old_hashes[i] == part_hash:
+            message_ids.append(message_id)
+            continue
+
+        edited = False
+        if message_id:
+            try:
+                await bot.edit_message_text(text=part, chat_id=chat_id, message_id=message_id)
+                calls += 1
+                edited = True
+            except Exception as e:
+                calls += 1
+                # Contenuto già uguale a quello sul messaggio: basta salvare l'hash
+                if "not modified" in str(e).lower():
+                    edited = True
+                else:
+                    print(f"⚠️ Digest {chat_id}/{thread_id}: modifica fallita ({e}), invio nuovo messaggio")
+
+        if not edited:
+            resend = True
+            sent = await bot.send_message(chat_id=chat_id, message_thread_id=thread_id, text=part)
+            calls += 1
+            message_id = sent.message_id
+            if i == 0:
+                try:
+                    await bot.pin_chat_message(chat_id=chat_id, message_id=message_id, disable_notification=True)
+                    calls += 1
+                except Exception as e:
+                    # Senza permesso di fissare messaggi il digest funziona comunque
+                    print(f"⚠️ Digest {chat_id}/{thread_id}: pin non riuscito ({e})")
+        message_ids.append(message_id)
+
+    # parti non più necessarie (digest accorciato o inviato di nuovo)
+    for old_id in old_ids:
+        if old_id in message_ids:
+            continue
+        try:
+            await bot.delete_message(chat_id=chat_id, message_id=old_id)
+            calls += 1
+        except Exception as e:
+            print(f"⚠️ Digest {chat_id}/{thread_id}: parte {old_id} non cancellata ({e})")
+
+    await asyncio.to_thread(tr.set_digest, chat_id, thread_id, {
+        "message_id": message_ids[0],
+        "message_ids": message_ids,
+        "hash": content_hash,
+        "part_hashes": part_hashes,
+        "sections": sections,
+        "owners": owners,
+    })
+
+    return calls
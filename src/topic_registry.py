@@ -11,8 +11,21 @@
 # Serve per sapere in quale topic (thread_id) inviare i messaggi
 # relativi a una determinata area (IT, Marketing, Sales, ecc.).
 #
-# I dati vengono salvati in un file JSON locale: topic_map.json
-# nella stessa directory del file.
+# I dati vengono salvati in un file JSON locale: storage/topic_map.json
+# (cartella storage/ accanto ai sorgenti, o STORAGE_DIR).
+#
+# Il bot elabora gli update in parallelo (concurrent_updates), quindi:
+#   - la mappa è tenuta in memoria e riletta dal file solo se
+#     il file è cambiato (mtime)
+#   - ogni modifica avviene sotto lock sulla mappa in memoria:
+#     set e rename concorrenti non perdono scritture
+#   - le scritture su file sono raggruppate: mentre una scrittura è
+#     in corso, le modifiche successive confluiscono nella prossima
+#     (una sola riscrittura del JSON per una raffica di modifiche);
+#     ogni funzione ritorna solo quando la sua modifica è su disco
+#   - il JSON viene serializzato fuori dal lock sulla mappa, così le
+#     modifiche che arrivano nel frattempo entrano nella scrittura successiva
+#   - lo stesso vale per topic_digests.json e topic_stale.json (_JsonFile)
 #
 # Struttura JSON:
 #
@@ -28,7 +41,17 @@
 
 import json
 import os
-from typing import Optional, Dict
+import threading
+from typing import Optional, Dict, List, Tuple
+
+from storage import storage_path
+
+
+# Lock sui file in memoria (RLock: le funzioni pubbliche si richiamano tra loro)
+_LOCK = threading.RLock()
+
+# Fine di una scrittura su file (attesa in _JsonFile.flush)
+_CHANGED = threading.Condition(_LOCK)
 
 
 # ============================================================
@@ -38,10 +61,9 @@ from typing import Optional, Dict
 def _path() -> str:
     """
     Restituisce il percorso assoluto del file topic_map.json.
-    Il file viene salvato nella stessa directory di questo script.
+    Il file viene salvato nella cartella storage/ (vedi storage.py).
     """
-    base = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(base, "storage/topic_map.json")
+    return _MAP.path()
 
 
 # ============================================================
@@ -61,18 +83,13 @@ def _norm_area(area: str) -> str:
 # LETTURA MAPPATURA DA FILE
 # ============================================================
 
-def load_map() -> Dict[str, Dict[str, int]]:
+def _read_file(p: str) -> Dict[str, Dict[str, int]]:
     """
-    Carica la mappatura da topic_map.json.
-
-    Ritorna:
-      Dict[str, Dict[str, int]]
+    Legge e normalizza topic_map.json.
 
     Se il file non esiste → ritorna dict vuoto.
     Se il file è corrotto → ritorna dict vuoto (fail-safe).
     """
-    p = _path()
-
     if not os.path.exists(p):
         return {}
 
@@ -99,32 +116,175 @@ def load_map() -> Dict[str, Dict[str, int]]:
         return {}
 
 
+def _read_any(p: str) -> Dict:
+    """
+    Legge un file JSON del registro (digest, topic eliminati).
+    File assente o corrotto → dict vuoto.
+    """
+    if not os.path.exists(p):
+        return {}
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f) or {}
+    except Exception:
+        return {}
+
+
+def _mtime(p: str) -> Optional[int]:
+    try:
+        return os.stat(p).st_mtime_ns
+    except OSError:
+        return None
+
+
 # ============================================================
-# SCRITTURA MAPPATURA (ATOMIC WRITE)
+# FILE IN MEMORIA CON SCRITTURE RAGGRUPPATE
 # ============================================================
 
-def save_map(m: Dict[str, Dict[str, int]]) -> None:
+class _JsonFile:
     """
-    Salva la mappatura su file in modo atomico.
+    File JSON del registro tenuto in memoria.
 
-    Scrittura atomica:
-      1) Scrive su file temporaneo (.tmp)
-      2) Sostituisce il file originale con os.replace()
+    current() (con _LOCK acquisito) rilegge il file solo se è cambiato
+    dall'ultima lettura/scrittura; touch() segna una modifica; flush()
+    ritorna quando le modifiche fatte finora sono su disco.
 
-    Questo evita la corruzione del JSON se il processo
-    viene interrotto durante la scrittura.
+    Scritture raggruppate: ogni modifica incrementa la versione; chi
+    chiama flush() mentre un'altra scrittura è in corso attende e poi
+    scrive, in una volta sola, tutte le modifiche accumulate nel frattempo
+    (anche quelle degli altri thread in attesa, che non scrivono più).
     """
-    p = _path()
-    tmp = p + ".tmp"
 
-    # Assicura che la directory esista
-    os.makedirs(os.path.dirname(p), exist_ok=True)
+    def __init__(self, filename: str, reader):
+        self.filename = filename
+        self._reader = reader
+        # Copia in memoria + mtime del file da cui è stata letta
+        self.cache: Optional[Dict] = None
+        self._mtime: Optional[int] = None
+        # Versione in memoria / versione su disco / scrittura in corso
+        self._version = 0
+        self._written = 0
+        self._writing = False
+
+    def path(self) -> str:
+        return storage_path(self.filename)
+
+    def current(self) -> Dict:
+        if self.cache is not None and (self._version > self._written or self._writing):
+            # La memoria è più recente del file
+            return self.cache
+
+        p = self.path()
+        mtime = _mtime(p)
+        if self.cache is None or mtime != self._mtime:
+            self.cache = self._reader(p)
+            self._mtime = mtime
+        return self.cache
+
+    def touch(self) -> None:
+        # da chiamare con _LOCK acquisito, dopo aver modificato cache
+        self._version += 1
+
+    def flush(self) -> None:
+        """
+        Porta su disco le modifiche in memoria, in modo atomico.
+
+        Scrittura atomica:
+          1) Scrive su file temporaneo (.tmp)
+          2) Sostituisce il file originale con os.replace()
+
+        Questo evita la corruzione del JSON se il processo
+        viene interrotto durante la scrittura.
+
+        Se un altro thread ha già scritto le nostre modifiche
+        (raggruppate con le sue) non c'è niente da fare.
+        """
+        with _CHANGED:
+            target = self._version
+            while self._writing and self._written < target:
+                _CHANGED.wait()
+            if self._written >= target:
+                return
+            # Copia a due livelli (chat → voci): gli stati digest vengono
+            # sostituiti, mai modificati sul posto
+            snapshot = {k: dict(v) for k, v in self.cache.items()}
+            version = self._version
+            self._writing = True
+
+        p = self.path()
+        tmp = p + ".tmp"
+        written = False
+        try:
+            # Serializzazione fuori da _LOCK: intanto le altre modifiche
+            # proseguono e confluiscono nella prossima scrittura
+            payload = json.dumps(snapshot, ensure_ascii=False, indent=2)
+
+            # Assicura che la directory esista
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(payload)
+
+            # Replace atomico
+            os.replace(tmp, p)
+            written = True
+        finally:
+            with _CHANGED:
+                if written:
+                    self._written = max(self._written, version)
+                self._writing = False
+                self._mtime = _mtime(p)
+                _CHANGED.notify_all()
+
+
+_MAP = _JsonFile("topic_map.json", _read_file)
+_DIGESTS = _JsonFile("topic_digests.json", _read_any)
+_STALE = _JsonFile("topic_stale.json", _read_any)
+
+
+def _current() -> Dict[str, Dict[str, int]]:
+    """
+    Mappa in memoria (da chiamare con _LOCK acquisito).
+    Rilegge il file solo se è cambiato dall'ultima lettura/scrittura.
+    """
+    return _MAP.current()
+
+
+def load_map() -> Dict[str, Dict[str, int]]:
+    """
+    Carica la mappatura da topic_map.json.
+
+    Ritorna:
+      Dict[str, Dict[str, int]] (copia: modificarla non altera la cache)
+
+    Se il file non esiste → ritorna dict vuoto.
+    Se il file è corrotto → ritorna dict vuoto (fail-safe).
+    """
+    with _LOCK:
+        return {chat: dict(areas) for chat, areas in _current().items()}
 
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(m, f, ensure_ascii=False, indent=2)
 
-    # Replace atomico
-    os.replace(tmp, p)
+# ============================================================
+# SCRITTURA MAPPATURA (ATOMIC WRITE)
+# ============================================================
+
+def _flush() -> None:
+    _MAP.flush()
+
+
+def _mark_dirty() -> None:
+    _MAP.touch()
+
+
+def save_map(m: Dict[str, Dict[str, int]]) -> None:
+    """
+    Sostituisce la mappatura e la salva su file (scrittura atomica).
+    """
+    with _LOCK:
+        _MAP.cache = {str(chat): {str(k): int(v) for k, v in areas.items()} for chat, areas in m.items()}
+        _mark_dirty()
+
+    _flush()
 
 
 # ============================================================
@@ -138,8 +298,6 @@ def set_topic(chat_id: int, area: str, thread_id: int) -> None:
     Se l'area esiste già → viene aggiornata.
     Se non esiste → viene creata.
     """
-    m = load_map()
-
     chat_key = str(chat_id)
     area_key = _norm_area(area)
 
@@ -147,10 +305,18 @@ def set_topic(chat_id: int, area: str, thread_id: int) -> None:
     if not area_key:
         return
 
-    m.setdefault(chat_key, {})
-    m[chat_key][area_key] = int(thread_id)
+    with _LOCK:
+        m = _current()
+
+        # Nessuna modifica → nessuna scrittura
+        if m.get(chat_key, {}).get(area_key) == int(thread_id):
+            return
 
-    save_map(m)
+        m.setdefault(chat_key, {})
+        m[chat_key][area_key] = int(thread_id)
+        _mark_dirty()
+
+    _flush()
 
 
 # ============================================================
@@ -164,15 +330,14 @@ def get_topic(chat_id: int, area: str) -> Optional[int]:
 
     Se non esiste → ritorna None.
     """
-    m = load_map()
-
     chat_key = str(chat_id)
     area_key = _norm_area(area)
 
     if not area_key:
         return None
 
-    return m.get(chat_key, {}).get(area_key)
+    with _LOCK:
+        return _current().get(chat_key, {}).get(area_key)
 
 
 # ============================================================
@@ -193,36 +358,133 @@ def rename_area_by_thread(chat_id: int, thread_id: int, new_area: str) -> bool:
       True  → aggiornamento effettuato
       False → nessuna area trovata o input non valido
     """
-    m = load_map()
-
     chat_key = str(chat_id)
     new_area_key = _norm_area(new_area)
 
     if not new_area_key:
         return False
 
-    if chat_key not in m:
-        return False
+    with _LOCK:
+        m = _current()
 
-    # Trova la vecchia area associata a questo thread_id
-    old_area = None
+        if chat_key not in m:
+            return False
 
-    for area, tid in m[chat_key].items():
-        if int(tid) == int(thread_id):
-            old_area = area
-            break
+        # Trova la vecchia area associata a questo thread_id
+        old_area = None
 
-    if old_area is None:
-        return False
+        for area, tid in m[chat_key].items():
+            if int(tid) == int(thread_id):
+                old_area = area
+                break
+
+        if old_area is None:
+            return False
+
+        # Se il nome non è cambiato, non serve fare nulla
+        if old_area == new_area_key:
+            return True
+
+        # Aggiornamento chiave
+        m[chat_key].pop(old_area, None)
+        m[chat_key][new_area_key] = int(thread_id)
+        _mark_dirty()
+
+    _flush()
+
+    return True
+
+
+# ============================================================
+# TOPIC ELIMINATO (THREAD NON PIÙ ESISTENTE)
+# ============================================================
+
+def mark_stale(chat_id: int, thread_id: int) -> List[str]:
+    """
+    Il topic thread_id non esiste più (Telegram: message thread not found).
+
+    Le aree associate vengono tolte dalla mappa (i messaggi vanno nel
+    generale finché il topic non viene registrato di nuovo) e annotate
+    in topic_stale.json: { "<chat_id>": { "<area>": <thread_id> } }.
+
+    Ritorna le aree rimosse.
+    """
+    chat_key = str(chat_id)
+
+    with _LOCK:
+        m = _current()
+        areas = [a for a, tid in m.get(chat_key, {}).items() if int(tid) == int(thread_id)]
+        if not areas:
+            return []
+
+        for area in areas:
+            m[chat_key].pop(area, None)
+        _mark_dirty()
+
+        stale = _STALE.current()
+        stale[chat_key] = {**stale.get(chat_key, {}), **{area: int(thread_id) for area in areas}}
+        _STALE.touch()
 
-    # Se il nome non è cambiato, non serve fare nulla
-    if old_area == new_area_key:
-        return True
+    _flush()
+    _STALE.flush()
 
-    # Aggiornamento chiave
-    m[chat_key].pop(old_area, None)
-    m[chat_key][new_area_key] = int(thread_id)
+    return areas
 
-    save_map(m)
 
-    return True
\ No newline at end of file
+# ============================================================
+# MESSAGGIO RIEPILOGO (DIGEST) PER TOPIC
+# ============================================================
+#
+# In modalità digest ogni (chat, topic) ha un solo messaggio fissato
+# con le scadenze aperte, aggiornato con editMessageText.
+# Accanto a topic_map.json, in topic_digests.json, si salva:
+#
+# {
+#   "<chat_id>": {
+#       "<thread_id>" | "general": {
+#           "message_id": 123,
+#           "hash": "<hash contenuto inviato>",
+#           "sections": {"<progetto>": "<testo sezione>"},
+#           "owners": {"<progetto>": "<tenant>"}
+#       }
+#   }
+# }
+#
+# ============================================================
+
+def _digest_thread_key(thread_id: Optional[int]) -> str:
+    return "general" if thread_id is None else str(int(thread_id))
+
+
+def get_digest(chat_id: int, thread_id: Optional[int]) -> Dict:
+    """
+    Stato del digest di (chat_id, thread_id): dict vuoto se non esiste.
+    """
+    with _LOCK:
+        return dict(_DIGESTS.current().get(str(chat_id), {}).get(_digest_thread_key(thread_id), {}))
+
+
+def set_digest(chat_id: int, thread_id: Optional[int], state: Dict) -> None:
+    """
+    Salva lo stato del digest di (chat_id, thread_id).
+    """
+    chat_key = str(chat_id)
+    with _LOCK:
+        data = _DIGESTS.current()
+        data[chat_key] = {**data.get(chat_key, {}), _digest_thread_key(thread_id): dict(state)}
+        _DIGESTS.touch()
+
+    _DIGESTS.flush()
+
+
+def all_digests() -> Dict[Tuple[int, Optional[int]], Dict]:
+    """
+    Tutti i digest salvati: (chat_id, thread_id) -> stato.
+    """
+    with _LOCK:
+        data = _DIGESTS.current()
+        return {
+            (int(chat_id), None if thread_key == "general" else int(thread_key)): dict(state)
+            for chat_id, threads in data.items()
+            for thread_key, state in threads.items()
+        }
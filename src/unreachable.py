@@ -0,0 +1,210 @@
+# unreachable.py
+
+# ============================================================
+# DESTINAZIONI IRRAGGIUNGIBILI (CACHE NEGATIVA / CIRCUIT BREAKER)
+# ============================================================
+#
+# Se il bot è stato rimosso da un gruppo o un topic è stato eliminato,
+# ogni invio verso quella destinazione fallisce, tutti i giorni:
+# chiamate sprecate e lo stesso errore ripetuto su ERROR_CHAT_ID.
+#
+# Gli errori Telegram vengono classificati:
+#   - "forbidden"        → bot rimosso / bloccato (Forbidden)
+#   - "chat_not_found"   → chat inesistente (BadRequest: chat not found)
+#   - "thread_not_found" → topic eliminato (BadRequest: message thread not found)
+#
+# Ogni destinazione fallita (chat, oppure chat + topic) viene salvata
+# con una scadenza: fino ad allora gli invii vengono saltati senza
+# chiamate. Alla scadenza si riprova una volta:
+#   - invio riuscito → destinazione rimossa dalla cache
+#   - nuovo fallimento → scadenza raddoppiata (fino a UNREACHABLE_MAX_HOURS)
+#
+# Solo il primo fallimento viene segnalato su ERROR_CHAT_ID.
+# Gli amministratori possono vedere e azzerare la cache con /unreachable.
+#
+# File: storage/unreachable.json
+# record() / clear() aggiornano solo la cache in memoria (sono chiamate
+# dal loop del bot, ad ogni invio); il file viene scritto da flush(), in
+# thread, a fine esecuzione. Se il processo cade prima del flush si perde
+# al più un blocco: la destinazione verrà riprovata e segnalata di nuovo.
+#
+# {
+#   "<chat_id>" | "<chat_id>/<thread_id>": {
+#       "reason": "forbidden",
+#       "failures": 2,
+#       "since": "2026-10-19T15:00:03",
+#       "until": 1792505403.0
+#   }
+# }
+#
+# Env:
+#   UNREACHABLE_TTL_HOURS → durata del primo blocco (default 24)
+#   UNREACHABLE_MAX_HOURS → durata massima del blocco (default 168 = 7 giorni)
+#
+# ============================================================
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden
+
+from storage import load_json, save_json
+
+
+UNREACHABLE_TTL_HOURS = float(os.getenv("UNREACHABLE_TTL_HOURS", "24"))
+UNREACHABLE_MAX_HOURS = float(os.getenv("UNREACHABLE_MAX_HOURS", "168"))
+
+FILENAME = "unreachable.json"
+
+FORBIDDEN = "forbidden"
+CHAT_NOT_FOUND = "chat_not_found"
+THREAD_NOT_FOUND = "thread_not_found"
+
+_LOCK = threading.Lock()
+_cache: Optional[Dict[str, Dict]] = None
+_dirty = False
+
+
+# ============================================================
+# CLASSIFICAZIONE ERRORI
+# ============================================================
+
+def classify(e: Exception) -> Optional[str]:
+    """
+    Tipo di errore "destinazione irraggiungibile", None per gli altri
+    errori (rete, rate limit, testo non valido...) che non vanno in cache.
+    """
+    if isinstance(e, Forbidden):
+        return FORBIDDEN
+    if isinstance(e, BadRequest):
+        text = str(e).lower()
+        if "thread not found" in text or "topic_deleted" in text:
+            return THREAD_NOT_FOUND
+        if "chat not found" in text:
+            return CHAT_NOT_FOUND
+    return None
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+def _key(chat_id: int, thread_id: Optional[int] = None) -> str:
+    return str(int(chat_id)) if thread_id is None else f"{int(chat_id)}/{int(thread_id)}"
+
+
+def _current() -> Dict[str, Dict]:
+    """
+    Cache in memoria (da chiamare con _LOCK acquisito), letta dal file
+    al primo uso. Il bot è l'unico a scrivere il file.
+    """
+    global _cache
+    if _cache is None:
+        _cache = load_json(FILENAME, {})
+    return _cache
+
+
+def _mark_dirty() -> None:
+    # da chiamare con _LOCK acquisito
+    global _dirty
+    _dirty = True
+
+
+def blocked(chat_id: int, thread_id: Optional[int] = None, now: Optional[float] = None) -> Optional[Dict]:
+    """
+    Voce della cache se la destinazione è bloccata adesso, altrimenti None.
+    Con thread_id controlla solo il topic (la chat va controllata a parte).
+    """
+    now = time.time() if now is None else now
+    with _LOCK:
+        entry = _current().get(_key(chat_id, thread_id))
+        if entry and entry.get("until", 0) > now:
+            return dict(entry)
+    return None
+
+
+def record(chat_id: int, thread_id: Optional[int], reason: str, now: Optional[float] = None) -> bool:
+    """
+    Registra un fallimento. Ritorna True se è il primo per la
+    destinazione (da segnalare), False se era già in cache.
+    """
+    now = time.time() if now is None else now
+    key = _key(chat_id, thread_id)
+
+    with _LOCK:
+        data = _current()
+        entry = data.get(key)
+        first = entry is None
+        if entry and entry.get("until", 0) > now:
+            # Invii partiti prima del blocco: stesso fallimento, non uno nuovo
+            return False
+        failures = 1 if first else int(entry.get("failures", 0)) + 1
+        hours = min(UNREACHABLE_TTL_HOURS * 2 ** (failures - 1), UNREACHABLE_MAX_HOURS)
+
+        data[key] = {
+            "reason": reason,
+            "failures": failures,
+            "since": (entry or {}).get("since") or datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+            "until": now + hours * 3600,
+        }
+        _mark_dirty()
+
+    print(f"🚫 Destinazione {key} irraggiungibile ({reason}), invii sospesi per {hours:g} ore")
+    return first
+
+
+def clear(chat_id: int, thread_id: Optional[int] = None) -> None:
+    """
+    Invio riuscito: la destinazione esce dalla cache (se c'era).
+    """
+    key = _key(chat_id, thread_id)
+    with _LOCK:
+        data = _current()
+        if data.pop(key, None) is not None:
+            _mark_dirty()
+            print(f"✅ Destinazione {key} di nuovo raggiungibile")
+
+
+def flush() -> None:
+    """
+    Salva la cache su file se record/clear l'hanno modificata.
+    Blocca il thread: dal bot va chiamata con asyncio.to_thread.
+    """
+    global _dirty
+    with _LOCK:
+        if not _dirty:
+            return
+        save_json(FILENAME, _current())
+        _dirty = False
+
+
+def reset(chat_id: Optional[int] = None) -> int:
+    """
+    Azzera la cache (tutta, o solo la chat indicata e i suoi topic).
+    Ritorna il numero di voci rimosse.
+    """
+    global _dirty
+    with _LOCK:
+        data = _current()
+        if chat_id is None:
+            removed = list(data)
+        else:
+            prefix = str(int(chat_id))
+            removed = [k for k in data if k == prefix or k.startswith(prefix + "/")]
+        for k in removed:
+            data.pop(k)
+        if removed or _dirty:
+            save_json(FILENAME, data)
+            _dirty = False
+    return len(removed)
+
+
+def entries() -> List[Tuple[str, Dict]]:
+    """
+    Voci in cache (anche scadute, in attesa del prossimo tentativo).
+    """
+    with _LOCK:
+        return sorted((k, dict(v)) for k, v in _current().items())
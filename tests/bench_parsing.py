@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from gantt_reader import (
+    extract_spreadsheet_key,
+    gs_serial_to_date,
+    parse_deadline_value,
+    parse_duration_days,
+    parse_gantt_rows,
+)
+from project_config import parse_custom_days
+from reminders import build_message, thresholds_for_service
+
+
+# ------------------------------------------------------------
+# Micro-benchmark degli helper di parsing (per riga / per messaggio)
+# ------------------------------------------------------------
+#
+# Ogni caso gira su input realistici e misti (seriali, dd/mm, dd/mm/yy,
+# valori sporchi, messaggi lunghi) generati con seed fisso.
+#
+# I tempi (ns per chiamata) vengono confrontati con i valori salvati in
+# bench_parsing_baselines.json. Per stare fuori dal rumore tra esecuzioni
+# (±20-30% su una singola misura):
+#   - ogni caso è il MIGLIORE di ROUNDS giri (ognuno minimo di REPEAT
+#     ripetizioni): il minimo varia molto meno della mediana
+#   - un caso oltre la soglia (default 35%) viene rimisurato; solo se è
+#     ancora oltre è una regressione → exit code 1
+#   - rallentamenti entro NOISE_BAND (30%) vengono solo segnalati
+#
+# Il confronto usa tempi relativi a un ciclo Python di riferimento
+# ("calibrazione", la migliore dell'esecuzione), così baseline salvate
+# su una macchina restano confrontabili su un'altra; i ns sono mostrati
+# solo come riferimento.
+#
+#   python bench_parsing.py                  → confronto con le baseline
+#   python bench_parsing.py --save           → aggiorna le baseline
+#   python bench_parsing.py --threshold 0.10 --noise 0.10
+#                                            → soglia 10% (macchina poco rumorosa)
+#
+# ------------------------------------------------------------
+
+ROUNDS = 7
+REPEAT = 7
+NOISE_BAND = 0.30
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_parsing_baselines.json")
+
+TODAY = date(2026, 10, 19)
+SERIAL_TODAY = (TODAY - date(1899, 12, 30)).days
+KEY = "1AbCdEfGhIjKlMnOpQrStUvWxYz0123456789_-ab"
+
+rng = random.Random(2026)
+
+
+def _deadline_inputs(n=1000):
+    out = []
+    for _ in range(n):
+        kind = rng.random()
+        d = TODAY + timedelta(days=rng.randint(-30, 120))
+        if kind < 0.45:
+            out.append(SERIAL_TODAY + rng.randint(-30, 120))            # seriale (UNFORMATTED)
+        elif kind < 0.55:
+            out.append(f"{SERIAL_TODAY + rng.randint(-30, 120)}.0")     # seriale come testo
+        elif kind < 0.70:
+            out.append(d.strftime("%d/%m"))                             # senza anno
+        elif kind < 0.80:
+            out.append(d.strftime("%d/%m/%y"))
+        elif kind < 0.92:
+            out.append(d.strftime("%d/%m/%Y"))
+        else:
+            out.append(rng.choice(["boh", "TBD", "", "32/13", "-", "fine mese", None]))
+    return out
+
+
+def _duration_inputs(n=1000):
+    pool = [3, 3.0, "3", "10", " 7 ", 1.5, "x", "", None, "2,5"]
+    return [rng.choice(pool) for _ in range(n)]
+
+
+def _key_inputs(n=300):
+    pool = [
+        KEY,
+        f"https://docs.google.com/spreadsheets/d/{KEY}/edit#gid=0",
+        f"https://docs.google.com/spreadsheets/d/{KEY}/edit?usp=sharing",
+        f"https://drive.google.com/open?id={KEY}",
+        f"https://example.org/d/{KEY}",
+        "link non valido",
+    ]
+    return [rng.choice(pool) for _ in range(n)]
+
+
+def _custom_days_inputs(n=500):
+    pool = ["", "7,5,4", " 10, x, 3 ", "14", ",".join(str(i) for i in range(1, 31)), None]
+    return [rng.choice(pool) for _ in range(n)]
+
+
+def _threshold_inputs(n=1000):
+    pool = [set(), {7, 5, 4}, {14}, set(range(1, 31))]
+    return [(rng.randint(1, 60), rng.choice(pool)) for _ in range(n)]
+
+
+def _grouped(n_services):
+    grouped = {}
+    for i in range(n_services):
+        days_left = rng.choice([-1, 0, 1, 2, 5, 7])
+        area = rng.choice(["IT", "M&C", "Sales", "HR"])
+        grouped.setdefault(days_left, []).append(
+            (f"Servizio {i} " + "x" * rng.randint(5, 60), TODAY + timedelta(days=days_left), area)
+        )
+    return grouped
+
+
+def _gantt_rows(n=1200):
+    rows = [["Nome area", "", "Durata", "Scadenza"]]
+    for i in range(n):
+        if i % 40 == 0:
+            rows.append([f"Area {i // 40}"])
+        elif i % 97 == 0:
+            rows.append([])
+        else:
+            rows.append([f"Servizio {i}", "", rng.randint(1, 30), rng.choice(_DEADLINES)])
+    return rows
+
+
+_DEADLINES = _deadline_inputs(200)
+
+
+def _swallow(fn):
+    def call(*args):
+        try:
+            fn(*args)
+        except Exception:
+            # i valori sporchi fanno parte del carico reale
+            pass
+    return call
+
+
+# nome caso -> (funzione da chiamare per ogni input, input)
+CASES = {
+    "parse_deadline_value": (_swallow(lambda v: parse_deadline_value(v, TODAY)), _deadline_inputs()),
+    "parse_duration_days": (_swallow(parse_duration_days), _duration_inputs()),
+    "gs_serial_to_date": (gs_serial_to_date, [SERIAL_TODAY + rng.randint(-30, 120) + rng.random() for _ in range(1000)]),
+    "extract_spreadsheet_key": (_swallow(extract_spreadsheet_key), _key_inputs()),
+    "parse_custom_days": (parse_custom_days, _custom_days_inputs()),
+    "thresholds_for_service": (lambda a: thresholds_for_service(*a), _threshold_inputs()),
+    "build_message (5 servizi)": (lambda g: build_message("Progetto", "IT", g), [_grouped(5) for _ in range(50)]),
+    "build_message (200 servizi)": (lambda g: build_message("Progetto", "IT", g), [_grouped(200) for _ in range(5)]),
+    "parse_gantt_rows (1200 righe)": (
+        lambda rows: parse_gantt_rows([list(r) for r in rows], TODAY),
+        [_gantt_rows()],
+    ),
+}
+
+
+# ------------------------------------------------------------
+# Misura
+# ------------------------------------------------------------
+
+def _calibration() -> float:
+    """
+    ns per iterazione di un ciclo Python di riferimento.
+    """
+    def loop():
+        total = 0
+        for i in range(1000):
+            total += i % 7
+        return total
+
+    return _ns_per_call(loop, [None], arg=False) / 1000
+
+
+def _ns_per_call(fn, inputs, arg=True, repeat=REPEAT, target_seconds=0.05) -> float:
+    if arg:
+        def run():
+            for x in inputs:
+                fn(x)
+    else:
+        def run():
+            fn()
+
+    # numero di ripetizioni tale che ogni misura duri ~target_seconds
+    number = 1
+    while True:
+        t = timeit.timeit(run, number=number)
+        if t >= target_seconds / 5 or number >= 1_000_000:
+            break
+        number *= 4
+    number = max(1, int(number * target_seconds / max(t, 1e-9)))
+
+    best = min(timeit.repeat(run, number=number, repeat=repeat))
+    return best / (number * len(inputs)) * 1e9
+
+
+def measure(rounds: int = ROUNDS, names=None) -> dict:
+    """
+    {caso: {"ns": ns per chiamata, "rel": ns / calibrazione}}
+
+    La calibrazione viene misurata prima di ogni caso, in tutti i giri:
+    si usa la migliore dell'intera esecuzione (una singola calibrazione
+    varia quanto i casi, e il rapporto tra due misure rumorose raddoppia
+    il rumore). Di `rounds` giri di ogni caso si tiene il migliore.
+    names: solo questi casi (default tutti).
+    """
+    names = list(names or CASES)
+    samples = {name: [] for name in names}
+    calibrations = []
+    for _ in range(rounds):
+        for name in names:
+            fn, inputs = CASES[name]
+            calibrations.append(_calibration())
+            samples[name].append(_ns_per_call(fn, inputs))
+
+    calib = min(calibrations)
+    return {name: {"ns": min(runs), "rel": min(runs) / calib} for name, runs in samples.items()}
+
+
+def compare(results: dict, baselines: dict, threshold: float, noise: float = NOISE_BAND) -> tuple:
+    """
+    Confronta i tempi relativi con le baseline.
+    Ritorna le righe del report e la lista dei casi oltre la soglia
+    (rallentamenti entro `noise` solo segnalati, mai regressioni).
+    """
+    lines, regressions = [], []
+
+    for name in CASES:
+        now = results[name]
+        base = baselines.get(name)
+        if base is None:
+            lines.append(f"{name:32s} {now['ns']:12,.0f} ns   (nessuna baseline)")
+            continue
+        delta = now["rel"] / base["rel"] - 1
+        flag = ""
+        if delta > threshold:
+            flag = "  ❌ REGRESSIONE"
+            regressions.append(name)
+        elif delta > noise:
+            flag = "  ⚠️ più lento (oltre il rumore, sotto la soglia)"
+        elif delta < -threshold:
+            flag = "  ✅ più veloce"
+        lines.append(f"{name:32s} {now['ns']:12,.0f} ns   baseline {base['ns']:12,.0f} ns   {delta:+7.1%}{flag}")
+
+    return lines, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark parsing Gantt / messaggi")
+    parser.add_argument("--save", action="store_true", help="salva i risultati come nuove baseline")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_THRESHOLD", "0.35")),
+                        help="rallentamento ammesso rispetto alla baseline (default 0.35 = 35%%)")
+    parser.add_argument("--noise", type=float, default=NOISE_BAND,
+                        help="rumore tra esecuzioni: sotto questa soglia solo segnalazione (default 0.30)")
+    args = parser.parse_args()
+
+    # build_message sceglie frasi casuali: seed fisso per misure ripetibili
+    random.seed(0)
+    results = measure()
+
+    if args.save:
+        with open(BASELINES_FILE, "w", encoding="utf-8") as f:
+            json.dump(
+                {k: {"ns": round(v["ns"], 1), "rel": round(v["rel"], 3)} for k, v in results.items()},
+                f, ensure_ascii=False, indent=2,
+            )
+        print(f"Baseline salvate in {BASELINES_FILE}")
+        for name in CASES:
+            print(f"{name:32s} {results[name]['ns']:12,.0f} ns")
+        sys.exit(0)
+
+    baselines = {}
+    if os.path.exists(BASELINES_FILE):
+        with open(BASELINES_FILE, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    # la soglia non scende mai sotto il rumore
+    threshold = max(args.threshold, args.noise)
+    lines, regressions = compare(results, baselines, threshold, args.noise)
+    if regressions:
+        # conferma: i casi oltre la soglia vengono rimisurati, vale il migliore
+        again = measure(names=regressions)
+        for name in regressions:
+            results[name] = min(results[name], again[name], key=lambda r: r["rel"])
+        lines, regressions = compare(results, baselines, threshold, args.noise)
+    print("\n".join(lines))
+
+    if regressions:
+        print(f"\n{len(regressions)} regressioni oltre il {threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNessuna regressione oltre il {threshold:.0%}.")
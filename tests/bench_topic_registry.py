@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+os.environ.setdefault("ERROR_CHAT_ID", "0")
+os.environ.setdefault("DRIVE_WATCH_MINUTES", "0")
+
+import main
+import topic_registry as tr
+
+
+# ------------------------------------------------------------
+# Burst sintetico di eventi forum (creazione + rinomina topic)
+# ------------------------------------------------------------
+
+CHATS = 20
+TOPICS_PER_CHAT = 50
+
+
+def _update(chat_id, thread_id, created=None, edited=None):
+    msg = SimpleNamespace(
+        message_thread_id=thread_id,
+        forum_topic_created=SimpleNamespace(name=created) if created else None,
+        forum_topic_edited=SimpleNamespace(name=edited) if edited else None,
+    )
+    return SimpleNamespace(effective_message=msg, effective_chat=SimpleNamespace(id=chat_id))
+
+
+def synthetic_burst():
+    created, renamed = [], []
+    for c in range(CHATS):
+        chat_id = -1000000000000 - c
+        for t in range(TOPICS_PER_CHAT):
+            created.append(_update(chat_id, t + 2, created=f"Area {t}"))
+            renamed.append(_update(chat_id, t + 2, edited=f"Area {t} (rinominata)"))
+    return created, renamed
+
+
+async def replay(updates, concurrent: bool) -> float:
+    started = time.perf_counter()
+    if concurrent:
+        await asyncio.gather(*(main.on_forum_events(u, None) for u in updates))
+    else:
+        for u in updates:
+            await main.on_forum_events(u, None)
+    return time.perf_counter() - started
+
+
+def check_no_lost_writes(suffix: str):
+    m = tr.load_map()
+    assert len(m) == CHATS, len(m)
+    for areas in m.values():
+        assert len(areas) == TOPICS_PER_CHAT, len(areas)
+        assert all(name.endswith(suffix) for name in areas), areas
+
+
+async def bench() -> dict:
+    """
+    update/s per modalità: {"sequenziale": ..., "concorrente": ...}
+    """
+    created, renamed = synthetic_burst()
+    total = len(created) + len(renamed)
+    rates = {}
+
+    for concurrent in (False, True):
+        if os.path.exists(tr._path()):
+            os.remove(tr._path())
+
+        t_create = await replay(created, concurrent)
+        check_no_lost_writes("")
+        t_rename = await replay(renamed, concurrent)
+        check_no_lost_writes("(rinominata)")
+
+        label = "concorrente" if concurrent else "sequenziale"
+        rates[label] = total / (t_create + t_rename)
+
+    return rates
+
+
+if __name__ == "__main__":
+    # Le print di on_forum_events coprirebbero il risultato
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        rates = asyncio.run(bench())
+    finally:
+        out = sys.stdout
+        sys.stdout = real_stdout
+        out.close()
+    for label, rate in rates.items():
+        print(f"{label:12s}: {rate:,.0f} update/s")
+    print("Nessuna scrittura persa.")
+
+    # Scritture raggruppate: gli update concorrenti non devono andare
+    # più lenti di quelli in sequenza
+    assert rates["concorrente"] >= rates["sequenziale"], rates
+    print("Concorrente non più lento del sequenziale.")
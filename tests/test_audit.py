@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+os.environ.setdefault("ERROR_CHAT_ID", "-999")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import audit
+import main
+from gantt_reader import extract_spreadsheet_key
+from project_config import compile_entry
+from sources import Source
+from tenants import Tenant
+
+
+TODAY = date(2026, 10, 19)
+
+
+def serial(d: date) -> int:
+    return (d - date(1899, 12, 30)).days
+
+
+def key(i: int) -> str:
+    return chr(ord("a") + i) * 30
+
+
+# ------------------------------------------------------------
+# Sorgente finta: config fissa, ogni Gantt con una riga valida e
+# una con la scadenza illeggibile
+# ------------------------------------------------------------
+class FakeSource(Source):
+    def __init__(self, config=()):
+        self.config = list(config)
+        self.fetched = []
+
+    def client(self):
+        return None
+
+    def read_config(self, client, spreadsheet_id, config_range, quota=None):
+        return list(self.config)
+
+    def fetch_gantt(self, client, gantt_url, quota=None, worksheets=()):
+        self.fetched.append(extract_spreadsheet_key(gantt_url))
+        return [
+            ["IT"],
+            ["Servizio", "", 10, serial(TODAY + timedelta(days=5))],
+            ["Collaudo", "", 3, "boh"],
+        ]
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_shared_gantt_read_once():
+    projects = [
+        compile_entry({"Nome": "P0", "ChatId": "-1", "Gantt": key(0)}, 2),
+        compile_entry({"Nome": "P1", "ChatId": "-2", "Gantt": key(0)}, 3),
+        compile_entry({"Nome": "P2", "ChatId": "-3", "Gantt": key(1)}, 4),
+    ]
+    source = FakeSource()
+
+    audits = asyncio.run(audit.audit_projects(projects, source, today=TODAY))
+    assert sorted(source.fetched) == [key(0), key(1)]
+
+    # stesso Gantt: stesso risultato per entrambi i progetti
+    assert [a.project.name for a in audits] == ["P0", "P1", "P2"]
+    assert all(a.services == 1 and len(a.dropped) == 1 and a.error is None for a in audits)
+    assert audits[0].dropped == audits[1].dropped and audits[0].dropped is not audits[1].dropped
+    assert audits[0].dropped[0][0] == "GANTT!E11"
+
+
+def test_audit_does_not_touch_config_cache():
+    old = [{"Nome": "Vecchio", "ChatId": "-1", "Gantt": key(0), "_row": "2"}]
+    new = [
+        {"Nome": "Nuovo", "ChatId": "-2", "Gantt": key(1), "_row": "2"},
+        {"Nome": "Rotto", "ChatId": "abc", "Gantt": key(2), "_row": "3"},
+    ]
+    tenant = Tenant(
+        name="T", config_spreadsheet_id="cfg", config_range="A:Z",
+        service_account_json="", impersonated_user="", error_chat_id=-1,
+        source=FakeSource(new),
+    )
+    tenant.config_cache.refresh(old)
+
+    report = "\n".join(asyncio.run(main.audit_tenant(tenant)))
+    # audit fatto sulle righe appena lette...
+    assert tenant.source.fetched == [key(1)]
+    assert "1 Gantt" in report and "riga 3" in report
+    # ...ma il job continua con i progetti della sua ultima lettura
+    assert [p.name for p in tenant.config_cache.projects] == ["Vecchio"]
+
+
+if __name__ == "__main__":
+    test_shared_gantt_read_once()
+    test_audit_does_not_touch_config_cache()
+    print("Audit: OK")
@@ -0,0 +1,163 @@
+import csv
+import os
+import sys
+import tempfile
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from config_status import RunStatus
+from googleSheetRead import rows_to_entries
+from project_config import ProjectConfigCache
+from sources import GoogleSheetsSource, LocalFileSource
+
+
+# ------------------------------------------------------------
+# Foglio config con colonne di stato (non adiacenti)
+# ------------------------------------------------------------
+
+GANTT_ID = "g" * 30
+TODAY = date(2026, 10, 19)
+
+HEADER = ["Nome", "ChatId", "Gantt", "Esito", "Ultima esecuzione", "Note", "Servizi letti", "Promemoria inviati", "Prossimo promemoria"]
+
+
+def config_rows(outcome=""):
+    return [
+        HEADER,
+        ["P1", "-1001", GANTT_ID, outcome, "", "nota"],
+        ["P2", "-1002", GANTT_ID],
+        ["P3", "-1003", "bad"],
+        ["P1", "-1005", GANTT_ID],          # nome ripetuto: stato separato
+        ["P6", "abc", GANTT_ID],            # ignorata (skip_reason)
+    ]
+
+
+class _Req:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeSheets:
+    def __init__(self):
+        self.updates = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def batchUpdate(self, spreadsheetId, body):
+        self.updates.append((spreadsheetId, body))
+        return _Req({})
+
+
+def _run_status(cache: ProjectConfigCache) -> RunStatus:
+    status = RunStatus(datetime(2026, 10, 19, 15, 0), cache.projects, TODAY, cache.skipped)
+    p1, p2, p1_bis = cache.projects
+    status.services(p1, [("IT", "Sito", 4, date(2026, 10, 25)), ("IT", "Pagina", 2, date(2026, 11, 30))])
+    status.delivered(p1.row, True)
+    status.delivered(p1.row, True)
+    status.services(p2, [])
+    status.delivered(p2.row, False)
+    status.services(p1_bis, [("IT", "Sito", 4, date(2026, 10, 21))])
+    status.delivered(p1_bis.row, True)
+    for row, e in cache.errors:
+        status.error(row, e)
+    return status
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_status_columns_not_in_entries():
+    entries = rows_to_entries(config_rows(), first_row=1)
+    assert entries.status_columns == {
+        "Esito": 3, "Ultima_esecuzione": 4, "Servizi_letti": 6, "Promemoria_inviati": 7, "Prossimo_promemoria": 8,
+    }
+    assert "Esito" not in entries[0] and entries[0]["Note"] == "nota"
+
+    # lo stato scritto dal bot non fa ricompilare le righe
+    cache = ProjectConfigCache()
+    cache.refresh(rows_to_entries(config_rows(), first_row=1))
+    stats = cache.refresh(rows_to_entries(config_rows(outcome="OK"), first_row=1))
+    assert stats["ricompilate"] == 0
+
+
+def test_non_canonical_header():
+    # intestazione come nel README: nessuna riga deve sparire in silenzio
+    readme = [
+        ["Nome progetto", "ChatId gruppo Telegram", "Giorni avviso", "Link Gantt", "Topic"],
+        ["P1", "-1001", "", GANTT_ID, "Generale"],
+    ]
+    entries = rows_to_entries(readme, first_row=1)
+    assert entries[0]["ChatId"] == "-1001" and entries[0]["Topic_Destinazione"] == "Generale"
+
+    # obbligatoria non riconosciuta → posizione di HEADERS
+    entries = rows_to_entries([["Nome", "Gruppo Telegram", "Giorni_avviso", "Gantt"], ["P1", "-1001", "", GANTT_ID]])
+    cache = ProjectConfigCache()
+    assert cache.refresh(entries)["progetti"] == 1
+
+    # ...se la posizione è già un'altra colonna nota → errore visibile
+    try:
+        rows_to_entries([["Nome", "Gantt", "Gruppo"], ["P1", GANTT_ID, "-1001"]])
+    except ValueError as e:
+        assert "ChatId" in str(e)
+    else:
+        raise AssertionError("ChatId mancante non segnalato")
+
+
+def test_single_batch_update():
+    cache = ProjectConfigCache()
+    cache.refresh(rows_to_entries(config_rows(), first_row=1))
+    status = _run_status(cache)
+
+    api = FakeSheets()
+    written = GoogleSheetsSource(lambda: api).write_config_status(
+        api, "CFG", "Config!A2:Z", cache.status_columns, status.rows()
+    )
+    assert written == 5
+    assert len(api.updates) == 1
+
+    body = api.updates[0][1]
+    assert body["valueInputOption"] == "RAW"
+    assert body["data"] == [
+        {"range": "Config!D2:E2", "values": [["OK", "19/10/2026 15:00"]]},
+        {"range": "Config!G2:I2", "values": [["2", "2", "23/10/2026"]]},
+        {"range": "Config!D3:E3", "values": [["OK (invii saltati: 1, destinazione non raggiungibile)", "19/10/2026 15:00"]]},
+        {"range": "Config!G3:I3", "values": [["0", "0", ""]]},
+        {"range": "Config!D4:E4", "values": [[
+            "ERRORE: ValueError: Link Gantt non valido: impossibile estrarre la key. Valore letto: bad",
+            "19/10/2026 15:00",
+        ]]},
+        {"range": "Config!G4:I4", "values": [["", "0", ""]]},
+        {"range": "Config!D5:E5", "values": [["OK", "19/10/2026 15:00"]]},
+        {"range": "Config!G5:I5", "values": [["1", "1", "20/10/2026"]]},
+        {"range": "Config!D6:E6", "values": [["SALTATO: ChatId non numerico: 'abc'", "19/10/2026 15:00"]]},
+        {"range": "Config!G6:I6", "values": [["", "0", ""]]},
+    ], body["data"]
+
+
+def test_local_status_file():
+    cache = ProjectConfigCache()
+    cache.refresh(rows_to_entries(config_rows(), first_row=1))
+    d = tempfile.mkdtemp()
+    LocalFileSource(d).write_config_status(None, "CFG", "Foglio1!A2:Z", cache.status_columns, _run_status(cache).rows())
+
+    with open(os.path.join(d, "CFG.status.csv"), encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Riga", "Esito", "Ultima_esecuzione", "Servizi_letti", "Promemoria_inviati", "Prossimo_promemoria"]
+    assert rows[1] == ["2", "OK", "19/10/2026 15:00", "2", "2", "23/10/2026"]
+
+
+if __name__ == "__main__":
+    test_status_columns_not_in_entries()
+    test_non_canonical_header()
+    test_single_batch_update()
+    test_local_status_file()
+    print("Stato config: OK")
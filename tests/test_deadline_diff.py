@@ -0,0 +1,173 @@
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import date
+
+# snapshot in una cartella temporanea
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from deadline_diff import DeadlineChange, SnapshotStore, render_changes
+from project_config import Project
+
+
+TODAY = date(2026, 10, 19)
+
+SERVICES = [
+    ("IT", "Sito", 3, date(2026, 10, 25)),
+    ("IT", "Pagina", 2, date(2026, 10, 30)),
+    ("Sales", "Contratti", 5, date(2026, 11, 5)),
+]
+
+
+def project(topic_dest: str = "", chat_id: int = -100) -> Project:
+    return Project(
+        row=2,
+        name="P1",
+        chat_id=chat_id,
+        custom_days=frozenset(),
+        gantt_url="k" * 30,
+        gantt_key="k" * 30,
+        topic_dest_raw=topic_dest,
+        forced_thread_id=None,
+        topic_dest_name=topic_dest or None,
+    )
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_first_run_and_unchanged():
+    store = SnapshotStore("snap_first.json")
+    first = store.update("p", SERVICES)
+    assert first.first and not first.changed
+
+    again = store.update("p", list(SERVICES))
+    assert not again.first and not again.changed
+
+
+def test_changed_services():
+    store = SnapshotStore("snap_diff.json")
+    store.update("p", SERVICES)
+
+    new = [
+        ("IT", "Sito", 3, date(2026, 10, 27)),        # scadenza spostata
+        ("IT", "Pagina", 4, date(2026, 10, 30)),      # solo durata
+        ("M&C", "Brochure", 1, date(2026, 11, 1)),    # nuovo, Contratti rimosso: ignorati
+    ]
+    diff = store.update("p", new)
+    assert diff.changed == [
+        DeadlineChange("IT", "Sito", date(2026, 10, 25), date(2026, 10, 27), 3, 3),
+        DeadlineChange("IT", "Pagina", date(2026, 10, 30), date(2026, 10, 30), 2, 4),
+    ]
+    assert [c.name for c in diff.moved] == ["Sito"]
+
+
+def test_duplicate_names_keep_row_order():
+    store = SnapshotStore("snap_dup.json")
+    store.update("p", [("IT", "Test", 1, date(2026, 10, 20)), ("IT", "Test", 1, date(2026, 10, 22))])
+    diff = store.update("p", [("IT", "Test", 1, date(2026, 10, 20)), ("IT", "Test", 1, date(2026, 10, 24))])
+    assert [(c.name, c.new_deadline) for c in diff.changed] == [("Test", date(2026, 10, 24))]
+
+
+def test_snapshot_persisted():
+    store = SnapshotStore("snap_file.json")
+    store.update("p", SERVICES)
+    store.flush()
+
+    # riavvio: il confronto riparte dallo snapshot salvato
+    reloaded = SnapshotStore("snap_file.json")
+    diff = reloaded.update("p", SERVICES)
+    assert not diff.first and not diff.changed
+
+
+def test_same_project_in_two_chats():
+    store = SnapshotStore("snap_chats.json")
+    a, b = project(chat_id=-100), project(chat_id=-200)
+    assert store.key("JEToP", a) != store.key("JEToP", b)
+
+    store.update(store.key("JEToP", a), SERVICES)
+    store.update(store.key("JEToP", b), SERVICES)
+    moved = [("IT", "Sito", 3, date(2026, 10, 27))] + SERVICES[1:]
+
+    # la scadenza spostata viene notificata in entrambe le chat
+    assert [c.name for c in store.update(store.key("JEToP", a), moved).moved] == ["Sito"]
+    assert [c.name for c in store.update(store.key("JEToP", b), moved).moved] == ["Sito"]
+
+
+def test_render_changes_destinations():
+    store = SnapshotStore("snap_render.json")
+    store.update("p", SERVICES + [("IT", "Vecchio", 1, date(2026, 10, 1))])
+    diff = store.update("p", [
+        ("IT", "Sito", 3, date(2026, 10, 22)),
+        ("IT", "Pagina", 2, date(2026, 10, 30)),
+        ("Sales", "Contratti", 5, date(2026, 11, 8)),
+        ("IT", "Vecchio", 1, date(2026, 10, 2)),      # passata prima e dopo: ignorata
+    ])
+
+    per_area = render_changes(project(), diff, TODAY)
+    assert [d.topic for d in per_area] == ["IT", "Sales"]
+    assert "25/10/2026 → 22/10/2026 (-3 giorni)" in per_area[0].text
+    assert "Vecchio" not in per_area[0].text
+    assert per_area[0].days_left == 3
+
+    single = render_changes(project("Generale"), diff, TODAY)
+    assert len(single) == 1 and single[0].general
+    assert "[Sales] Contratti" in single[0].text
+
+
+class _FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, message_thread_id=None, **kw):
+        self.sent.append((chat_id, text))
+
+
+class _Ctx:
+    def __init__(self):
+        self.bot = _FakeBot()
+
+
+class _NoFetchSource:
+    # i Gantt arrivano tutti dalla pre-lettura: nessuna lettura all'invio
+    remote = False
+
+    def client(self):
+        return None
+
+    def fetch_gantt(self, *args, **kw):
+        raise AssertionError("Gantt pre-letto riletto")
+
+
+def test_prefetched_services_are_diffed():
+    os.environ.setdefault("ERROR_CHAT_ID", "-999")
+    import main
+
+    tenant = main.TENANTS[0]
+    tenant.source = _NoFetchSource()
+    p = project()
+    today = date.today()
+    before = [("IT", "Sito", 3, date(2099, 1, 10))]
+    after = [("IT", "Sito", 3, date(2099, 1, 14))]
+
+    # giorno 1 (solo snapshot) e giorno 2, entrambi con Gantt pre-letto
+    asyncio.run(main.run_projects(_Ctx(), tenant, [p], today, prefetched={p.read_key: before}))
+    ctx = _Ctx()
+    asyncio.run(main.run_projects(ctx, tenant, [p], today, prefetched={p.read_key: after}))
+
+    changed = [text for _, text in ctx.bot.sent if text.startswith("🔄 SCADENZA MODIFICATA")]
+    assert len(changed) == 1 and "10/01/2099 → 14/01/2099" in changed[0], ctx.bot.sent
+
+
+if __name__ == "__main__":
+    test_first_run_and_unchanged()
+    test_changed_services()
+    test_duplicate_names_keep_row_order()
+    test_snapshot_persisted()
+    test_same_project_in_two_chats()
+    test_render_changes_destinations()
+    test_prefetched_services_are_diffed()
+    print("Diff scadenze: OK")
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp())
+
+import drive_watcher
+from pipeline import run_pipeline
+from project_config import compile_entry
+from reminders import SentLedger
+
+
+# ------------------------------------------------------------
+# Fake locale dell'endpoint Drive changes (nessuna rete)
+# ------------------------------------------------------------
+class _Req:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeChanges:
+    """
+    Simula changes.getStartPageToken / changes.list con paginazione:
+    il token è l'indice della prossima modifica da restituire.
+    """
+
+    def __init__(self, page_size=2):
+        self.log = []          # modifiche: (fileId, removed)
+        self.page_size = page_size
+        self.list_calls = 0
+
+    def getStartPageToken(self, **kw):
+        return _Req({"startPageToken": str(len(self.log))})
+
+    def list(self, pageToken, **kw):
+        self.list_calls += 1
+        start = int(pageToken)
+        page = self.log[start:start + self.page_size]
+        res = {"changes": [{"fileId": f, "removed": r, "time": "2026-01-01T16:00:00Z"} for f, r in page]}
+        nxt = start + len(page)
+        if nxt < len(self.log):
+            res["nextPageToken"] = str(nxt)
+        else:
+            res["newStartPageToken"] = str(nxt)
+        return _Req(res)
+
+
+class FakeDrive:
+    def __init__(self):
+        self._changes = FakeChanges()
+
+    def changes(self):
+        return self._changes
+
+
+class FakeSheets:
+    """
+    Gantt minimale: ogni chiave ha un servizio che scade tra `days` giorni.
+    """
+
+    def __init__(self, days_by_key):
+        self.days_by_key = days_by_key
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range, valueRenderOption=None):
+        serial = (date.today() - date(1899, 12, 30)).days
+        if range.endswith("F9"):
+            return _Req({"values": [[serial]]})
+        days = self.days_by_key[spreadsheetId]
+        return _Req({"values": [["IT"], ["Servizio", "", 10, serial + days]]})
+
+
+KEY_A = "a" * 30
+KEY_B = "b" * 30
+
+
+def _projects():
+    return [
+        compile_entry({"Nome": "A", "ChatId": "-1", "Gantt": KEY_A}, 2),
+        compile_entry({"Nome": "B", "ChatId": "-2", "Gantt": KEY_B}, 3),
+    ]
+
+
+def test_poll_changes_paginates_and_returns_new_token():
+    drive = FakeDrive()
+    changed, token = drive_watcher.poll_changes(drive, None)
+    assert changed == {} and token == "0"
+
+    drive._changes.log += [(KEY_A, False), ("altro", False), (KEY_A, False), ("rimosso", True)]
+    changed, token = drive_watcher.poll_changes(drive, token)
+    assert set(changed) == {KEY_A, "altro"}
+    assert token == "4"
+    assert drive._changes.list_calls == 2
+
+    changed, token = drive_watcher.poll_changes(drive, token)
+    assert changed == {} and token == "4"
+
+
+def test_only_changed_gantt_sends_only_new_reminders():
+    projects = _projects()
+    sheets = FakeSheets({KEY_A: 5, KEY_B: 5})   # 5 = metà durata → già avvisato
+    ledger = SentLedger()
+    sent = []
+
+    async def deliver(d):
+        sent.append(d)
+
+    async def on_error(project, e):
+        raise e
+
+    async def run():
+        today = date.today()
+        await run_pipeline(projects, lambda: sheets, deliver, on_error, today=today, ledger=ledger)
+        ledger.mark_daily_done(today)
+        assert len(sent) == 2
+
+        # Il PM anticipa la scadenza di A a domani
+        sheets.days_by_key[KEY_A] = 1
+        drive = FakeDrive()
+        _, token = drive_watcher.poll_changes(drive, None)
+        drive._changes.log.append((KEY_A, False))
+        changed, _ = drive_watcher.poll_changes(drive, token)
+
+        todo = drive_watcher.changed_projects(projects, set(changed))
+        assert [p.name for p in todo] == ["A"]
+
+        sent.clear()
+        await run_pipeline(todo, lambda: sheets, deliver, on_error, today=today, ledger=ledger, only_new=True)
+        assert len(sent) == 1 and "DOMANI" in sent[0].text
+
+        # Nessuna nuova modifica → nessun nuovo invio
+        sent.clear()
+        await run_pipeline(todo, lambda: sheets, deliver, on_error, today=today, ledger=ledger, only_new=True)
+        assert sent == []
+
+    asyncio.run(run())
+
+
+class _Bot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, message_thread_id=None, **kw):
+        self.sent.append((chat_id, text))
+
+
+class _Ctx:
+    def __init__(self):
+        self.bot = _Bot()
+
+
+def test_change_between_prefetch_and_daily_job():
+    os.environ.setdefault("ERROR_CHAT_ID", "-999")
+    import main
+    from prefetch import prefetch_projects
+    from sources import GoogleSheetsSource
+
+    projects = _projects()
+    sheets = FakeSheets({KEY_A: 5, KEY_B: 5})
+    drive = FakeDrive()
+    tenant = main.TENANTS[0]
+    tenant.source = GoogleSheetsSource(lambda: sheets)
+    tenant.drive_service = lambda: drive
+    tenant.config_cache.projects = projects
+    ctx = _Ctx()
+    today = date.today()
+
+    async def run():
+        # pre-lettura con le date vecchie, poi primo token del watcher
+        tenant.prefetch.start(today)
+        tenant.prefetch.config_stats = {"righe": 2, "ricompilate": 0, "progetti": 2}
+        assert await prefetch_projects(projects, tenant.prefetch, tenant.source, today) == 2
+        await main.watch_tenant_changes(ctx, tenant)
+
+        # il PM anticipa A a domani prima di MESSAGE_TIME
+        sheets.days_by_key[KEY_A] = 1
+        drive._changes.log.append((KEY_A, False))
+        await main.watch_tenant_changes(ctx, tenant)
+        assert ctx.bot.sent == []
+        assert set(tenant.prefetch.services_for(today)) == {projects[1].read_key}
+
+        # il job giornaliero rilegge A e usa già la data nuova
+        await main.check_tenant_deadlines(ctx, tenant)
+
+    asyncio.run(run())
+    texts = [text for chat, text in ctx.bot.sent if chat == -1]
+    assert any("DOMANI" in t for t in texts), ctx.bot.sent
+
+
+if __name__ == "__main__":
+    test_poll_changes_paginates_and_returns_new_token()
+    test_only_changed_gantt_sends_only_new_reminders()
+    test_change_between_prefetch_and_daily_job()
+    print("Watcher Drive: OK")
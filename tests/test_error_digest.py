@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+
+# errors.log in una cartella temporanea
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import error_digest
+from error_digest import ErrorDigest
+from storage import storage_path
+
+
+class HttpError(Exception):
+    pass
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_groups_by_type_and_cause():
+    digest = ErrorDigest("JEToP")
+    for row, key in ((2, "a" * 30), (5, "b" * 30), (9, "c" * 30)):
+        digest.add(f"riga {row}", HttpError(f"<HttpError 403 when requesting https://sheets.googleapis.com/v4/{key}>"))
+    digest.add("riga 11", ValueError("Gantt senza area alla riga 14"))
+    digest.add("riga 12", ValueError("Gantt senza area alla riga 30"))
+    digest.add("riga 13", HttpError("<HttpError 404 Not Found>"))
+
+    assert len(digest) == 6
+    text = "\n".join(digest.render())
+    assert "HttpError ×3" in text and "riga 2, riga 5, riga 9" in text
+    assert "ValueError ×2" in text
+    assert "HttpError ×1: <HttpError 404 Not Found>" in text
+
+
+def test_long_digest_is_split():
+    digest = ErrorDigest()
+    # cause tutte diverse: nessun raggruppamento
+    for i in range(60):
+        digest.add(f"riga {i}", RuntimeError(f"errore {chr(65 + i % 26)}{chr(65 + i // 26)} " + "x" * 290))
+
+    messages = digest.render()
+    assert len(messages) > 1
+    assert all(len(m) <= error_digest.TELEGRAM_MAX_CHARS for m in messages)
+    assert messages[0].startswith("⚠️ Riepilogo errori: 60 errori")
+    assert sum(m.count("RuntimeError ×1") for m in messages) == 60
+
+
+def test_take_waits_for_min_interval():
+    digest = ErrorDigest(min_interval_minutes=60)
+    assert digest.take(now=0) == []
+
+    digest.add("riga 2", ValueError("x"))
+    assert len(digest.take(now=100)) == 1 and len(digest) == 0
+
+    # nuovo errore prima dei 60 minuti: resta in attesa
+    digest.add("riga 3", ValueError("y"))
+    assert digest.take(now=100 + 59 * 60) == [] and len(digest) == 1
+    digest.add("riga 4", KeyError("z"))
+    messages = digest.take(now=100 + 60 * 60)
+    assert "riga 3" in messages[0] and "riga 4" in messages[0] and len(digest) == 0
+
+
+def test_log_is_rotated():
+    error_digest.ERRORS_LOG_MAX_KB, error_digest.ERRORS_LOG_BACKUPS = 2, 2
+    p = storage_path("errors.log")
+    digest = ErrorDigest()
+    for i in range(100):
+        digest.add(f"riga {i}", ValueError("y" * 200))
+
+    assert os.path.exists(p + ".1") and os.path.exists(p + ".2")
+    assert not os.path.exists(p + ".3")
+    assert all(os.path.getsize(f) <= 2 * 1024 for f in (p, p + ".1", p + ".2"))
+    # l'ultimo errore è nel file corrente
+    with open(p, encoding="utf-8") as f:
+        assert "riga 99" in f.read()
+
+
+if __name__ == "__main__":
+    test_groups_by_type_and_cause()
+    test_long_digest_is_split()
+    test_take_waits_for_min_interval()
+    test_log_is_rotated()
+    print("Riepilogo errori: OK")
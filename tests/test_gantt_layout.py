@@ -0,0 +1,295 @@
+import os
+import sys
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+
+# cache layout in una cartella temporanea
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import gantt_layout
+from gantt_layout import LayoutCache
+from gantt_reader import fetch_gantt_detected, fetch_gantt_tabs, parse_gantt_rows
+from sources import parse_a1
+
+
+# ------------------------------------------------------------
+# Fake Sheets API basata su griglie (valori nativi delle celle)
+# ------------------------------------------------------------
+
+TODAY = date(2026, 10, 19)
+KEY = "k" * 30
+
+
+def serial(d: date) -> int:
+    return (d - date(1899, 12, 30)).days
+
+
+def standard_grid():
+    # template standard: tab GANTT, "Nome area" in B9, F9 data inizio
+    return {"GANTT": [["JEToP"]] + [[] for _ in range(7)] + [
+        ["", "Nome area", "", "Durata", "Scadenza", serial(date(2026, 1, 10))],
+        ["", "IT"],
+        ["", "Sito", "", 3, serial(date(2026, 10, 21))],
+        ["", "Sales"],
+        ["", "Contratti", "", 2, serial(date(2026, 10, 20))],
+    ]}
+
+
+def shifted_grid(top_rows=3):
+    # template diverso: tab rinominato, intestazione in A, colonne contigue
+    return {
+        "Note": [["appunti"]],
+        "Piano 2026": [[] for _ in range(top_rows)] + [
+            ["Nome area", "Durata (gg)", "Scadenza", serial(date(2026, 1, 10))],
+            ["IT"],
+            ["Sito", 3, serial(date(2026, 10, 21))],
+            ["Sales"],
+            ["Contratti", 2, serial(date(2026, 10, 20))],
+        ],
+    }
+
+
+class _Req:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class GridSheets:
+    def __init__(self, tabs):
+        self.tabs = tabs
+        self.calls = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return _GridValues(self)
+
+    def _slice(self, rng):
+        sheet, c0, r0, c1, r1 = parse_a1(rng)
+        if sheet not in self.tabs:
+            raise ValueError(f"Unable to parse range: {rng}")
+        rows = self.tabs[sheet][r0 - 1: r1]
+        out = [list(row[c0: None if c1 is None else c1 + 1]) for row in rows]
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def get(self, spreadsheetId, fields=None, ranges=None, includeGridData=False):
+        self.calls.append(("meta", tuple(ranges or ())))
+        if not includeGridData:
+            return _Req({"sheets": [{"properties": {"title": t}} for t in self.tabs]})
+        sheets = []
+        for rng in ranges:
+            title = parse_a1(rng)[0]
+            rows = [{"values": [{"formattedValue": str(v)} for v in row]} for row in self._slice(rng)]
+            sheets.append({"properties": {"title": title}, "data": [{"startRow": 0, "rowData": rows}]})
+        return _Req({"sheets": sheets})
+
+
+class _GridValues:
+    def __init__(self, api):
+        self.api = api
+
+    def get(self, spreadsheetId, range, valueRenderOption=None):
+        self.api.calls.append(("values", range))
+        return _Req({"values": self.api._slice(range)})
+
+    def batchGet(self, spreadsheetId, ranges, valueRenderOption=None):
+        self.api.calls.append(("batch", tuple(ranges)))
+        return _Req({"valueRanges": [{"range": r, "values": self.api._slice(r)} for r in ranges]})
+
+
+EXPECTED = [
+    ("IT", "Sito", 3, date(2026, 10, 21)),
+    ("Sales", "Contratti", 2, date(2026, 10, 20)),
+]
+
+
+def _services(api, cache):
+    return parse_gantt_rows(fetch_gantt_detected(api, KEY, cache=cache), TODAY)
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_standard_template_same_ranges():
+    api = GridSheets(standard_grid())
+    assert _services(api, LayoutCache("layouts_std.json")) == EXPECTED
+    reads = [c[1] for c in api.calls if c[0] == "values"]
+    assert "GANTT!B9:E1208" in reads and "GANTT!F9" in reads, reads
+
+
+def test_shifted_template_detected_once():
+    api = GridSheets(shifted_grid())
+    cache = LayoutCache("layouts_shift.json")
+
+    assert _services(api, cache) == EXPECTED
+    assert sum(1 for c in api.calls if c[0] == "meta") == 2
+
+    # esecuzione successiva: nessun rilevamento, solo il range esatto
+    api.calls.clear()
+    assert _services(api, cache) == EXPECTED
+    assert [c[0] for c in api.calls] == ["values", "values"], api.calls
+    assert ("values", "'Piano 2026'!A4:C1203") in api.calls
+
+    # layout salvato su file a fine esecuzione: anche dopo un riavvio
+    # nessun rilevamento
+    cache.flush()
+    api.calls.clear()
+    assert _services(api, LayoutCache("layouts_shift.json")) == EXPECTED
+    assert all(c[0] == "values" for c in api.calls)
+
+
+def test_redetect_when_header_moves():
+    api = GridSheets(shifted_grid(top_rows=3))
+    cache = LayoutCache("layouts_move.json")
+    assert _services(api, cache) == EXPECTED
+
+    # due righe inserite sopra l'intestazione
+    api.tabs = shifted_grid(top_rows=5)
+    assert _services(api, cache) == EXPECTED
+    assert cache.detections == 2
+    assert cache.get(KEY).header_row == 6
+
+
+def test_redetect_when_tab_renamed():
+    api = GridSheets(shifted_grid())
+    cache = LayoutCache("layouts_rename.json")
+    assert _services(api, cache) == EXPECTED
+
+    api.tabs = {"GANTT v2": api.tabs["Piano 2026"]}
+    assert _services(api, cache) == EXPECTED
+    assert cache.get(KEY).worksheet == "GANTT v2"
+
+
+class FakeHttpError(Exception):
+    # come googleapiclient.errors.HttpError: stato HTTP in .resp.status
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = type("Resp", (), {"status": status})()
+
+
+def test_no_redetect_on_quota_or_network_errors():
+    api = GridSheets(shifted_grid())
+    cache = LayoutCache("layouts_transport.json")
+    assert _services(api, cache) == EXPECTED
+
+    for error in (FakeHttpError(429), FakeHttpError(503), ConnectionError("reset")):
+        def failing(rng, error=error):
+            raise error
+        api._slice = failing
+        api.calls.clear()
+        try:
+            _services(api, cache)
+        except type(error):
+            pass
+        else:
+            raise AssertionError(f"{error!r} non propagato")
+        # nessun rilevamento: niente scansione dei tab, layout in cache intatto
+        assert all(c[0] == "values" for c in api.calls), api.calls
+        assert cache.detections == 1 and cache.get(KEY).worksheet == "Piano 2026"
+
+
+def test_headerless_layout_not_kept():
+    grid = standard_grid()
+    grid["GANTT"][8][1] = "Attività"     # nessuna intestazione "Nome area"
+    api = GridSheets(grid)
+    cache = LayoutCache("layouts_headerless.json")
+    clock = [1000.0]
+    real_time, gantt_layout.time = gantt_layout.time, SimpleNamespace(monotonic=lambda: clock[0])
+    try:
+        _services(api, cache)
+        assert cache.detections == 1 and not cache.get(KEY).has_header
+
+        # non salvato su file: dopo un riavvio si rileva di nuovo
+        cache.flush()
+        assert LayoutCache("layouts_headerless.json").get(KEY) is None
+
+        # entro HEADERLESS_RETRY_HOURS: nessun nuovo rilevamento
+        clock[0] += 3600
+        _services(api, cache)
+        assert cache.detections == 1
+
+        # intestazione aggiunta: trovata alla scadenza, poi salvata
+        api.tabs = standard_grid()
+        clock[0] += gantt_layout.HEADERLESS_RETRY_HOURS * 3600
+        assert _services(api, cache) == EXPECTED
+        assert cache.detections == 2 and cache.get(KEY).has_header
+        cache.flush()
+        assert LayoutCache("layouts_headerless.json").get(KEY).has_header
+    finally:
+        gantt_layout.time = real_time
+
+
+def phases_grid(top_rows=3):
+    # Gantt con le fasi su più tab: template standard + template spostato
+    return {
+        "Fase 1": standard_grid()["GANTT"],
+        "Note": [["appunti"]],
+        "Fase 2": shifted_grid(top_rows)["Piano 2026"][:top_rows] + [
+            ["Nome area", "Durata (gg)", "Scadenza", serial(date(2026, 1, 10))],
+            ["IT"],
+            ["Collaudo", 4, serial(date(2026, 11, 3))],
+        ],
+    }
+
+
+def _tab_services(api, cache, worksheets):
+    return parse_gantt_rows(fetch_gantt_tabs(api, KEY, worksheets, cache=cache), TODAY)
+
+
+def test_tabs_single_batch_read():
+    api = GridSheets(phases_grid())
+    cache = LayoutCache("layouts_tabs.json")
+
+    services = _tab_services(api, cache, ["Fase 1", "Fase 2"])
+    assert services == EXPECTED + [("IT", "Collaudo", 4, date(2026, 11, 3))]
+    assert [s.tab for s in services] == ["Fase 1", "Fase 1", "Fase 2"]
+    # titoli espliciti: un solo rilevamento per i due tab, una sola batchGet
+    assert [c[0] for c in api.calls] == ["meta", "batch"], api.calls
+
+    # esecuzione successiva: solo la batchGet, con i range di ogni layout
+    api.calls.clear()
+    assert _tab_services(api, cache, ["Fase 1", "Fase 2"]) == services
+    assert api.calls == [("batch", (
+        "'Fase 1'!F9", "'Fase 1'!B9:E1208", "'Fase 2'!D4", "'Fase 2'!A4:C1203",
+    ))], api.calls
+
+
+def test_tabs_pattern():
+    api = GridSheets(phases_grid())
+    services = _tab_services(api, LayoutCache("layouts_pattern.json"), ["fase *"])
+    assert {s.tab for s in services} == {"Fase 1", "Fase 2"}
+
+
+def test_tabs_redetect_only_moved_tab():
+    api = GridSheets(phases_grid(top_rows=3))
+    cache = LayoutCache("layouts_tabs_move.json")
+    expected = _tab_services(api, cache, ["Fase 1", "Fase 2"])
+
+    api.tabs = phases_grid(top_rows=5)
+    api.calls.clear()
+    assert _tab_services(api, cache, ["Fase 1", "Fase 2"]) == expected
+    assert api.calls[1] == ("meta", ("'Fase 2'!A1:Z40",)), api.calls
+    assert api.calls[2] == ("batch", ("'Fase 2'!D6", "'Fase 2'!A6:C1205")), api.calls
+    assert cache.get(KEY + "!Fase 2").header_row == 6
+
+
+if __name__ == "__main__":
+    test_standard_template_same_ranges()
+    test_shifted_template_detected_once()
+    test_redetect_when_header_moves()
+    test_redetect_when_tab_renamed()
+    test_no_redetect_on_quota_or_network_errors()
+    test_headerless_layout_not_kept()
+    test_tabs_single_batch_read()
+    test_tabs_pattern()
+    test_tabs_redetect_only_moved_tab()
+    print("Layout Gantt: OK")
@@ -0,0 +1,150 @@
+import os
+import sys
+import tempfile
+import urllib.error
+import urllib.request
+from datetime import date
+
+# feed salvati in una cartella temporanea
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from ical_feed import FeedStore, etag_matches, start_server
+from project_config import Project
+
+
+SERVICES = [
+    ("IT", "Sito", 3, date(2026, 10, 25)),
+    ("M&C", "Brochure", 1, date(2026, 11, 1)),
+    ("M C", "Video", 2, date(2026, 11, 3)),
+]
+
+
+def project(name: str, key: str = "k") -> Project:
+    return Project(
+        row=2,
+        name=name,
+        chat_id=-100,
+        custom_days=frozenset(),
+        gantt_url=key * 30,
+        gantt_key=key * 30,
+        topic_dest_raw="",
+        forced_thread_id=None,
+        topic_dest_name=None,
+    )
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_feeds_survive_restart():
+    store = FeedStore("feeds_restart.json", "ical_restart")
+    assert store.update("JEToP", project("P1"), SERVICES)
+    store.flush()
+    body, etag = store.get("/ics/jetop/p1.ics")
+
+    # riavvio: stessi URL, stesso corpo e ETag, nessuna rigenerazione
+    reloaded = FeedStore("feeds_restart.json", "ical_restart")
+    assert reloaded.get("/ics/jetop/p1.ics") == (body, etag)
+    assert not reloaded.update("JEToP", project("P1"), SERVICES)
+
+    # area sparita: feed rimosso anche dopo il riavvio
+    reloaded.update("JEToP", project("P1"), SERVICES[:1])
+    reloaded.flush()
+    assert FeedStore("feeds_restart.json", "ical_restart").paths() == ["/ics/jetop/p1.ics", "/ics/jetop/p1/it.ics"]
+
+
+def test_slug_collisions_get_suffix():
+    store = FeedStore("feeds_slug.json", "ical_slug")
+    store.update("JEToP", project("P-1", "a"), SERVICES[:1])
+    store.update("JEToP", project("P 1", "b"), SERVICES[1:2])
+    store.update("JEToP", project("P 1", "c"), SERVICES[2:])   # nome ripetuto, altro Gantt
+    assert b"Sito" in store.get("/ics/jetop/p-1.ics")[0]
+    assert b"Brochure" in store.get("/ics/jetop/p-1-2.ics")[0]
+    assert b"Video" in store.get("/ics/jetop/p-1-3.ics")[0]
+
+    # "M&C" e "M C" nello stesso progetto
+    store.update("JEToP", project("P2"), SERVICES)
+    assert b"Brochure" in store.get("/ics/jetop/p2/m-c.ics")[0]
+    assert b"Video" in store.get("/ics/jetop/p2/m-c-2.ics")[0]
+
+    # suffissi stabili dopo il riavvio
+    store.flush()
+    reloaded = FeedStore("feeds_slug.json", "ical_slug")
+    reloaded.update("JEToP", project("P 1", "c"), SERVICES[2:] + SERVICES[:1])
+    assert b"Sito" in reloaded.get("/ics/jetop/p-1-3.ics")[0]
+
+
+def test_removed_projects_pruned():
+    store = FeedStore("feeds_prune.json", "ical_prune")
+    p1, p2 = project("P1", "a"), project("P2", "b")
+    store.update("JEToP", p1, SERVICES[:1])
+    store.update("JEToP", p2, SERVICES[1:2])
+    store.update("Altro", project("P3", "c"), SERVICES[:1])
+    store.flush()
+
+    # P2 tolto dal config: feed e file eliminati, l'altro tenant non si tocca
+    assert store.prune("JEToP", [p1]) == 1
+    store.flush()
+    assert FeedStore("feeds_prune.json", "ical_prune").paths() == [
+        "/ics/altro/p3.ics", "/ics/altro/p3/it.ics", "/ics/jetop/p1.ics", "/ics/jetop/p1/it.ics",
+    ]
+    assert len(os.listdir(os.path.join(os.environ["STORAGE_DIR"], "ical_prune"))) == 4
+
+    # percorso di nuovo libero: nessun suffisso per un nuovo "P2"
+    store.update("JEToP", project("P2", "d"), SERVICES[:1])
+    assert store.get("/ics/jetop/p2.ics") is not None
+
+
+def test_if_none_match():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"x", W/"abc" ', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"abcd", "x"', etag)
+    assert not etag_matches(None, etag)
+
+
+def _get(url, headers=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=5) as r:
+            return r.status, r.headers.get("ETag"), r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get("ETag"), b""
+
+
+def test_http_server():
+    store = FeedStore("feeds_http.json", "ical_http")
+    store.update("JEToP", project("P1"), SERVICES)
+    server = start_server(store, port=0, bind="127.0.0.1", token="segreto")
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert _get(f"{base}/ics/jetop/p1.ics")[0] == 403
+        assert _get(f"{base}/ics/jetop/nessuno.ics?token=segreto")[0] == 404
+
+        status, etag, body = _get(f"{base}/ics/jetop/p1.ics?token=segreto")
+        assert status == 200 and body.startswith(b"BEGIN:VCALENDAR") and b"Sito" in body
+        assert etag == store.get("/ics/jetop/p1.ics")[1]
+
+        # stesso ETag (anche debole o in lista) → 304 senza corpo
+        assert _get(f"{base}/ics/jetop/p1.ics?token=segreto", {"If-None-Match": etag})[:3] == (304, etag, b"")
+        assert _get(f"{base}/ics/jetop/p1.ics?token=segreto", {"If-None-Match": f'"vecchio", W/{etag}'})[0] == 304
+
+        # feed rigenerato: nuovo ETag, il vecchio non vale più
+        store.update("JEToP", project("P1"), SERVICES[:2])
+        status, new_etag, _ = _get(f"{base}/ics/jetop/p1.ics?token=segreto", {"If-None-Match": etag})
+        assert status == 200 and new_etag != etag
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    test_feeds_survive_restart()
+    test_slug_collisions_get_suffix()
+    test_removed_projects_pruned()
+    test_if_none_match()
+    test_http_server()
+    print("Feed iCal: OK")
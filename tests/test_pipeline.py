@@ -0,0 +1,199 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp())
+
+from gantt_reader import extract_spreadsheet_key
+from pipeline import DEFAULT_WORKERS, run_pipeline
+from project_config import compile_entry
+from sources import Source
+
+
+TODAY = date(2026, 10, 19)
+
+# sicurezza: un test rotto fallisce invece di restare appeso
+TIMEOUT = 5
+
+
+def serial(d: date) -> int:
+    return (d - date(1899, 12, 30)).days
+
+
+# ------------------------------------------------------------
+# Sorgente finta: un servizio per Gantt, fetch bloccabili
+# ------------------------------------------------------------
+class FakeSource(Source):
+    """
+    days: chiave Gantt → giorni alla scadenza del suo unico servizio.
+    gates: chiave → threading.Event da attendere prima di rispondere.
+    broken: chiavi il cui fetch fallisce.
+    """
+
+    def __init__(self, days, gates=None, broken=()):
+        self.days = days
+        self.gates = gates or {}
+        self.broken = set(broken)
+        self.started = []
+
+    def client(self):
+        return None
+
+    def fetch_gantt(self, client, gantt_url, quota=None, worksheets=()):
+        key = extract_spreadsheet_key(gantt_url)
+        self.started.append(key)
+        if key in self.gates:
+            self.gates[key].wait(TIMEOUT)
+        if key in self.broken:
+            raise OSError(f"Gantt {key} irraggiungibile")
+        deadline = TODAY + timedelta(days=self.days[key])
+        return [["IT"], ["Servizio", "", 10, serial(deadline)]]
+
+
+class TrackedList(list):
+    """
+    Lista progetti che ricorda quanti elementi sono stati presi
+    dall'ultima iterazione (il feed della pipeline li scorre).
+    """
+
+    taken = 0
+
+    def __iter__(self):
+        self.taken = 0
+        for item in super().__iter__():
+            self.taken += 1
+            yield item
+
+
+def key(i: int) -> str:
+    return chr(ord("a") + i) * 30
+
+
+def projects(n: int):
+    return [compile_entry({"Nome": f"P{i}", "ChatId": str(-1 - i), "Gantt": key(i)}, i + 2) for i in range(n)]
+
+
+def settings(**kw):
+    out = dict(DEFAULT_WORKERS, queue_size=8, urgent_days=1)
+    out.update(kw)
+    return out
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, TIMEOUT))
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_slow_fetch_holds_feed_back():
+    todo = TrackedList(projects(10))
+    gate = threading.Event()
+    source = FakeSource({key(i): 1 for i in range(10)}, gates={key(0): gate})
+    sent = []
+
+    async def deliver(d):
+        sent.append(d.project_name)
+
+    async def on_error(project, e):
+        raise AssertionError(e)
+
+    async def _run():
+        task = asyncio.create_task(run_pipeline(
+            todo, source, deliver, on_error, today=TODAY, settings=settings(fetch=1, queue_size=1)
+        ))
+        await asyncio.sleep(0.3)
+        # un worker fermo sul primo Gantt + un posto in coda: il feed
+        # si blocca al terzo progetto invece di accodarli tutti
+        assert source.started == [key(0)] and todo.taken <= 3, todo.taken
+        gate.set()
+        return await task
+
+    stats = run(_run())
+    assert stats.projects == 10 and sorted(sent) == sorted(f"P{i}" for i in range(10))
+
+
+def test_errors_are_isolated():
+    todo = projects(4)
+    source = FakeSource({key(i): 1 for i in range(4)}, broken={key(1)})
+    sent, errors = [], []
+
+    async def deliver(d):
+        sent.append(d.project_name)
+
+    async def on_error(project, e):
+        errors.append((project.name, type(e).__name__))
+
+    def on_services(project, services):
+        if project.name == "P2":
+            raise ValueError("Gantt illeggibile")
+
+    stats = run(run_pipeline(todo, source, deliver, on_error, today=TODAY, settings=settings(), on_services=on_services))
+    assert sorted(errors) == [("P1", "OSError"), ("P2", "ValueError")]
+    assert sorted(sent) == ["P0", "P3"] and stats.errors == 2
+
+
+def test_first_message_before_last_fetch():
+    todo = projects(2)
+    gate = threading.Event()
+    source = FakeSource({key(0): 1, key(1): 1}, gates={key(1): gate})
+    sent = []
+
+    async def deliver(d):
+        # il Gantt di P1 è ancora in download quando parte il primo invio
+        sent.append((d.project_name, gate.is_set()))
+        gate.set()
+
+    async def on_error(project, e):
+        raise AssertionError(e)
+
+    run(run_pipeline(todo, source, deliver, on_error, today=TODAY, settings=settings()))
+    assert sent == [("P0", False), ("P1", True)]
+
+
+def test_overdue_of_last_row_goes_first():
+    todo = [
+        compile_entry({"Nome": "Primo", "ChatId": "-1", "Giorni_avviso": "7", "Gantt": key(0)}, 2),
+        compile_entry({"Nome": "Medio", "ChatId": "-2", "Gantt": key(1)}, 3),
+        compile_entry({"Nome": "Ultimo", "ChatId": "-3", "Gantt": key(2)}, 4),
+    ]
+    source = FakeSource({key(0): 7, key(1): 5, key(2): -1})
+    sent = []
+
+    async def deliver(d):
+        sent.append((d.project_name, d.days_left))
+
+    async def on_error(project, e):
+        raise AssertionError(e)
+
+    run(run_pipeline(todo, source, deliver, on_error, today=TODAY, settings=settings(send=1)))
+    assert sent == [("Ultimo", -1), ("Medio", 5), ("Primo", 7)], sent
+
+
+def test_failing_on_error_does_not_hang():
+    todo = projects(5)
+    source = FakeSource({key(i): 1 for i in range(5)}, broken={key(0), key(2)})
+    sent = []
+
+    async def deliver(d):
+        sent.append(d.project_name)
+
+    async def on_error(project, e):
+        raise RuntimeError("chat errori irraggiungibile")
+
+    stats = run(run_pipeline(todo, source, deliver, on_error, today=TODAY, settings=settings(fetch=1, queue_size=1)))
+    assert sorted(sent) == ["P1", "P3", "P4"] and stats.errors == 2
+
+
+if __name__ == "__main__":
+    test_slow_fetch_holds_feed_back()
+    test_errors_are_isolated()
+    test_first_message_before_last_fetch()
+    test_overdue_of_last_row_goes_first()
+    test_failing_on_error_does_not_hang()
+    print("Pipeline: OK")
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+
+# ledger, snapshot e report in una cartella temporanea
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+os.environ.setdefault("ERROR_CHAT_ID", "-999")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import main
+import profiling
+from gantt_reader import extract_spreadsheet_key
+from sources import Source
+from storage import storage_path
+from tenants import Tenant
+
+
+def serial(d: date) -> int:
+    return (d - date(1899, 12, 30)).days
+
+
+# ------------------------------------------------------------
+# Sorgente e bot finti
+# ------------------------------------------------------------
+class FakeSource(Source):
+    """
+    Un progetto con un servizio in scadenza oggi; la scrittura dello
+    stato nel config fallisce (non deve avvenire a vuoto).
+    """
+
+    def client(self):
+        return None
+
+    def read_config(self, client, spreadsheet_id, config_range, quota=None):
+        return [{"Nome": "Alfa", "ChatId": "-101", "Gantt": "a" * 30, "_row": "2"}]
+
+    def fetch_gantt(self, client, gantt_url, quota=None, worksheets=()):
+        assert extract_spreadsheet_key(gantt_url) == "a" * 30
+        return [["IT"], ["Servizio", "", 10, serial(date.today())]]
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, message_thread_id=None, **kw):
+        self.sent.append((chat_id, text))
+        return SimpleNamespace(message_id=len(self.sent))
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_env_check_is_pure():
+    os.environ["PROFILE_NEXT_RUN"] = "1"
+    try:
+        assert profiling.profile_requested_by_env()
+        assert profiling.profile_requested_by_env()
+        assert os.environ["PROFILE_NEXT_RUN"] == "1"
+
+        # una sola esecuzione profilata per processo
+        assert profiling.take_env_request()
+        assert not profiling.take_env_request()
+        assert os.environ["PROFILE_NEXT_RUN"] == "1"
+    finally:
+        del os.environ["PROFILE_NEXT_RUN"]
+    assert not profiling.profile_requested_by_env()
+
+
+def test_profiled_dry_run_sends_nothing():
+    main.TENANTS = [Tenant(
+        name="T", config_spreadsheet_id="cfg", config_range="A:Z",
+        service_account_json="", impersonated_user="", error_chat_id=-998,
+        source=FakeSource(),
+    )]
+    ctx = SimpleNamespace(bot=FakeBot())
+
+    summary = asyncio.run(main.run_profiled_job(ctx, dry_run=True))
+
+    # solo il riepilogo su ERROR_CHAT_ID, nessun promemoria al progetto
+    assert ctx.bot.sent == [(main.ERROR_CHAT_ID, summary)]
+    assert "Progetti: 1" in summary and "prova a vuoto" in summary
+
+    reports = os.listdir(storage_path("profiles"))
+    assert len(reports) == 1
+    with open(storage_path(f"profiles/{reports[0]}"), encoding="utf-8") as f:
+        report = f.read()
+    assert "[T] Alfa" in report and "Top" in report
+
+
+if __name__ == "__main__":
+    test_env_check_is_pure()
+    test_profiled_dry_run_sends_nothing()
+    print("Profiling: OK")
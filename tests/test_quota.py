@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import quota
+from quota import QuotaBudget
+
+
+class FakeClock:
+    """
+    Orologio finto per quota.time: sleep() fa solo avanzare monotonic().
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_refill_follows_rate():
+    real_time, quota.time = quota.time, FakeClock()
+    try:
+        clock = quota.time
+        budget = QuotaBudget(per_minute=120, burst=3)
+
+        # raffica iniziale gratis, poi un token ogni 0,5 s (120/min)
+        assert [budget.acquire() for _ in range(3)] == [0, 0, 0]
+        assert budget.acquire() == 0.5
+        assert budget.acquire(2) == 1.0
+
+        # ricarica limitata alla capacità del bucket
+        clock.sleep(60)
+        assert budget.acquire(3) == 0
+        assert budget.acquire() == 0.5
+        assert budget.calls == 10
+
+        try:
+            budget.acquire(4)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("richiesta oltre la capacità accettata")
+    finally:
+        quota.time = real_time
+
+
+def test_exhausted_tenant_does_not_delay_another():
+    slow = QuotaBudget(per_minute=60, burst=2, threads=2)
+    fast = QuotaBudget(per_minute=60, burst=2, threads=2)
+    slow.acquire(2)
+
+    async def _run():
+        # entrambi i thread del primo tenant fermi in attesa di token (~1 e ~2 s)
+        waiting = [asyncio.create_task(slow.run(slow.acquire)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+
+        started = time.monotonic()
+        assert await fast.run(fast.acquire) == 0
+        await quota.run_io(None, lambda: None)    # executor di default libero
+        elapsed = time.monotonic() - started
+
+        waits = await asyncio.gather(*waiting)
+        return elapsed, waits
+
+    elapsed, waits = asyncio.run(_run())
+    assert elapsed < 0.5, elapsed
+    assert all(w > 0 for w in waits), waits
+
+
+if __name__ == "__main__":
+    test_refill_follows_rate()
+    test_exhausted_tenant_does_not_delay_another()
+    print("Quota: OK")
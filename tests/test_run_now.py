@@ -0,0 +1,153 @@
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+
+# ledger, snapshot e feed in una cartella temporanea
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+os.environ.setdefault("ERROR_CHAT_ID", "-999")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import main
+from gantt_reader import extract_spreadsheet_key
+from sources import Source
+from tenants import Tenant
+
+
+ADMIN = 4242
+main.ADMIN_USER_IDS.add(ADMIN)
+
+
+def serial(d: date) -> int:
+    return (d - date(1899, 12, 30)).days
+
+
+def key(i: int) -> str:
+    return chr(ord("a") + i) * 30
+
+
+# ------------------------------------------------------------
+# Sorgente, bot e update finti
+# ------------------------------------------------------------
+class FakeSource(Source):
+    """
+    config: righe del foglio config; ogni Gantt ha un servizio in
+    scadenza oggi.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.config_reads = 0
+        self.fetched = []
+
+    def client(self):
+        return None
+
+    def read_config(self, client, spreadsheet_id, config_range, quota=None):
+        self.config_reads += 1
+        return list(self.config)
+
+    def fetch_gantt(self, client, gantt_url, quota=None, worksheets=()):
+        self.fetched.append(extract_spreadsheet_key(gantt_url))
+        return [["IT"], ["Servizio", "", 10, serial(date.today())]]
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, message_thread_id=None, **kw):
+        self.sent.append(chat_id)
+        return SimpleNamespace(message_id=len(self.sent))
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kw):
+        self.replies.append(text)
+
+
+def update(chat_id: int, user_id: int = ADMIN):
+    return SimpleNamespace(
+        effective_message=FakeMessage(),
+        effective_chat=SimpleNamespace(id=chat_id),
+        effective_user=SimpleNamespace(id=user_id),
+    )
+
+
+def context(*args):
+    return SimpleNamespace(bot=FakeBot(), args=list(args))
+
+
+def tenant(config):
+    return Tenant(
+        name="T", config_spreadsheet_id="cfg", config_range="A:Z",
+        service_account_json="", impersonated_user="", error_chat_id=-998,
+        source=FakeSource(config),
+    )
+
+
+CONFIG = [
+    {"Nome": "Alfa", "ChatId": "-101", "Gantt": key(0), "_row": "2"},
+    {"Nome": "Beta", "ChatId": "-102", "Gantt": key(1), "_row": "3"},
+]
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_busy_job_is_not_overlapped():
+    main.TENANTS = [tenant(CONFIG)]
+    upd, ctx = update(-101), context("Alfa")
+
+    async def _run():
+        async with main.RUN_LOCK:
+            await main.run_now(upd, ctx)
+
+    asyncio.run(_run())
+    assert upd.effective_message.replies == ["⏳ Un controllo scadenze è già in corso, riprova tra poco."]
+    assert ctx.bot.sent == [] and main.TENANTS[0].source.fetched == []
+
+
+def test_project_by_name_or_chat():
+    t = tenant(CONFIG)
+    main.TENANTS = [t]
+
+    # per nome (maiuscole ignorate): cache vuota → config riletto una volta
+    upd, ctx = update(-500), context("beta")
+    asyncio.run(main.run_now(upd, ctx))
+    assert t.source.config_reads == 1 and t.source.fetched == [key(1)]
+    assert ctx.bot.sent == [-102]
+    assert "[T] Beta: messaggi_inviati=1" in upd.effective_message.replies[-1]
+
+    # senza nome: il progetto collegato alla chat, config già in cache
+    upd, ctx = update(-101), context()
+    asyncio.run(main.run_now(upd, ctx))
+    assert t.source.config_reads == 1 and t.source.fetched[-1] == key(0)
+    assert "[T] Alfa:" in upd.effective_message.replies[-1]
+
+    # nome sconosciuto: config riletto, nessun invio
+    upd, ctx = update(-101), context("Gamma")
+    asyncio.run(main.run_now(upd, ctx))
+    assert t.source.config_reads == 2 and ctx.bot.sent == []
+    assert upd.effective_message.replies == ["⚠️ Nessun progetto chiamato 'Gamma' nel foglio config."]
+
+
+def test_not_admin():
+    main.TENANTS = [tenant(CONFIG)]
+    upd, ctx = update(-101, user_id=1), context("Alfa")
+    asyncio.run(main.run_now(upd, ctx))
+    assert upd.effective_message.replies == ["⛔ Comando riservato agli amministratori."]
+    assert main.TENANTS[0].source.config_reads == 0
+
+
+if __name__ == "__main__":
+    test_busy_job_is_not_overlapped()
+    test_project_by_name_or_chat()
+    test_not_admin()
+    print("/run_now: OK")
@@ -0,0 +1,214 @@
+import os
+import sys
+import tempfile
+import zipfile
+from datetime import date
+from xml.sax.saxutils import escape
+
+# cache layout Gantt in una cartella temporanea
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from gantt_reader import parse_gantt_rows
+from sources import GoogleSheetsSource, LocalFileSource, openpyxl
+
+
+# ------------------------------------------------------------
+# Stessi fogli in tre forme: risposte API, XLSX/ODS, CSV
+# ------------------------------------------------------------
+
+CONFIG_ID = "c" * 30
+GANTT_ID = "g" * 30
+
+
+def serial(d: date) -> int:
+    return (d - date(1899, 12, 30)).days
+
+
+# Foglio config (Foglio1, riga 1 = intestazione): valori nativi delle celle
+CONFIG_GRID = [
+    ["Nome", "ChatId", "Giorni_avviso", "Gantt", "Topic_Destinazione"],
+    ["P1", -1001, "7,3", "https://docs.google.com/spreadsheets/d/" + GANTT_ID + "/edit"],
+    [],
+    ["P2", -1002, "", GANTT_ID, "IT"],
+]
+
+# Gantt (tab GANTT): righe 1-8 intestazione del template, F9 data inizio
+GANTT_GRID = [["JEToP"]] + [[] for _ in range(7)] + [
+    ["", "Nome area", "", "Durata", "Scadenza", date(2026, 1, 10)],
+    ["", "IT"],
+    ["", "Sito", "", 3, date(2026, 10, 21)],
+    [],
+    ["", "Sales"],
+    ["", "Contratti", "", 2.0, "21/10"],
+    ["", "Rotto", "", "x", date(2026, 11, 2)],
+]
+
+# Cosa restituisce values.get per gli stessi fogli
+API = {
+    (CONFIG_ID, "Foglio1!A1:Z"): [
+        ["Nome", "ChatId", "Giorni_avviso", "Gantt", "Topic_Destinazione"],
+        ["P1", "-1001", "7,3", "https://docs.google.com/spreadsheets/d/" + GANTT_ID + "/edit"],
+        [],
+        ["P2", "-1002", "", GANTT_ID, "IT"],
+    ],
+    (GANTT_ID, "GANTT!F9"): [[serial(date(2026, 1, 10))]],
+    (GANTT_ID, "GANTT!B9:E1208"): [
+        ["Nome area", "", "Durata", "Scadenza"],
+        ["IT"],
+        ["Sito", "", 3, serial(date(2026, 10, 21))],
+        [],
+        ["Sales"],
+        ["Contratti", "", 2, "21/10"],
+        ["Rotto", "", "x", serial(date(2026, 11, 2))],
+    ],
+}
+
+
+class _Req:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+def _grid_data(grid):
+    # spreadsheets.get con includeGridData: solo il testo delle celle
+    return [{"values": [{"formattedValue": f"{v:%d/%m/%Y}" if isinstance(v, date) else str(v)} for v in row]} for row in grid]
+
+
+class FakeValues:
+    def get(self, spreadsheetId, range, valueRenderOption=None):
+        # copia: parse_gantt_rows completa le righe sul posto
+        return _Req({"values": [list(row) for row in API[(spreadsheetId, range)]]})
+
+
+class FakeSheets:
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return FakeValues()
+
+    def get(self, spreadsheetId, fields=None, ranges=None, includeGridData=False):
+        # rilevamento layout Gantt (gantt_layout.detect_layout)
+        sheet = {"properties": {"title": "GANTT"}}
+        if includeGridData:
+            sheet["data"] = [{"rowData": _grid_data(GANTT_GRID[:40])}]
+        return _Req({"sheets": [sheet]})
+
+
+# ------------------------------------------------------------
+# Scrittura export locali
+# ------------------------------------------------------------
+
+def write_xlsx(path, sheets):
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for title, grid in sheets.items():
+        ws = wb.create_sheet(title)
+        for r, row in enumerate(grid, start=1):
+            for c, v in enumerate(row, start=1):
+                if v != "":
+                    ws.cell(row=r, column=c, value=v)
+    wb.save(path)
+
+
+def _ods_cell(v):
+    if v == "":
+        return '<table:table-cell/>'
+    if isinstance(v, date):
+        return f'<table:table-cell office:value-type="date" office:date-value="{v.isoformat()}"><text:p>{v:%d/%m/%Y}</text:p></table:table-cell>'
+    if isinstance(v, (int, float)):
+        return f'<table:table-cell office:value-type="float" office:value="{v}"><text:p>{v}</text:p></table:table-cell>'
+    return f'<table:table-cell office:value-type="string"><text:p>{escape(v)}</text:p></table:table-cell>'
+
+
+def write_ods(path, sheets):
+    tables = []
+    for title, grid in sheets.items():
+        rows = []
+        for row in grid:
+            cells = "".join(_ods_cell(v) for v in row)
+            # come LibreOffice: celle vuote finali ripetute
+            rows.append(f'<table:table-row>{cells}<table:table-cell table:number-columns-repeated="1000"/></table:table-row>')
+        # ...e righe vuote fino alla fine del foglio
+        rows.append('<table:table-row table:number-rows-repeated="1048000"><table:table-cell table:number-columns-repeated="1024"/></table:table-row>')
+        tables.append(f'<table:table table:name="{title}">{"".join(rows)}</table:table>')
+
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<office:document-content'
+        ' xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+        ' xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"'
+        ' xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0">'
+        f'<office:body><office:spreadsheet>{"".join(tables)}</office:spreadsheet></office:body>'
+        '</office:document-content>'
+    )
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("mimetype", "application/vnd.oasis.opendocument.spreadsheet")
+        z.writestr("content.xml", content)
+
+
+def write_csv(folder, sheets):
+    os.makedirs(folder, exist_ok=True)
+    for title, grid in sheets.items():
+        with open(os.path.join(folder, f"{title}.csv"), "w", encoding="utf-8") as f:
+            for row in grid:
+                cells = [v.strftime("%d/%m/%Y") if isinstance(v, date) else str(v) for v in row]
+                f.write(";".join(cells) + "\n")
+
+
+def _bundle(fmt):
+    d = tempfile.mkdtemp()
+    files = {CONFIG_ID: {"Foglio1": CONFIG_GRID}, GANTT_ID: {"GANTT": GANTT_GRID}}
+    for key, sheets in files.items():
+        if fmt == "xlsx":
+            write_xlsx(os.path.join(d, key + ".xlsx"), sheets)
+        elif fmt == "ods":
+            write_ods(os.path.join(d, key + ".ods"), sheets)
+        else:
+            write_csv(os.path.join(d, key), sheets)
+    return LocalFileSource(d)
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def _check_same_records(local, raw_values: bool):
+    api = GoogleSheetsSource(FakeSheets)
+    api_client = api.client()
+    today = date(2026, 10, 19)
+
+    assert local.read_config(None, CONFIG_ID, "Foglio1!A2:Z") == api.read_config(api_client, CONFIG_ID, "Foglio1!A2:Z")
+
+    api_values = api.fetch_gantt(api_client, GANTT_ID)
+    local_values = local.fetch_gantt(None, GANTT_ID)
+    if raw_values:
+        assert local_values == api_values, local_values
+    assert parse_gantt_rows(local_values, today) == parse_gantt_rows(api_values, today)
+
+
+def test_ods_matches_api():
+    _check_same_records(_bundle("ods"), raw_values=True)
+
+
+def test_xlsx_matches_api():
+    if openpyxl is None:
+        print("openpyxl non installato: test XLSX saltato")
+        return
+    _check_same_records(_bundle("xlsx"), raw_values=True)
+
+
+def test_csv_matches_api():
+    # Il CSV contiene le date come testo: stessi servizi, valori grezzi diversi
+    _check_same_records(_bundle("csv"), raw_values=False)
+
+
+if __name__ == "__main__":
+    test_ods_matches_api()
+    test_xlsx_matches_api()
+    test_csv_matches_api()
+    print("Sorgenti locali: OK")
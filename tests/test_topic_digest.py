@@ -0,0 +1,156 @@
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import date
+
+# digest e topic in una cartella temporanea
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import topic_digest
+import topic_registry as tr
+from project_config import Project
+
+
+TODAY = date(2026, 10, 19)
+CHAT = -100
+
+
+def project(name: str) -> Project:
+    return Project(
+        row=2,
+        name=name,
+        chat_id=CHAT,
+        custom_days=frozenset(),
+        gantt_url="k" * 30,
+        gantt_key="k" * 30,
+        topic_dest_raw="",
+        forced_thread_id=None,
+        topic_dest_name=None,
+    )
+
+
+class _Sent:
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+class FakeBot:
+    def __init__(self):
+        self.texts = {}
+
+    async def send_message(self, chat_id, text, message_thread_id=None, **kw):
+        message_id = len(self.texts) + 1
+        self.texts[message_id] = text
+        return _Sent(message_id)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kw):
+        self.texts[message_id] = text
+
+    async def delete_message(self, chat_id, message_id, **kw):
+        self.texts[message_id] = None
+
+    async def pin_chat_message(self, **kw):
+        pass
+
+
+def run(bot, projects, services, owner="default", full=True):
+    """
+    Esecuzione digest: services = {progetto: [servizi]}.
+    """
+    collector = topic_digest.DigestCollector(owner, [p.name for p in projects], full=full)
+
+    async def _run():
+        for p in projects:
+            if p.name not in services:
+                continue
+            collector.read(p.name)
+            for d in topic_digest.render_sections(p, None, services[p.name], TODAY):
+                await collector.add(d)
+        return await topic_digest.publish(bot, collector)
+
+    return asyncio.run(_run())
+
+
+def digest(area):
+    state = tr.get_digest(CHAT, tr.get_topic(CHAT, area))
+    return state.get("sections", {})
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_vanished_area_and_removed_project():
+    tr.set_topic(CHAT, "IT", 11)
+    tr.set_topic(CHAT, "Sales", 12)
+    bot = FakeBot()
+    p1, p2 = project("P1"), project("P2")
+
+    run(bot, [p1, p2], {
+        "P1": [("IT", "Sito", 3, date(2026, 10, 25)), ("Sales", "Contratti", 2, date(2026, 10, 30))],
+        "P2": [("IT", "App", 5, date(2026, 11, 2))],
+    })
+    assert sorted(digest("IT")) == ["P1", "P2"] and list(digest("Sales")) == ["P1"]
+
+    # area Sales sparita dal Gantt di P1
+    run(bot, [p1, p2], {
+        "P1": [("IT", "Sito", 3, date(2026, 10, 25))],
+        "P2": [("IT", "App", 5, date(2026, 11, 2))],
+    })
+    assert digest("Sales") == {}
+
+    # P2 tolto dal config
+    run(bot, [p1], {"P1": [("IT", "Sito", 3, date(2026, 10, 25))]})
+    assert list(digest("IT")) == ["P1"]
+    assert all("P2" not in text for text in bot.texts.values() if text and "📌" in text)
+
+
+def test_partial_run_and_other_tenant_keep_sections():
+    tr.set_topic(CHAT, "M&C", 13)
+    bot = FakeBot()
+    p3, p4 = project("P3"), project("P4")
+    run(bot, [p3, p4], {"P3": [("M&C", "Brochure", 1, date(2026, 11, 1))], "P4": [("M&C", "Video", 1, date(2026, 11, 3))]})
+
+    # Gantt di P4 non letto (errore): la sezione resta
+    run(bot, [p3, p4], {"P3": [("M&C", "Brochure", 1, date(2026, 11, 1))]})
+    assert "P4" in digest("M&C")
+
+    # /run_now di un solo progetto e job completo di un altro tenant
+    run(bot, [p3], {"P3": [("M&C", "Brochure", 1, date(2026, 11, 1))]}, full=False)
+    run(bot, [], {}, owner="altro")
+    assert sorted(digest("M&C")) == ["P3", "P4"]
+
+
+def test_long_digest_is_split():
+    tr.set_topic(CHAT, "Eventi", 14)
+    bot = FakeBot()
+    p5, p6 = project("P5"), project("P6")
+    many = [("Eventi", f"Servizio numero {i:03d} con un nome lungo", 1, date(2026, 11, 1)) for i in range(150)]
+
+    # tenant a parte: non tocca i digest dei test precedenti
+    run(bot, [p5, p6], {"P5": many, "P6": many[:3]}, owner="lungo")
+    state = tr.get_digest(CHAT, 14)
+    parts = [bot.texts[m] for m in state["message_ids"]]
+    assert len(parts) > 1 and all(len(t) <= topic_digest.TELEGRAM_MAX_CHARS for t in parts)
+    joined = "\n".join(parts)
+    assert all(name in joined for _, name, _, _ in many)
+    assert "📌 P5 (segue)" in joined and "📌 P6" in parts[-1]
+
+    # solo P6 cambia: si modifica soltanto l'ultima parte
+    calls = run(bot, [p5, p6], {"P5": many, "P6": many[:4]}, owner="lungo")
+    assert calls == 1 and tr.get_digest(CHAT, 14)["message_ids"] == state["message_ids"]
+
+    # digest di nuovo corto: parti in più cancellate
+    run(bot, [p5, p6], {"P5": many[:1], "P6": many[:1]}, owner="lungo")
+    state = tr.get_digest(CHAT, 14)
+    assert len(state["message_ids"]) == 1
+    assert sum(1 for text in bot.texts.values() if text) == 1
+
+
+if __name__ == "__main__":
+    test_vanished_area_and_removed_project()
+    test_partial_run_and_other_tenant_keep_sections()
+    test_long_digest_is_split()
+    print("Digest topic: OK")
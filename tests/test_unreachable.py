@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# cache e mappa topic in una cartella temporanea
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp()
+os.environ.setdefault("ERROR_CHAT_ID", "-999")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from telegram.error import BadRequest, Forbidden, NetworkError
+
+import main
+import topic_registry as tr
+import unreachable
+from storage import load_json
+
+
+NOW = 1_800_000_000.0
+HOUR = 3600
+
+
+# ------------------------------------------------------------
+# Bot finto: i topic in `deleted` non esistono più
+# ------------------------------------------------------------
+class FakeBot:
+    def __init__(self, deleted=()):
+        self.deleted = set(deleted)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, message_thread_id=None, **kw):
+        if message_thread_id in self.deleted:
+            raise BadRequest("Message thread not found")
+        self.sent.append((chat_id, message_thread_id, text))
+
+
+class Ctx:
+    def __init__(self, bot):
+        self.bot = bot
+
+
+# ------------------------------------------------------------
+# Test
+# ------------------------------------------------------------
+
+def test_classify():
+    assert unreachable.classify(Forbidden("Forbidden: bot was kicked from the supergroup chat")) == unreachable.FORBIDDEN
+    assert unreachable.classify(BadRequest("Chat not found")) == unreachable.CHAT_NOT_FOUND
+    assert unreachable.classify(BadRequest("Message thread not found")) == unreachable.THREAD_NOT_FOUND
+    assert unreachable.classify(BadRequest("Topic_deleted")) == unreachable.THREAD_NOT_FOUND
+    # errori che non dicono nulla sulla destinazione
+    assert unreachable.classify(BadRequest("Message is too long")) is None
+    assert unreachable.classify(NetworkError("timeout")) is None
+    assert unreachable.classify(ValueError("chat not found")) is None
+
+
+def test_record_doubles_ttl_up_to_max():
+    chat = -101
+    ttl, cap = unreachable.UNREACHABLE_TTL_HOURS, unreachable.UNREACHABLE_MAX_HOURS
+    now = NOW
+
+    assert unreachable.record(chat, None, unreachable.FORBIDDEN, now=now)
+    assert unreachable.blocked(chat, now=now)["until"] == now + ttl * HOUR
+
+    # fallimento durante il blocco: stesso errore, nessun raddoppio
+    assert not unreachable.record(chat, None, unreachable.FORBIDDEN, now=now + 1)
+    assert unreachable.blocked(chat, now=now)["failures"] == 1
+
+    # ai tentativi successivi il blocco raddoppia fino al massimo
+    hours = ttl
+    for failures in range(2, 10):
+        now = unreachable.blocked(chat, now=now)["until"]
+        assert unreachable.blocked(chat, now=now) is None
+        assert not unreachable.record(chat, None, unreachable.FORBIDDEN, now=now)
+        hours = min(hours * 2, cap)
+        entry = unreachable.blocked(chat, now=now)
+        assert entry["failures"] == failures and entry["until"] == now + hours * HOUR
+    assert hours == cap
+
+    unreachable.clear(chat)
+    assert unreachable.blocked(chat, now=now) is None
+
+
+def test_writes_wait_for_flush():
+    unreachable.record(-102, None, unreachable.CHAT_NOT_FOUND, now=NOW)
+    assert "-102" not in load_json(unreachable.FILENAME, {})
+    unreachable.flush()
+    assert "-102" in load_json(unreachable.FILENAME, {})
+
+
+def test_deleted_topic_falls_back_to_general():
+    chat = -103
+    tr.set_topic(chat, "IT", 7)
+    tr.set_topic(chat, "Sviluppo", 7)
+    bot = FakeBot(deleted={7})
+
+    asyncio.run(main.send_to_group_or_topic(Ctx(bot), chat, "IT", "promemoria"))
+    assert bot.sent == [(chat, None, "promemoria")]
+    assert unreachable.blocked(chat, 7)["reason"] == unreachable.THREAD_NOT_FOUND
+    # aree del topic eliminato tolte dalla mappa
+    assert tr.get_topic(chat, "IT") is None and tr.get_topic(chat, "Sviluppo") is None
+
+    # topic forzato in cache: direttamente nel generale, nessun tentativo
+    asyncio.run(main.send_to_group_or_topic(Ctx(bot), chat, "IT", "di nuovo", forced_thread_id=7))
+    assert bot.sent[-1] == (chat, None, "di nuovo")
+
+
+if __name__ == "__main__":
+    test_classify()
+    test_record_doubles_ttl_up_to_max()
+    test_writes_wait_for_flush()
+    test_deleted_topic_falls_back_to_general()
+    print("Destinazioni irraggiungibili: OK")